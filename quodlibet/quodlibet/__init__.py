@@ -596,6 +596,10 @@ def main(window, before_quit=None):
         from quodlibet.util import copool
         copool.pause_all()
 
+        # finish writing edited tags, so no file is left half written
+        from quodlibet.qltk import tagwriter
+        tagwriter.flush()
+
         # See which browser windows are open and save their names
         # so we can restore them on start
         from quodlibet.qltk.browser import LibraryBrowser
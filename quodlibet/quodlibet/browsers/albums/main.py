@@ -17,6 +17,7 @@ from gi.repository import Gtk, Pango, Gdk, GLib, Gio
 from .prefs import Preferences, PATTERN
 from .models import AlbumModel, AlbumFilterModel, AlbumSortModel
 
+from quodlibet import app
 from quodlibet import config
 from quodlibet import const
 from quodlibet import qltk
@@ -254,6 +255,12 @@ class VisibleUpdate(object):
 
         raise NotImplementedError
 
+    def _prefetch_rows(self, model, iters):
+        """Gets called with all rows about to be updated, in update order,
+        so that the data needed can be loaded in one pass."""
+
+        pass
+
     def __stop_update(self, adj, view):
         if self.__pending_paths:
             copool.remove(self.__scan_paths)
@@ -325,6 +332,9 @@ class VisibleUpdate(object):
             if self._row_needs_update(model, iter_):
                 visible_paths.append((model, path))
 
+        if visible_paths:
+            self._prefetch_rows(
+                model, [model.get_iter(p) for m, p in reversed(visible_paths)])
         if not self.__pending_paths and visible_paths:
             copool.add(self.__scan_paths)
         self.__pending_paths = visible_paths
@@ -563,6 +573,14 @@ class AlbumList(Browser, util.InstanceTracker, VisibleUpdate):
                          callback=callback,
                          cancel=self._cover_cancel)
 
+    def _prefetch_rows(self, model, iters):
+        songs_list = []
+        for iter_ in iters:
+            album = model.get_album(iter_)
+            if album is not None:
+                songs_list.append(album.songs)
+        app.cover_manager.prefetch_many(songs_list, self._cover_cancel)
+
     def __destroy(self, browser):
         self._cover_cancel.cancel()
         self.disable_row_update()
@@ -6,10 +6,12 @@
 # published by the Free Software Foundation
 
 import cPickle as pickle
+import hashlib
 import os
 import sys
 import threading
 import time
+import Queue
 
 from gi.repository import Gtk, GLib, Pango, Gdk
 
@@ -28,10 +30,12 @@ from quodlibet.qltk.msg import ErrorMessage
 from quodlibet.qltk.songsmenu import SongsMenu
 from quodlibet.qltk.views import AllTreeView
 from quodlibet.util import connect_obj
+from quodlibet.util.path import mkdir
 from quodlibet.qltk.x import ScrolledWindow, Align, Button
 
 
 FEEDS = os.path.join(const.USERDIR, "feeds")
+FEEDS_DIR = os.path.join(const.USERDIR, "audiofeeds")
 DND_URI_LIST, DND_MOZ_URL = range(2)
 
 # Migration path for pickle
@@ -43,6 +47,13 @@ class InvalidFeed(ValueError):
 
 
 class Feed(list):
+
+    etag = None
+    """The ETag of the last downloaded version of the feed"""
+
+    modified = None
+    """The modification date of the last downloaded version of the feed"""
+
     def __init__(self, uri):
         self.name = _("Unknown")
         self.uri = uri
@@ -130,9 +141,33 @@ class Feed(list):
                     af.add("genre", value)
 
     def parse(self):
+        """Downloads and updates the feed, returns True if it changed"""
+
+        return self.update(self.fetch())
+
+    def fetch(self):
+        """Downloads and parses the feed. Doesn't change the feed, so it
+        can be called in a thread.
+
+        Returns the result to pass to update() or None on error.
+        """
+
         try:
-            doc = feedparser.parse(self.uri)
+            return feedparser.parse(
+                self.uri, etag=self.etag, modified=self.modified)
         except:
+            return None
+
+    def update(self, doc):
+        """Updates the feed with the result of fetch(), returns True if
+        it changed"""
+
+        if doc is None:
+            return False
+
+        if doc.get("status") == 304:
+            # not modified since the last download
+            self.__lastgot = time.time()
             return False
 
         try:
@@ -194,9 +229,128 @@ class Feed(list):
                 else:
                     self.insert(0, song)
         self.__lastgot = time.time()
+        self.etag = doc.get("etag")
+        self.modified = doc.get("modified")
         return bool(uris)
 
 
+class FeedRefresher(object):
+    """Refreshes feeds, downloading up to `MAX_THREADS` of them at once.
+
+    Only downloading and parsing happens in threads. The feeds get
+    updated in the main loop, calling `callback(feed, changed)` after each
+    one and `done_callback()` once all are done.
+    """
+
+    MAX_THREADS = 8
+
+    def __init__(self, feeds, callback, done_callback=None):
+        self._queue = Queue.Queue()
+        for feed in feeds:
+            self._queue.put(feed)
+        self._pending = len(feeds)
+        self._callback = callback
+        self._done_callback = done_callback
+
+    def start(self):
+        if not self._pending:
+            if self._done_callback is not None:
+                GLib.idle_add(self._done_callback)
+            return
+
+        for i in xrange(min(self.MAX_THREADS, self._pending)):
+            thread = threading.Thread(target=self._run)
+            thread.daemon = True
+            thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                feed = self._queue.get_nowait()
+            except Queue.Empty:
+                break
+            doc = feed.fetch()
+            GLib.idle_add(self._finish, feed, doc)
+
+    def _finish(self, feed, doc):
+        self._pending -= 1
+        self._callback(feed, feed.update(doc))
+        if not self._pending and self._done_callback is not None:
+            self._done_callback()
+        return False
+
+
+class FeedStore(object):
+    """Saves each feed to its own file in a directory, so saving a
+    changed feed doesn't rewrite all others.
+
+    The order of the feeds is kept in an index file, see save_index().
+    """
+
+    INDEX = "index"
+
+    def __init__(self, path):
+        self.path = path
+
+    def _filename(self, uri):
+        return os.path.join(self.path, hashlib.sha1(uri).hexdigest())
+
+    def load(self):
+        """Returns a list of feeds or None if nothing was saved yet"""
+
+        try:
+            with open(os.path.join(self.path, self.INDEX), "rb") as h:
+                uris = h.read().splitlines()
+        except EnvironmentError:
+            return None
+
+        feeds = []
+        for uri in uris:
+            try:
+                with open(self._filename(uri), "rb") as h:
+                    feed = pickle.load(h)
+            except (pickle.PickleError, EnvironmentError, EOFError,
+                    ValueError, TypeError, AttributeError) as e:
+                print_w("Couldn't load feed %r: %s" % (uri, e))
+                # keep the subscription, the next check fills it again
+                feed = Feed(uri)
+            feeds.append(feed)
+        return feeds
+
+    def save_feed(self, feed):
+        """Saves one feed"""
+
+        try:
+            mkdir(self.path)
+            with util.atomic_save(
+                    self._filename(feed.uri), ".tmp", "wb") as h:
+                pickle.dump(feed, h, pickle.HIGHEST_PROTOCOL)
+        except EnvironmentError as e:
+            print_w("Couldn't save feed %r: %s" % (feed.uri, e))
+
+    def save_index(self, feeds):
+        """Saves the list of feeds. Saves feeds which weren't saved
+        before and removes the ones not in the list anymore."""
+
+        filenames = {}
+        for feed in feeds:
+            filename = self._filename(feed.uri)
+            filenames[os.path.basename(filename)] = filename
+            if not os.path.exists(filename):
+                self.save_feed(feed)
+
+        try:
+            mkdir(self.path)
+            index = os.path.join(self.path, self.INDEX)
+            with util.atomic_save(index, ".tmp", "wb") as h:
+                h.write("\n".join(feed.uri for feed in feeds))
+            for name in os.listdir(self.path):
+                if name != self.INDEX and name not in filenames:
+                    os.remove(os.path.join(self.path, name))
+        except EnvironmentError as e:
+            print_w("Couldn't save feed list: %s" % e)
+
+
 class AddFeedDialog(GetStringDialog):
     def __init__(self, parent):
         super(AddFeedDialog, self).__init__(
@@ -214,6 +368,7 @@ class AddFeedDialog(GetStringDialog):
 
 class AudioFeeds(Browser):
     __feeds = Gtk.ListStore(object)  # unread
+    __store = FeedStore(FEEDS_DIR)
 
     headers = ("title artist performer ~people album date website language "
                "copyright organization license contact").split()
@@ -250,43 +405,48 @@ class AudioFeeds(Browser):
             if row[0] in feeds:
                 row[0].changed = True
                 row[0] = row[0]
-        AudioFeeds.write()
+                klass.__store.save_feed(row[0])
 
     @classmethod
     def write(klass):
         feeds = [row[0] for row in klass.__feeds]
-        f = file(FEEDS, "wb")
-        pickle.dump(feeds, f, pickle.HIGHEST_PROTOCOL)
-        f.close()
+        klass.__store.save_index(feeds)
 
     @classmethod
     def init(klass, library):
-        try:
-            feeds = pickle.load(file(FEEDS, "rb"))
-        except (pickle.PickleError, EnvironmentError, EOFError):
-            pass
-        else:
-            for feed in feeds:
-                klass.__feeds.append(row=[feed])
+        feeds = klass.__store.load()
+        if feeds is None:
+            # migrate from the single pickle file
+            try:
+                feeds = pickle.load(file(FEEDS, "rb"))
+            except (pickle.PickleError, EnvironmentError, EOFError):
+                feeds = []
+            else:
+                klass.__store.save_index(feeds)
+
+        for feed in feeds:
+            klass.__feeds.append(row=[feed])
         GLib.idle_add(klass.__do_check)
 
     @classmethod
     def __do_check(klass):
-        thread = threading.Thread(target=klass.__check, args=())
-        thread.setDaemon(True)
-        thread.start()
+        feeds = [row[0] for row in klass.__feeds
+                 if row[0].get_age() >= 2 * 60 * 60]
+        FeedRefresher(feeds, klass.__refreshed, klass.__check_done).start()
+        return False
 
     @classmethod
-    def __check(klass):
-        for row in klass.__feeds:
-            feed = row[0]
-            if feed.get_age() < 2 * 60 * 60:
-                continue
-            elif feed.parse():
-                feed.changed = True
-                row[0] = feed
-        klass.write()
+    def __refreshed(klass, feed, changed):
+        if changed:
+            klass.changed([feed])
+        elif any(row[0] is feed for row in klass.__feeds):
+            # not modified, but remember when it was checked
+            klass.__store.save_feed(feed)
+
+    @classmethod
+    def __check_done(klass):
         GLib.timeout_add(60 * 60 * 1000, klass.__do_check)
+        return False
 
     def Menu(self, songs, library, items):
         if len(songs) == 1:
@@ -452,8 +612,7 @@ class AudioFeeds(Browser):
         AudioFeeds.write()
 
     def __refresh(self, feeds):
-        changed = filter(Feed.parse, feeds)
-        AudioFeeds.changed(changed)
+        FeedRefresher(feeds, type(self).__refreshed).start()
 
     def activate(self):
         self.__changed(self.__view.get_selection())
@@ -70,7 +70,7 @@ class EmptyBar(Browser):
         except Query.error:
             pass
         else:
-            return self._query.filter(self._library)
+            return self._library.query(self._query)
 
     def activate(self):
         songs = self._get_songs()
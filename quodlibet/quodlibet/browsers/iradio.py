@@ -10,7 +10,7 @@ import sys
 import bz2
 import urllib2
 import urllib
-import itertools
+import cPickle as pickle
 
 from gi.repository import Gtk, GLib, Pango
 
@@ -41,6 +41,7 @@ STATION_LIST_URL = \
     "http://bitbucket.org/lazka/quodlibet/downloads/radiolist.bz2"
 STATIONS_FAV = os.path.join(const.USERDIR, "stations")
 STATIONS_ALL = os.path.join(const.USERDIR, "stations_all")
+STATIONS_CACHE = os.path.join(const.USERDIR, "stations_cache")
 
 # TODO: - Do the update in a thread
 #       - Ranking: reduce duplicate stations (max 3 URLs per station)
@@ -231,15 +232,34 @@ def add_station(uri):
 def download_taglist(callback, cofuncid, step=1024 * 10):
     """Generator for loading the bz2 compressed tag list.
 
-    Calls callback with the decompressed data or None in case of
-    an error."""
+    The list gets parsed while downloading and saved to the station cache.
+    If the list didn't change since the last download the cached one gets
+    used instead.
+
+    Calls callback with a list of IRFiles or None in case of an error."""
 
     with Task(_("Internet Radio"), _("Downloading station list")) as task:
         if cofuncid:
             task.copool(cofuncid)
 
+        cache = StationCache(STATIONS_CACHE)
+        stamp, entries = cache.load()
+        yield True
+
+        request = urllib2.Request(STATION_LIST_URL)
+        if entries:
+            for header, value in stamp.iteritems():
+                request.add_header(header, value)
+
         try:
-            response = urllib2.urlopen(STATION_LIST_URL)
+            response = urllib2.urlopen(request)
+        except urllib2.HTTPError as e:
+            stations = None
+            if e.code == 304 and entries:
+                print_d("Station list not modified, using cache")
+                stations = [create_station(*entry) for entry in entries]
+            GLib.idle_add(callback, stations)
+            return
         except urllib2.URLError:
             GLib.idle_add(callback, None)
             return
@@ -249,14 +269,20 @@ def download_taglist(callback, cofuncid, step=1024 * 10):
         except ValueError:
             size = 0
 
+        stamp = {}
+        for header, request_header in [("etag", "If-None-Match"),
+                                       ("last-modified", "If-Modified-Since")]:
+            value = response.info().get(header)
+            if value:
+                stamp[request_header] = value
+
         decomp = bz2.BZ2Decompressor()
+        parser = TaglistParser()
 
-        data = ""
-        temp = ""
+        entries = []
+        stations = []
         read = 0
-        while temp or not data:
-            read += len(temp)
-
+        while True:
             if size:
                 task.update(float(read) / size)
             else:
@@ -264,24 +290,41 @@ def download_taglist(callback, cofuncid, step=1024 * 10):
             yield True
 
             try:
-                data += decomp.decompress(temp)
                 temp = response.read(step)
+                if not temp:
+                    new = parser.close()
+                else:
+                    read += len(temp)
+                    new = parser.feed(decomp.decompress(temp))
             except (IOError, EOFError):
-                data = None
+                entries = stations = None
                 break
-        response.close()
 
-        yield True
+            entries.extend(new)
+            stations.extend(create_station(*e) for e in new)
+            if not temp:
+                break
+        response.close()
 
-        stations = None
-        if data:
-            stations = parse_taglist(data)
+        if entries:
+            yield True
+            cache.save(stamp, entries)
+        else:
+            stations = None
 
         GLib.idle_add(callback, stations)
 
 
-def parse_taglist(data):
-    """Parses a dump file like list of tags and returns a list of IRFiles
+def create_station(uri, tags):
+    """Returns a new IRFile for an entry returned by TaglistParser"""
+
+    station = IRFile(uri)
+    station.update(tags)
+    return station
+
+
+class TaglistParser(object):
+    """Parses a dump file like list of tags piece by piece.
 
     uri=http://...
     tag=value1
@@ -290,41 +333,134 @@ def parse_taglist(data):
     uri=http://...
     ...
 
+    Returns (uri, tags) entries, tags being a dict of sanitized tags.
     """
 
-    stations = []
-    station = None
-
-    for l in data.split("\n"):
-        key = l.split("=")[0]
-        value = l.split("=", 1)[1]
-        if key == "uri":
-            if station:
-                stations.append(station)
-            station = IRFile(value)
-            continue
+    MAX_CACHED = 50000
+    """Maximum number of remembered sanitized tag values"""
 
+    def __init__(self):
+        self._rest = ""
+        self._entry = None
+        # genres, codecs etc. are the same for many stations
+        self._sanitized = {}
+
+    def feed(self, data):
+        """Parses the data and returns all entries completed by it"""
+
+        lines = (self._rest + data).split("\n")
+        self._rest = lines.pop(-1)
+        return self._parse(lines)
+
+    def close(self):
+        """Parses all remaining data and returns the last entries"""
+
+        lines = [self._rest]
+        self._rest = ""
+        entries = self._parse(lines)
+        if self._entry is not None:
+            entries.append(self._entry)
+            self._entry = None
+        return entries
+
+    def _sanitize(self, key, value):
         value = decode(value)
         san = sanitize_tags({key: value}, stream=True).items()
         if not san:
-            continue
+            return
 
         key, value = san[0]
         if key == "~listenerpeak":
             key = "~#listenerpeak"
             value = int(value)
+        return key, value
 
-        if isinstance(value, str):
-            value = value.decode("utf-8")
-            if value not in station.list(key):
-                station.add(key, value)
-        else:
-            station[key] = value
+    def _parse(self, lines):
+        entries = []
+        entry = self._entry
+        sanitized = self._sanitized
 
-    if station:
-        stations.append(station)
+        for l in lines:
+            key, sep, value = l.partition("=")
+            if not sep:
+                continue
+            if key == "uri":
+                if entry is not None:
+                    entries.append(entry)
+                entry = (value, {})
+                continue
+            elif entry is None:
+                continue
 
-    return stations
+            pair = (key, value)
+            try:
+                san = sanitized[pair]
+            except KeyError:
+                if len(sanitized) >= self.MAX_CACHED:
+                    sanitized.clear()
+                san = sanitized[pair] = self._sanitize(key, value)
+            if san is None:
+                continue
+
+            key, value = san
+            tags = entry[1]
+            if isinstance(value, str):
+                value = value.decode("utf-8")
+                old = tags.get(key)
+                if old is None:
+                    tags[key] = value
+                elif value not in old.split("\n"):
+                    tags[key] = old + "\n" + value
+            else:
+                tags[key] = value
+
+        self._entry = entry
+        return entries
+
+
+def parse_taglist(data):
+    """Parses a dump file like list of tags and returns a list of IRFiles,
+    see TaglistParser"""
+
+    parser = TaglistParser()
+    entries = parser.feed(data) + parser.close()
+    return [create_station(*e) for e in entries]
+
+
+class StationCache(object):
+    """The entries of the last downloaded station list.
+
+    Loading them is a lot faster than parsing the list again, so they get
+    used in case the list didn't change on the server.
+    """
+
+    VERSION = 1
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def load(self):
+        """Returns a (stamp, entries) tuple, stamp being a dict of
+        request headers for a conditional download of the list"""
+
+        try:
+            with open(self.filename, "rb") as fileobj:
+                version, stamp, entries = pickle.load(fileobj)
+        except (EnvironmentError, EOFError, ValueError, TypeError,
+                pickle.UnpicklingError) as e:
+            print_d("Couldn't load station cache: %s" % e)
+            return {}, []
+
+        if version != self.VERSION:
+            return {}, []
+        return stamp, entries
+
+    def save(self, stamp, entries):
+        try:
+            with util.atomic_save(self.filename, ".tmp", "wb") as fileobj:
+                pickle.dump((self.VERSION, stamp, entries), fileobj, 2)
+        except EnvironmentError as e:
+            print_w("Couldn't save station cache: %s" % e)
 
 
 class AddNewStation(GetStringDialog):
@@ -412,6 +548,72 @@ class GenreFilter(object):
         return self.GENRES[key][0]
 
 
+class GenreIndex(object):
+    """Remembers which stations of a library match each genre of a
+    GenreFilter, so they don't have to be matched again for every filter
+    change.
+
+    The stations of a genre get looked up through the query index of the
+    library on first use and are kept up to date through the library
+    signals.
+    """
+
+    def __init__(self, library, filters):
+        library.enable_query_index()
+        self._library = library
+        self._filters = filters
+        self._stations = {}
+        self._sigs = [
+            library.connect('added', self.__changed),
+            library.connect('changed', self.__changed),
+            library.connect('removed', self.__removed),
+        ]
+
+    def destroy(self):
+        for sig in self._sigs:
+            self._library.disconnect(sig)
+        self._stations.clear()
+
+    def stations(self, key):
+        """Returns the set of stations matching the genre.
+
+        The set belongs to the index and must not be modified.
+        """
+
+        stations = self._stations.get(key)
+        if stations is None:
+            query = self._filters.query(key)
+            stations = set(self._library.query_index.filter(query))
+            self._stations[key] = stations
+        return stations
+
+    def uncategorized(self):
+        """Returns a set of the stations matching no genre"""
+
+        stations = set(self._library.query_index.songs)
+        for key in self._filters.keys():
+            stations -= self.stations(key)
+        return stations
+
+    def genres(self, station):
+        """Returns a list of the genres the station matches"""
+
+        return [k for k in self._filters.keys() if station in self.stations(k)]
+
+    def __changed(self, library, songs):
+        for key, stations in self._stations.iteritems():
+            search = self._filters.query(key).search
+            for song in songs:
+                if search(song):
+                    stations.add(song)
+                else:
+                    stations.discard(song)
+
+    def __removed(self, library, songs):
+        for stations in self._stations.itervalues():
+            stations.difference_update(songs)
+
+
 class CloseButton(Gtk.Button):
     """Reimplementation of 3.10 close button for InfoBar."""
 
@@ -474,6 +676,7 @@ class InternetRadio(Browser, util.InstanceTracker):
     __stations = None
     __fav_stations = None
     __librarian = None
+    __indices = None
 
     __filter = None
 
@@ -500,8 +703,16 @@ class InternetRadio(Browser, util.InstanceTracker):
 
         klass.filters = GenreFilter()
 
+        klass.__indices = {}
+        for lib in [klass.__stations, klass.__fav_stations]:
+            klass.__indices[lib] = GenreIndex(lib, klass.filters)
+
     @classmethod
     def _destroy(klass):
+        for index in klass.__indices.itervalues():
+            index.destroy()
+        klass.__indices = None
+
         if klass.__stations.dirty:
             klass.__stations.save()
         klass.__stations.destroy()
@@ -751,38 +962,44 @@ class InternetRadio(Browser, util.InstanceTracker):
 
         return libs
 
-    def __get_selection_filter(self):
-        """Retuns a filter object for the current selection or None
-        if nothing should be filtered"""
+    def __get_selection(self):
+        """Returns a (keys, nocat) tuple of the selected genres and if
+        'No Category' is selected, or None if nothing should be filtered"""
 
         selection = self.view.get_selection()
         model, rows = selection.get_selected_rows()
 
-        filter_ = None
+        keys = []
+        nocat = False
         for row in rows:
             type_ = model[row][self.TYPE]
             if type_ == self.TYPE_FILTER:
-                key = model[row][self.KEY]
-                current_filter = self.filters.query(key)
-                if current_filter:
-                    if filter_:
-                        filter_ |= current_filter
-                    else:
-                        filter_ = current_filter
+                keys.append(model[row][self.KEY])
             elif type_ == self.TYPE_NOCAT:
-                # if notcat is selected, combine all filters, negate and merge
-                all_ = [self.filters.query(k) for k in self.filters.keys()]
-                nocat_filter = all_ and -reduce(lambda x, y: x | y, all_)
-                if nocat_filter:
-                    if filter_:
-                        filter_ |= nocat_filter
-                    else:
-                        filter_ = nocat_filter
+                nocat = True
             elif type_ == self.TYPE_ALL:
-                filter_ = None
-                break
+                return
 
-        return filter_
+        if not keys and not nocat:
+            return
+        return keys, nocat
+
+    def __get_selected_stations(self, lib):
+        """Returns a set of the stations of lib in the selected genres or
+        None if nothing should be filtered"""
+
+        selection = self.__get_selection()
+        if selection is None:
+            return
+
+        keys, nocat = selection
+        index = self.__indices[lib]
+        stations = set()
+        for key in keys:
+            stations |= index.stations(key)
+        if nocat:
+            stations |= index.uncategorized()
+        return stations
 
     def __add_fav(self, songs):
         songs = [s for s in songs if s in self.__stations]
@@ -865,17 +1082,6 @@ class InternetRadio(Browser, util.InstanceTracker):
                     break
         self.__uninhibit()
 
-    def __get_filter(self):
-        filter_ = self.__get_selection_filter()
-        text_filter = self.__filter or Query("")
-
-        if filter_:
-            filter_ &= text_filter
-        else:
-            filter_ = text_filter
-
-        return filter_
-
     def can_filter_text(self):
         return True
 
@@ -886,9 +1092,11 @@ class InternetRadio(Browser, util.InstanceTracker):
             self.activate()
 
     def activate(self):
-        filter_ = self.__get_filter()
-        libs = self.__get_selected_libraries()
-        songs = filter_.filter(itertools.chain(*libs))
+        text_filter = self.__filter or Query("")
+        songs = []
+        for lib in self.__get_selected_libraries():
+            stations = self.__get_selected_stations(lib)
+            songs.extend(lib.query_index.filter(text_filter, stations))
         self.songs_selected(songs)
 
     def active_filter(self, song):
@@ -898,10 +1106,16 @@ class InternetRadio(Browser, util.InstanceTracker):
         else:
             return False
 
-        filter_ = self.__get_filter()
+        selection = self.__get_selection()
+        if selection is not None:
+            keys, nocat = selection
+            genres = self.__indices[lib].genres(song)
+            if not set(keys).intersection(genres) and \
+                    not (nocat and not genres):
+                return False
 
-        if filter_:
-            return filter_.search(song)
+        if self.__filter:
+            return self.__filter.search(song)
         return True
 
     def save(self):
@@ -918,10 +1132,15 @@ class InternetRadio(Browser, util.InstanceTracker):
         if song not in self.__stations and song not in self.__fav_stations:
             return
 
+        if song in self.__stations:
+            genres = self.__indices[self.__stations].genres(song)
+        else:
+            genres = self.__indices[self.__fav_stations].genres(song)
+
         path = None
         for row in self.view.get_model():
             if row[self.TYPE] == self.TYPE_FILTER:
-                if self.filters.query(row[self.KEY]).search(song):
+                if row[self.KEY] in genres:
                     path = row.path
                     break
         else:
@@ -22,7 +22,7 @@ from quodlibet.qltk.completion import LibraryTagCompletion
 from quodlibet.qltk.searchbar import SearchBarBox
 from quodlibet.qltk.x import ScrolledWindow, Align
 from quodlibet.util.library import background_filter
-from quodlibet.util import connect_destroy
+from quodlibet.library.signals import SignalBus
 
 from .prefs import PreferencesButton
 from .util import get_headers
@@ -39,6 +39,9 @@ class PanedBrowser(Browser, util.InstanceTracker):
     accelerated_name = _("_Paned Browser")
     priority = 3
 
+    LIBRARY_LATENCY = 200
+    """Milliseconds to collect library changes before updating the panes"""
+
     def pack(self, songpane):
         container = Gtk.HBox()
         self.show()
@@ -91,9 +94,8 @@ class PanedBrowser(Browser, util.InstanceTracker):
         prefs = PreferencesButton(self)
         sbb.pack_start(prefs, False, True, 0)
 
-        connect_destroy(library, 'changed', self.__changed)
-        connect_destroy(library, 'added', self.__added)
-        connect_destroy(library, 'removed', self.__removed)
+        SignalBus.get(library).subscribe_destroy(
+            self, self.__library_changed, self.LIBRARY_LATENCY)
 
         self.connect('destroy', self.__destroy)
 
@@ -144,21 +146,31 @@ class PanedBrowser(Browser, util.InstanceTracker):
         self._panes[-1].uninhibit()
         self._panes[-1].get_selection().emit('changed')
 
-    def __added(self, library, songs):
+    def __library_changed(self, added, changed, removed):
+        if removed:
+            self.__removed(removed)
+        if changed:
+            self.__changed(changed)
+        if added:
+            self.__added(added)
+
+    def __added(self, songs):
         songs = filter(self._filter, songs)
         for pane in self._panes:
+            if not songs:
+                break
             pane.add(songs)
-            songs = filter(pane.matches, songs)
+            songs = pane.filter_songs(songs)
 
-    def __removed(self, library, songs, remove_if_empty=True):
+    def __removed(self, songs, remove_if_empty=True):
         songs = filter(self._filter, songs)
         for pane in self._panes:
             pane.remove(songs, remove_if_empty)
 
-    def __changed(self, library, songs):
-        self.__removed(library, songs, False)
-        self.__added(library, songs)
-        self.__removed(library, [])
+    def __changed(self, songs):
+        self.__removed(songs, False)
+        self.__added(songs)
+        self.__removed([])
 
     def active_filter(self, song):
         # check with the search filter
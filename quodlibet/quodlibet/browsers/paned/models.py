@@ -6,6 +6,7 @@
 # published by the Free Software Foundation
 
 import re
+from bisect import bisect_left
 
 from quodlibet import util
 from quodlibet.qltk.models import ObjectStore
@@ -109,12 +110,29 @@ class AllEntry(BaseEntry):
 
 
 class PaneModel(ObjectStore):
+    """Keeps an index of all entry keys (the pattern values, "" for
+    Unknown) to their entries and rows, so that songs can be added and
+    removed without looking at every row.
+    """
 
     def __init__(self, pattern_config):
         super(PaneModel, self).__init__()
         self.__sort_cache = {}
         self.__key_cache = {}
         self.config = pattern_config
+        self.__reset_index()
+
+    def __reset_index(self):
+        # key -> (entry, iter), the iters of a ListStore persist
+        self.__index = {}
+        # sort keys of all SongsEntry rows, in model order
+        self.__sort_keys = []
+        # keys of entries which got empty but weren't removed
+        self.__empty = set()
+
+    def clear(self):
+        super(PaneModel, self).clear()
+        self.__reset_index()
 
     def get_format_keys(self, song):
         try:
@@ -136,6 +154,17 @@ class PaneModel(ObjectStore):
             self.__sort_cache[text] = util.human_sort_key(text_stripped)
             return self.__sort_cache[text], text
 
+    def __has_all(self):
+        return len(self) and isinstance(self[0][0], AllEntry)
+
+    def get_entry(self, key):
+        """The entry for key ("" for Unknown) or None"""
+
+        try:
+            return self.__index[key][0]
+        except KeyError:
+            return None
+
     def get_songs(self, paths):
         """Get all songs for the given paths (from a selection e.g.)"""
 
@@ -145,7 +174,7 @@ class PaneModel(ObjectStore):
 
         first_path = paths[0]
         if isinstance(self[first_path][0], AllEntry):
-            for entry in self.itervalues():
+            for entry, iter_ in self.__index.itervalues():
                 s.update(entry.songs)
         else:
             for path in paths:
@@ -153,6 +182,20 @@ class PaneModel(ObjectStore):
 
         return s
 
+    def filter_songs(self, paths, songs):
+        """Returns the set of songs which are included in the selection
+        defined by the paths. All songs have to be in the model.
+        """
+
+        songs = set(songs)
+        if not paths or isinstance(self[paths[0]][0], AllEntry):
+            return songs
+
+        result = set()
+        for path in paths:
+            result |= self[path][0].songs & songs
+        return result
+
     def get_keys(self, paths):
         return set(self[p][0].key for p in paths)
 
@@ -162,38 +205,45 @@ class PaneModel(ObjectStore):
         If remove_if_empty == True, entries with no songs will be removed.
         """
 
-        songs = set(songs)
+        index = self.__index
+        key_cache = self.__key_cache
 
+        # use the keys the songs got added with, they might have changed
+        removed = {}
         for song in songs:
-            if song in self.__key_cache:
-                del self.__key_cache[song]
-
-        to_remove = []
-        for iter_, entry in self.iterrows():
-            if isinstance(entry, AllEntry):
+            keys = key_cache.pop(song, None)
+            if keys is None:
                 continue
-            entry.songs -= songs
+            for key in (keys or [""]):
+                if key in index and song in index[key][0].songs:
+                    removed.setdefault(key, set()).add(song)
+
+        for key, key_songs in removed.iteritems():
+            entry, iter_ = index[key]
+            entry.songs -= key_songs
             entry.finalize()
             self.row_changed(self.get_path(iter_), iter_)
             if not entry.songs:
-                to_remove.append(iter_)
+                self.__empty.add(key)
 
         if not remove_if_empty:
             return
 
         # remove from cache and the model
-        for iter_ in to_remove:
-            try:
-                key = self.get_value(iter_).key
-                del(self.__sort_cache[key])
-            except KeyError:
-                pass
+        to_remove = self.__empty
+        self.__empty = set()
+        for key in to_remove:
+            entry, iter_ = index.pop(key)
+            if key:
+                sort_key = self.__human_sort_key(key)
+                del self.__sort_keys[bisect_left(self.__sort_keys, sort_key)]
+                del self.__sort_cache[key]
             self.remove(iter_)
 
         if len(self) == 1 and isinstance(self[0][0], AllEntry):
             # only All is left.. clear everything
             self.clear()
-        elif to_remove and len(self) == 2:
+        elif to_remove and len(self) == 2 and self.__has_all():
             # Only one entry + All -> remove All
             self.remove(self.get_iter_first())
 
@@ -201,88 +251,59 @@ class PaneModel(ObjectStore):
         """Add new songs to the list, creating new rows"""
 
         collection = {}
-        unknown = UnknownEntry()
-        human_sort = self.__human_sort_key
+        get_format_keys = self.get_format_keys
         for song in songs:
-            keys = self.get_format_keys(song)
-            if not keys:
-                unknown.songs.add(song)
-            for key in keys:
+            for key in (get_format_keys(song) or [""]):
                 if key in collection:
-                    collection[key][0].songs.add(song)
+                    collection[key].add(song)
                 else:
-                    entry = SongsEntry(key)
-                    collection[key] = (entry, human_sort(key))
-                    entry.songs.add(song)
+                    collection[key] = set([song])
 
-        items = sorted(collection.iteritems(),
-                       key=lambda s: s[1][1],
-                       reverse=True)
+        index = self.__index
+        human_sort = self.__human_sort_key
 
         # fast path
         if not len(self):
-            if unknown.songs:
-                self.insert(0, [unknown])
-            entries = []
-            for key, (val, sort_key) in items:
-                entries.append(val)
-            self.insert_many(0, reversed(entries))
-            if len(self) > 1:
-                self.insert(0, [AllEntry()])
+            unknown = collection.pop("", None)
+            items = sorted(
+                ((human_sort(k), SongsEntry(k, v))
+                 for k, v in collection.iteritems()),
+                key=lambda i: i[0])
+            self.__sort_keys = [i[0] for i in items]
+            entries = [i[1] for i in items]
+            if unknown:
+                entries.append(UnknownEntry(unknown))
+            if len(entries) > 1:
+                entries.insert(0, AllEntry())
+            for entry, iter_ in zip(entries, self.iter_append_many(entries)):
+                if not isinstance(entry, AllEntry):
+                    index[entry.key] = (entry, iter_)
             return
 
-        # insert all new songs
-        key = None
-        val = None
-        sort_key = None
-
-        for iter_, entry in self.iterrows():
-            if not isinstance(entry, SongsEntry):
-                continue
-
-            if key is None:
-                if not items:
-                    break
-                key, (val, sort_key) = items.pop(-1)
-
-            if key == entry.key:
-                entry.songs |= val.songs
+        # update existing entries, insert new ones at their sort position
+        offset = 1 if self.__has_all() else 0
+        sort_keys = self.__sort_keys
+        for key, key_songs in collection.iteritems():
+            if key in index:
+                entry, iter_ = index[key]
+                entry.songs |= key_songs
                 entry.finalize()
+                self.__empty.discard(key)
                 self.row_changed(self.get_path(iter_), iter_)
-                key = None
-            elif sort_key < human_sort(entry.key):
-                self.insert_before(iter_, row=[val])
-                key = None
-
-        # the last one failed, add it again
-        if key:
-            items.append((key, (val, sort_key)))
-
-        # insert the left over songs
-        if items:
-            entries = []
-            for key, (val, srt) in items:
-                entries.append(val)
-            if isinstance(self[-1][0], UnknownEntry):
-                self.insert_many(len(self) - 1, entries)
+            elif not key:
+                entry = UnknownEntry(key_songs)
+                index[key] = (entry, self.append(row=[entry]))
             else:
-                self.append_many(entries)
+                entry = SongsEntry(key, key_songs)
+                sort_key = human_sort(key)
+                pos = bisect_left(sort_keys, sort_key)
+                sort_keys.insert(pos, sort_key)
+                index[key] = (entry, self.insert(pos + offset, [entry]))
 
         # check if All needs to be inserted
-        if len(self) > 1 and not isinstance(self[0][0], AllEntry):
+        if len(self) > 1 and not offset:
             self.insert(0, [AllEntry()])
 
-        # check if Unknown needs to be inserted or updated
-        if unknown.songs:
-            last_row = self[-1]
-            entry = last_row[0]
-            if isinstance(entry, UnknownEntry):
-                entry.songs |= unknown.songs
-                entry.finalize()
-                self.row_changed(last_row.path, last_row.iter)
-            else:
-                self.append(row=[unknown])
-
     def matches(self, paths, song):
         """If the song is included in the selection defined by the paths.
 
@@ -187,6 +187,13 @@ class Pane(AllTreeView):
 
         return model.matches(paths, song)
 
+    def filter_songs(self, songs):
+        """Returns the set of songs included in the selection.
+        All songs have to be in the pane."""
+
+        model, paths = self.get_selection().get_selected_rows()
+        return model.filter_songs(paths, songs)
+
     def inhibit(self):
         """Inhibit selection change events and song propagation"""
 
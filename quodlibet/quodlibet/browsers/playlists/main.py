@@ -73,32 +73,33 @@ class PlaylistsBrowser(Browser):
             if row[0] is playlist:
                 if refresh:
                     klass.__lists.row_changed(row.path, row.iter)
-                playlist.write()
+                playlist.write_async()
                 break
         else:
             model.get_model().append(row=[playlist])
-            playlist.write()
+            playlist.write_async()
+
+    # Playlists which weren't read yet get the current library content
+    # once they are, so they can be skipped here.
 
     @classmethod
     def __removed(klass, library, songs):
         for playlist in klass.playlists():
-            if playlist.remove_songs(songs):
+            if playlist.loaded and playlist.remove_songs(songs):
                 PlaylistsBrowser.changed(playlist)
 
     @classmethod
     def __added(klass, library, songs):
         filenames = set([song("~filename") for song in songs])
         for playlist in klass.playlists():
-            if playlist.add_songs(filenames, library):
+            if playlist.loaded and playlist.add_songs(filenames, library):
                 PlaylistsBrowser.changed(playlist)
 
     @classmethod
     def __changed(klass, library, songs):
         for playlist in klass.playlists():
-            for song in songs:
-                if song in playlist.songs:
-                    PlaylistsBrowser.changed(playlist, refresh=False)
-                    break
+            if playlist.loaded and playlist.has_songs(songs)[0]:
+                PlaylistsBrowser.changed(playlist, refresh=False)
 
     @staticmethod
     def cell_data(col, render, model, iter, data):
@@ -252,8 +253,9 @@ class PlaylistsBrowser(Browser):
             playlist = model[iter][0]
             # Calling playlist.remove_songs(songs) won't remove the right ones
             # if there are duplicates
-            playlist.clear()
-            playlist.extend([row[0] for row in smodel])
+            with playlist.batch():
+                playlist.clear()
+                playlist.extend([row[0] for row in smodel])
             PlaylistsBrowser.changed(playlist)
             self.activate()
 
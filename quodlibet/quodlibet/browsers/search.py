@@ -106,7 +106,7 @@ class SearchBar(Browser):
         except Query.error:
             pass
         else:
-            return self._query.filter(self._library)
+            return self._library.query(self._query)
 
     def activate(self):
         songs = self._get_songs()
@@ -8,7 +8,9 @@
 # published by the Free Software Foundation
 
 import os
+import itertools
 from cStringIO import StringIO
+from types import GeneratorType
 
 from quodlibet import browsers
 
@@ -26,7 +28,12 @@ class CommandError(Exception):
 
 
 class CommandRegistry(object):
-    """Knows about all commands and handles parsing/executing them"""
+    """Knows about all commands and handles parsing/executing them.
+
+    Commands return their response as a string or None. Commands with
+    large responses can instead be generators yielding parts of it, which
+    allows sending it while it gets created (see run_iter()).
+    """
 
     def __init__(self):
         self._commands = {}
@@ -39,16 +46,20 @@ class CommandRegistry(object):
             return func
         return wrap
 
+    def parse_line(self, line):
+        """Returns a (command, args) tuple for the command line"""
+
+        # only one arg supported atm
+        parts = line.split(" ", 1)
+        return parts[0], parts[1:]
+
     def handle_line(self, app, line):
         """Parses a command line and executes the command.
 
         Can not fail.
         """
 
-        # only one arg supported atm
-        parts = line.split(" ", 1)
-        command = parts[0]
-        args = parts[1:]
+        command, args = self.parse_line(line)
 
         print_d("command: %s(*%r)" % (command, args))
 
@@ -59,12 +70,55 @@ class CommandRegistry(object):
         except:
             util.print_exc()
 
+    def handle_line_iter(self, app, line):
+        """Like handle_line() but yields the response in parts"""
+
+        command, args = self.parse_line(line)
+
+        print_d("command: %s(*%r)" % (command, args))
+
+        try:
+            for data in self.run_iter(app, command, *args):
+                yield data
+        except CommandError as e:
+            print_e(str(e))
+        except:
+            util.print_exc()
+
     def run(self, app, name, *args):
         """Execute the command `name` passing args
 
         May raise CommandError
         """
 
+        result = self._run(app, name, *args)
+        if isinstance(result, GeneratorType):
+            result = "".join(result)
+        return result
+
+    def run_iter(self, app, name, *args):
+        """Like run() but returns an iterator over the parts of the
+        response. The command gets executed right away, streaming commands
+        create the remaining parts while it gets consumed.
+
+        May raise CommandError, also while iterating.
+        """
+
+        result = self._run(app, name, *args)
+        if isinstance(result, GeneratorType):
+            return result
+        elif result is None:
+            return iter([])
+        return iter([result])
+
+    def _iter_result(self, name, result):
+        try:
+            for data in result:
+                yield data
+        except CommandError as e:
+            raise CommandError("%s: %s" % (name, str(e)))
+
+    def _run(self, app, name, *args):
         if name not in self._commands:
             raise CommandError("Unknown command %r" % name)
 
@@ -77,10 +131,37 @@ class CommandRegistry(object):
         print_d("Running %r with params %r " % (cmd, args))
 
         try:
-            return cmd(app, *args)
+            result = cmd(app, *args)
         except CommandError as e:
             raise CommandError("%s: %s" % (name, str(e)))
 
+        if isinstance(result, GeneratorType):
+            # execute up to the first yield, so the command runs now
+            # and errors get raised here
+            try:
+                first = next(result)
+            except StopIteration:
+                return None
+            except CommandError as e:
+                raise CommandError("%s: %s" % (name, str(e)))
+            return self._iter_result(
+                name, itertools.chain([first], result))
+
+        return result
+
+
+def _iter_lines(lines, size=500):
+    """Yields the lines in newline terminated blocks of `size` lines"""
+
+    block = []
+    for line in lines:
+        block.append(line)
+        if len(block) >= size:
+            yield "\n".join(block) + "\n"
+            del block[:]
+    if block:
+        yield "\n".join(block) + "\n"
+
 
 registry = CommandRegistry()
 
@@ -418,19 +499,17 @@ def _queue(app, value):
 @registry.register("dump-playlist")
 def _dump_playlist(app):
     window = app.window
-    f = StringIO()
-    for song in window.playlist.pl.get():
-        f.write(song("~uri") + "\n")
-    return f.getvalue()
+    songs = window.playlist.pl.get()
+    for data in _iter_lines(song("~uri") for song in songs):
+        yield data
 
 
 @registry.register("dump-queue")
 def _dump_queue(app):
     window = app.window
-    f = StringIO()
-    for song in window.playlist.q.get():
-        f.write(song("~uri") + "\n")
-    return f.getvalue()
+    songs = window.playlist.q.get()
+    for data in _iter_lines(song("~uri") for song in songs):
+        yield data
 
 
 @registry.register("refresh")
@@ -445,7 +524,10 @@ def _print_query(app, query):
     """
 
     songs = app.library.query(query)
-    return "\n".join([song("~filename") for song in songs]) + "\n"
+    if not songs:
+        yield "\n"
+    for data in _iter_lines(song("~filename") for song in songs):
+        yield data
 
 
 @registry.register("print-playing", optional=1)
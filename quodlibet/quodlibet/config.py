@@ -34,6 +34,16 @@ INITIAL = {
     "library": {
         "exclude": "",
         "refresh_on_start": "true",
+        # save changes to a journal instead of rewriting the whole library
+        "journal": "false",
+        # share equal tag keys and values between songs to save memory
+        "intern_tags": "false",
+        # only check songs in directories which changed when refreshing
+        "quick_refresh": "false",
+        # index tag values to speed up searching the library
+        "query_index": "false",
+        # keep the library presorted and save the song sort keys
+        "sort_cache": "false",
     },
     # State about the player, to restore on startup
     "memory": {
@@ -152,6 +162,8 @@ INITIAL = {
         "prefer_embedded": "false",
         "force_filename": "false",
         "filename": "folder.jpg",
+        # create missing cover thumbnails in the background on start
+        "warm_thumbnails": "true",
     }
 }
 
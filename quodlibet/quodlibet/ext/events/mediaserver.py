@@ -22,6 +22,7 @@ import dbus.service
 from quodlibet import app
 from quodlibet.plugins.events import EventPlugin
 from quodlibet.pattern import Pattern
+from quodlibet.library.ids import IDRegistry
 from quodlibet.util.uri import URI
 from quodlibet.util.dbusutils import DBusIntrospectable, DBusProperty
 from quodlibet.util.dbusutils import dbus_unicode_validate as unival
@@ -318,7 +319,8 @@ class DummySongObject(MediaItem, MediaObject, DBusPropertyFilter,
                 return "music"
             elif name == "Path":
                 path = SongObject.PATH
-                path += "/" + self.__prefix + "/" + str(id(self.__song))
+                path += "/" + self.__prefix + "/" + \
+                    IDRegistry.get_id(self.__song)
                 return path
             elif name == "DisplayName":
                 return unival(self.__song.comma("title"))
@@ -358,12 +360,13 @@ class DummyAlbumObject(MediaContainer, MediaObject, DBusPropertyFilter,
         self.__song = DummySongObject(self)
 
     def get_dummy(self, song):
-        self.__song.set_song(song, "Albums/" + str(id(self.__album)))
+        self.__song.set_song(
+            song, "Albums/" + IDRegistry.get_id(self.__album))
         return self.__song
 
     def set_album(self, album):
         self.__album = album
-        self.PATH = self.parent.PATH + "/" + str(id(album))
+        self.PATH = self.parent.PATH + "/" + IDRegistry.get_id(album)
 
     def get_property(self, interface, name):
         if interface == MediaContainer.IFACE:
@@ -415,48 +418,31 @@ class SongObject(MediaItem, MediaObject, DBusProperty, DBusIntrospectable,
         dbus.service.FallbackObject.__init__(self, bus, self.PATH)
 
         self.__library = library
-        self.__map = dict((id(v), v) for v in self.__library.itervalues())
-        self.__reverse = dict((v, k) for k, v in self.__map.iteritems())
+        self.__ids = IDRegistry.get(library)
 
         self.__song = DummySongObject(self)
 
         self.__users = users
 
-        signals = [
-            ("changed", self.__songs_changed),
-            ("removed", self.__songs_removed),
-            ("added", self.__songs_added),
-        ]
-        self.__sigs = map(lambda (s, f): self.__library.connect(s, f), signals)
+        self.__sigs = [library.connect("changed", self.__songs_changed)]
 
     def __songs_changed(self, lib, songs):
         # We don't know what changed, so get all properties
         props = [p[1] for p in self.get_properties(MediaItem.IFACE)]
 
         for song in songs:
-            song_id = str(id(song))
             # https://github.com/quodlibet/quodlibet/issues/id=1127
             # XXX: Something is emitting wrong changed events..
             # ignore song_ids we don't know for now
-            if song_id not in self.__map:
+            if song not in self.__ids:
                 continue
+            song_id = self.__ids.get_id(song)
             for user in self.__users:
                 # ask the user for the prefix whith which the song is used
                 prefix = user.get_prefix(song)
                 path = "/" + prefix + "/" + song_id
                 self.emit_properties_changed(MediaItem.IFACE, props, path)
 
-    def __songs_added(self, lib, songs):
-        for song in songs:
-            new_id = id(song)
-            self.__map[new_id] = song
-            self.__reverse[song] = new_id
-
-    def __songs_removed(self, lib, songs):
-        for song in songs:
-            del self.__map[self.__reverse[song]]
-            del self.__reverse[song]
-
     def destroy(self):
         for signal_id in self.__sigs:
             self.__library.disconnect(signal_id)
@@ -468,7 +454,9 @@ class SongObject(MediaItem, MediaObject, DBusProperty, DBusIntrospectable,
     def get_property(self, interface, name, path):
         # extract the prefix
         prefix, song_id = path[1:].rsplit("/", 1)
-        song = self.__map[int(song_id)]
+        song = self.__ids.get_item(song_id)
+        if song is None:
+            raise KeyError(song_id)
         return self.get_dummy(song, prefix).get_property(interface, name)
 
 
@@ -492,8 +480,7 @@ class AlbumsObject(MediaContainer, MediaObject, DBusPropertyFilter,
         self.__library = library.albums
         self.__library.load()
 
-        self.__map = dict((id(v), v) for v in self.__library.itervalues())
-        self.__reverse = dict((v, k) for k, v in self.__map.iteritems())
+        self.__ids = IDRegistry.get(self.__library)
 
         signals = [
             ("changed", self.__albums_changed),
@@ -509,11 +496,14 @@ class AlbumsObject(MediaContainer, MediaObject, DBusPropertyFilter,
         return self.__dummy
 
     def get_path_dummy(self, path):
-        return self.get_dummy(self.__map[int(path[1:])])
+        album = self.__ids.get_item(path[1:])
+        if album is None:
+            raise KeyError(path)
+        return self.get_dummy(album)
 
     def __albums_changed(self, lib, albums):
         for album in albums:
-            rel_path = "/" + str(id(album))
+            rel_path = "/" + IDRegistry.get_id(album)
             self.emit_updated(rel_path)
             self.emit_properties_changed(
                 MediaContainer.IFACE,
@@ -521,25 +511,18 @@ class AlbumsObject(MediaContainer, MediaObject, DBusPropertyFilter,
                 rel_path)
 
     def __albums_added(self, lib, albums):
-        for album in albums:
-            new_id = id(album)
-            self.__map[new_id] = album
-            self.__reverse[album] = new_id
         self.emit_updated()
         self.emit_properties_changed(MediaContainer.IFACE,
                                      ["ChildCount", "ContainerCount"])
 
     def __albums_removed(self, lib, albums):
-        for album in albums:
-            del self.__map[self.__reverse[album]]
-            del self.__reverse[album]
         self.emit_updated()
         self.emit_properties_changed(MediaContainer.IFACE,
                                      ["ChildCount", "ContainerCount"])
 
     def get_prefix(self, song):
         album = self.__library[song.album_key]
-        return "Albums/" + str(id(album))
+        return "Albums/" + IDRegistry.get_id(album)
 
     def destroy(self):
         for signal_id in self.__sigs:
@@ -5,12 +5,17 @@
 # it under the terms of version 2 of the GNU General Public License as
 # published by the Free Software Foundation.
 
+import os
 import re
 import shlex
+from collections import deque
 
 from gi.repository import GObject
 
 from quodlibet import const
+from quodlibet.query import QueryIndex
+from quodlibet.util.library import get_scan_dirs
+from quodlibet.util.path import fsdecode
 from .tcpserver import BaseTCPServer, BaseTCPConnection
 
 
@@ -53,6 +58,31 @@ TAG_MAPPING = [
 ]
 
 
+# lower case MPD tag -> (MPD tag, QL tag)
+TAG_KEYS = dict((m.lower(), (m, q)) for (m, q) in TAG_MAPPING if q)
+
+
+def split_value(value):
+    """The single values of an indexed tag value, see QueryIndex.values"""
+
+    if isinstance(value, basestring):
+        return value.split(u"\n")
+    return [unicode(value)]
+
+
+def get_music_root(dirs):
+    """The deepest directory containing all `dirs`, as unicode ending
+    with a path separator. Song URIs are relative to it."""
+
+    parts = [os.path.normpath(fsdecode(d)).split(os.sep) for d in dirs]
+    common = []
+    for names in zip(*parts):
+        if len(set(names)) != 1:
+            break
+        common.append(names[0])
+    return os.sep.join(common).rstrip(os.sep) + os.sep
+
+
 def format_tags(song):
     """Gives a tag list message for a song"""
 
@@ -183,6 +213,11 @@ class MPDService(object):
         self._idle_subscriptions = {}
         self._pl_ver = 0
 
+        # tag values for the database commands, built on first use
+        self._index = QueryIndex(app.library)
+        self._index.MAX_TAGS = len(TAG_KEYS) + 2
+        self._root = get_music_root(get_scan_dirs())
+
         self._options = PlayerOptions(app)
 
         def options_changed(*args):
@@ -227,8 +262,10 @@ class MPDService(object):
         for id_ in self._player_sigs:
             self._app.player.disconnect(id_)
         self._options.destroy()
+        self._index.destroy()
         del self._app
         del self._options
+        del self._index
 
     def add_connection(self, connection):
         self._connections.add(connection)
@@ -311,14 +348,15 @@ class MPDService(object):
         self._options.set_single(value)
 
     def stats(self):
-        has_song = int(bool(self._app.player.info))
+        lengths = self._index.values("~#length")
+        playtime = sum(l * len(s) for l, s in lengths.iteritems() if l)
         stats = [
-            ("artists", has_song),
-            ("albums", has_song),
-            ("songs", has_song),
+            ("artists", len(self.list(u"artist"))),
+            ("albums", len(self.list(u"album"))),
+            ("songs", len(self._index.songs)),
             ("uptime", 1),
             ("playtime", 1),
-            ("db_playtime", 1),
+            ("db_playtime", int(playtime)),
             ("db_update", 1252868674),
         ]
 
@@ -372,8 +410,7 @@ class MPDService(object):
             return None
 
         parts = []
-        parts.append(u"file: %s" % info("~filename"))
-        parts.append(format_tags(info))
+        parts.append(self.format_song(info))
         parts.append(u"Pos: %d" % 0)
         parts.append(u"Id: %d" % self._get_id(info))
 
@@ -396,11 +433,165 @@ class MPDService(object):
         info = self._app.player.info
         if version != self._pl_ver and info:
             parts = []
-            parts.append(u"file: %s" % info("~filename"))
+            parts.append(u"file: %s" % self.get_uri(info))
             parts.append(u"Pos: %d" % 0)
             parts.append(u"Id: %d" % self._get_id(info))
             return u"\n".join(parts)
 
+    def get_uri(self, song):
+        """The file URI of a song, relative to the music directory"""
+
+        return self._path_to_uri(fsdecode(song("~filename")))
+
+    def _path_to_uri(self, path):
+        root = self._root
+        if path.startswith(root):
+            return path[len(root):]
+        # outside of the music directory, use the absolute path
+        return path
+
+    def _uri_to_path(self, uri):
+        return os.path.normpath(os.path.join(self._root, uri))
+
+    def format_song(self, song):
+        """The file and tag lines of a song"""
+
+        tags = format_tags(song)
+        line = u"file: %s" % self.get_uri(song)
+        return line + u"\n" + tags if tags else line
+
+    def _match(self, tag, needle, exact):
+        """Returns the set of songs for which the MPD `tag` is `needle`
+        if `exact`, or contains it ignoring case otherwise"""
+
+        tag = tag.lower()
+        if not exact:
+            needle = needle.lower()
+
+        if tag in (u"file", u"base"):
+            filenames = self._index.values("~filename")
+            if tag == u"file":
+                if exact:
+                    return set(filenames.get(self._uri_to_path(needle), ()))
+                match = lambda p: needle in self._path_to_uri(p).lower()
+            else:
+                prefix = self._uri_to_path(needle).rstrip(os.sep) + os.sep
+                match = lambda p: p.startswith(prefix)
+
+            result = set()
+            for path, songs in filenames.iteritems():
+                if match(path):
+                    result |= songs
+            return result
+
+        if tag == u"any":
+            keys = set(q for (m, q) in TAG_KEYS.itervalues())
+        elif tag in TAG_KEYS:
+            keys = [TAG_KEYS[tag][1]]
+        else:
+            raise MPDRequestError(u"unknown tag type", AckError.ARG)
+
+        result = set()
+        for key in keys:
+            for value, songs in self._index.values(key).iteritems():
+                for v in split_value(value):
+                    if (v == needle) if exact else (needle in v.lower()):
+                        result |= songs
+                        break
+        return result
+
+    def filter(self, filters, exact=True):
+        """Returns the set of songs matching all (tag, needle) pairs"""
+
+        result = None
+        for tag, needle in filters:
+            songs = self._match(tag, needle, exact)
+            result = songs if result is None else result & songs
+        if result is None:
+            return set(self._index.songs)
+        return result
+
+    def find(self, filters, exact=True):
+        """Returns the songs matching all filters, sorted by URI"""
+
+        return sorted(self.filter(filters, exact), key=self.get_uri)
+
+    def count(self, filters):
+        """Returns the number of songs and their total length"""
+
+        songs = self.filter(filters)
+        return len(songs), sum(int(s("~#length", 0)) for s in songs)
+
+    def list(self, tag, filters=None):
+        """Returns the sorted unique values of the MPD `tag` of all songs
+        matching the filters"""
+
+        try:
+            key = TAG_KEYS[tag.lower()][1]
+        except KeyError:
+            raise MPDRequestError(u"unknown tag type", AckError.ARG)
+
+        songs = self.filter(filters) if filters else None
+        result = set()
+        for value, value_songs in self._index.values(key).iteritems():
+            if songs is None or not value_songs.isdisjoint(songs):
+                result.update(split_value(value))
+        result.discard(u"")
+        return sorted(result)
+
+    def lsinfo(self, uri=u""):
+        """Returns a sorted list of directory URIs and a list of songs
+        directly contained in the directory `uri`, or the song itself
+        if `uri` is a file"""
+
+        path = self._uri_to_path(uri)
+        files = self._index.values("~filename").get(path)
+        if files:
+            return [], list(files)
+
+        dirnames = self._index.values("~dirname")
+        prefix = path.rstrip(os.sep) + os.sep
+        dirs = set()
+        for dirname in dirnames:
+            if dirname.startswith(prefix):
+                name = dirname[len(prefix):].split(os.sep, 1)[0]
+                dirs.add(self._path_to_uri(prefix + name))
+
+        songs = sorted(dirnames.get(path, ()), key=self.get_uri)
+        if uri and not dirs and not songs:
+            raise MPDRequestError(u"No such directory", AckError.NO_EXIST)
+        return sorted(dirs), songs
+
+    def listall(self, uri=u""):
+        """Returns (directory URI, songs) for every directory below `uri`,
+        including `uri` itself, parents before their children"""
+
+        path = self._uri_to_path(uri)
+        files = self._index.values("~filename").get(path)
+        if files:
+            return [(None, list(files))]
+
+        dirnames = self._index.values("~dirname")
+        prefix = path.rstrip(os.sep) + os.sep
+        result = {}
+        for dirname, songs in dirnames.iteritems():
+            if dirname != path and not dirname.startswith(prefix):
+                continue
+            result[dirname] = sorted(songs, key=self.get_uri)
+            # parent directories without songs of their own
+            while dirname != path:
+                dirname = os.path.dirname(dirname)
+                result.setdefault(dirname, [])
+
+        if uri and not result:
+            raise MPDRequestError(u"No such directory", AckError.NO_EXIST)
+
+        listing = []
+        for dirname in sorted(result):
+            dir_uri = None if dirname == path else self._path_to_uri(dirname)
+            listing.append((dir_uri, result[dirname]))
+        return listing
+
 
 class MPDServer(BaseTCPServer):
 
@@ -439,7 +630,8 @@ class MPDConnection(BaseTCPConnection):
         service.add_connection(self)
 
         str_version = ".".join(map(str, service.version))
-        self._buf = bytearray("OK MPD %s\n" % str_version)
+        # bytearrays and iterators of lines, in the order to write them
+        self._pending = deque([bytearray("OK MPD %s\n" % str_version)])
         self._read_buf = bytearray()
 
         # begin - command processing state
@@ -477,12 +669,25 @@ class MPDConnection(BaseTCPConnection):
                 del self._command_list[:]
 
     def handle_write(self):
-        data = self._buf[:]
-        del self._buf[:]
+        data = bytearray()
+        pending = self._pending
+        while pending and len(data) < 4096:
+            item = pending[0]
+            if isinstance(item, bytearray):
+                data.extend(pending.popleft())
+                continue
+
+            try:
+                line = next(item)
+            except StopIteration:
+                pending.popleft()
+            else:
+                assert isinstance(line, unicode)
+                data.extend(line.encode("utf-8", errors="replace") + "\n")
         return data
 
     def can_write(self):
-        return bool(self._buf)
+        return bool(self._pending)
 
     def handle_close(self):
         self.log("connection closed")
@@ -517,7 +722,21 @@ class MPDConnection(BaseTCPConnection):
 
         assert isinstance(line, unicode)
 
-        self._buf.extend(line.encode("utf-8", errors="replace") + "\n")
+        data = line.encode("utf-8", errors="replace") + "\n"
+        pending = self._pending
+        if pending and isinstance(pending[-1], bytearray):
+            pending[-1].extend(data)
+        else:
+            pending.append(bytearray(data))
+
+    def write_lines(self, lines):
+        """Writes all lines of an iterable to the client.
+
+        The lines are only taken from it once the client can receive
+        more data, so large responses don't have to be kept in memory.
+        """
+
+        self._pending.append(iter(lines))
 
     def ok(self):
         self.write_line(u"OK")
@@ -751,10 +970,52 @@ def _cmd_currentsong(conn, service, args):
         conn.write_line(stats)
 
 
+def _parse_filters(args):
+    """Parses "TYPE WHAT [TYPE WHAT ...]" into a list of pairs"""
+
+    if len(args) % 2:
+        raise MPDRequestError("incorrect arguments", AckError.ARG)
+    return zip(args[::2], args[1::2])
+
+
 @MPDConnection.Command("count")
 def _cmd_count(conn, service, args):
-    conn.write_line(u"songs: 0")
-    conn.write_line(u"playtime: 0")
+    _verify_length(args, 2)
+    songs, playtime = service.count(_parse_filters(args))
+    conn.write_line(u"songs: %d" % songs)
+    conn.write_line(u"playtime: %d" % playtime)
+
+
+@MPDConnection.Command("find")
+def _cmd_find(conn, service, args):
+    _verify_length(args, 2)
+    songs = service.find(_parse_filters(args))
+    conn.write_lines(service.format_song(s) for s in songs)
+
+
+@MPDConnection.Command("search")
+def _cmd_search(conn, service, args):
+    _verify_length(args, 2)
+    songs = service.find(_parse_filters(args), exact=False)
+    conn.write_lines(service.format_song(s) for s in songs)
+
+
+@MPDConnection.Command("list")
+def _cmd_list(conn, service, args):
+    _verify_length(args, 1)
+    tag = args[0]
+    if len(args) == 2:
+        # old syntax: "list album ARTIST"
+        if tag.lower() != u"album":
+            raise MPDRequestError("should be \"Album\" for 3 arguments",
+                                  AckError.ARG)
+        filters = [(u"artist", args[1])]
+    else:
+        filters = _parse_filters(args[1:])
+
+    name = TAG_KEYS.get(tag.lower(), (tag, None))[0]
+    values = service.list(tag, filters)
+    conn.write_lines(u"%s: %s" % (name, v) for v in values)
 
 
 @MPDConnection.Command("plchanges")
@@ -775,9 +1036,31 @@ def _cmd_plchangesposid(conn, service, args):
         conn.write_line(changes)
 
 
+def _write_listall(conn, service, args, info):
+    uri = args[0] if args else u""
+    listing = service.listall(uri)
+
+    def lines():
+        for dir_uri, songs in listing:
+            if dir_uri is not None:
+                yield u"directory: %s" % dir_uri
+            for song in songs:
+                if info:
+                    yield service.format_song(song)
+                else:
+                    yield u"file: %s" % service.get_uri(song)
+
+    conn.write_lines(lines())
+
+
+@MPDConnection.Command("listall")
+def _cmd_listall(conn, service, args):
+    _write_listall(conn, service, args, False)
+
+
 @MPDConnection.Command("listallinfo")
-def _cmd_listallinfo(*args):
-    _cmd_currentsong(*args)
+def _cmd_listallinfo(conn, service, args):
+    _write_listall(conn, service, args, True)
 
 
 @MPDConnection.Command("seek")
@@ -835,7 +1118,11 @@ def _cmd_tagtypes(conn, service, args):
 
 @MPDConnection.Command("lsinfo")
 def _cmd_lsinfo(conn, service, args):
-    _verify_length(args, 1)
+    uri = args[0] if args else u""
+    dirs, songs = service.lsinfo(uri)
+    for dir_uri in dirs:
+        conn.write_line(u"directory: %s" % dir_uri)
+    conn.write_lines(service.format_song(s) for s in songs)
 
 
 @MPDConnection.Command("playlistinfo")
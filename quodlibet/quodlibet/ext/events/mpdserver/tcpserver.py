@@ -126,6 +126,10 @@ class BaseTCPConnection(object):
     Subclasses need to implement the handle_*() can_*() methods.
     """
 
+    MAX_BUFFER_SIZE = 64 * 1024
+    """handle_write() only gets called while less than this many bytes
+    are waiting to be sent, so slow clients don't fill up memory"""
+
     def __init__(self, server, sock):
         self._server = server
         self._sock = sock
@@ -197,7 +201,8 @@ class BaseTCPConnection(object):
                 return False
 
             if flags & GLib.IOCondition.OUT:
-                if self.can_write():
+                while (len(write_buffer) < self.MAX_BUFFER_SIZE and
+                       self.can_write()):
                     write_buffer.extend(self.handle_write())
                 if not write_buffer:
                     self._out_id = None
@@ -259,7 +264,11 @@ class BaseTCPConnection(object):
         raise NotImplementedError
 
     def handle_write(self):
-        """Called if new data can be written, should return the data"""
+        """Called if new data can be written, should return the data.
+
+        Doesn't need to return all pending data, it gets called again as
+        long as can_write() is True and the send buffer isn't full.
+        """
 
         raise NotImplementedError
 
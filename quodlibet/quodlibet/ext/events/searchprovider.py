@@ -21,6 +21,7 @@ Version=2
 
 import os
 import sys
+import heapq
 
 if os.name == "nt" or sys.platform == "darwin":
     from quodlibet.plugins import PluginNotSupportedError
@@ -33,6 +34,7 @@ from quodlibet import app
 from quodlibet.util.dbusutils import dbus_unicode_validate
 from quodlibet.plugins.events import EventPlugin
 from quodlibet.query import Query
+from quodlibet.library.ids import IDRegistry
 from quodlibet.plugins import PluginImportException
 from quodlibet.util.path import xdg_get_system_data_dirs
 
@@ -92,21 +94,63 @@ ENTRY_ICON = (". GThemedIcon audio-mpeg gnome-mime-audio-mpeg "
               "audio-x-generic")
 
 
+MAX_RESULTS = 100
+"""Maximum number of returned search results"""
+
+
 def get_song_id(song):
-    return str(id(song))
+    return IDRegistry.get_id(song)
 
 
 def get_songs_for_ids(library, ids):
-    songs = []
-    ids = set(ids)
-    for song in library:
-        song_id = get_song_id(song)
-        if song_id in ids:
-            songs.append(song)
-            ids.discard(song_id)
-            if not ids:
-                break
-    return songs
+    return IDRegistry.get(library).get_items(ids)
+
+
+def get_query(terms):
+    query = Query("")
+    for term in terms:
+        query &= Query(term)
+    return query
+
+
+def search_songs(library, query, songs=None):
+    """Returns the songs matching the query, using the query index of
+    the library if there is one"""
+
+    index = getattr(library, "query_index", None)
+    if index is not None:
+        return index.filter(query, songs)
+    if songs is None:
+        songs = library.itervalues()
+    return filter(query.search, songs)
+
+
+def rank_songs(songs, terms, limit=MAX_RESULTS):
+    """Returns at most `limit` songs, the most relevant ones first.
+
+    Songs where the terms are found in the title rank above ones where
+    they are found in the artist or album, ties are broken by play count.
+    """
+
+    terms = [t.lower() for t in terms]
+
+    def relevance(song):
+        title = song("title").lower()
+        artist = song("artist").lower()
+        album = song("album").lower()
+        score = 0
+        for term in terms:
+            if title.startswith(term):
+                score += 4
+            elif term in title:
+                score += 3
+            elif term in artist:
+                score += 2
+            elif term in album:
+                score += 1
+        return score, song("~#playcount", 0)
+
+    return heapq.nlargest(limit, songs, key=relevance)
 
 
 class SearchProvider(dbus.service.Object):
@@ -122,25 +166,21 @@ class SearchProvider(dbus.service.Object):
     @dbus.service.method(IFACE, in_signature="as", out_signature="as")
     def GetInitialResultSet(self, terms):
         if terms:
-            query = Query("")
-            for term in terms:
-                query &= Query(term)
-            songs = filter(query.search, app.library)
+            songs = search_songs(app.library, get_query(terms))
         else:
             songs = app.library.values()
 
-        ids = [get_song_id(s) for s in songs]
-        return ids
+        return [get_song_id(s) for s in rank_songs(songs, terms)]
 
     @dbus.service.method(IFACE, in_signature="asas", out_signature="as")
     def GetSubsearchResultSet(self, previous_results, terms):
-        query = Query("")
-        for term in terms:
-            query &= Query(term)
+        if len(previous_results) >= MAX_RESULTS:
+            # the previous results got cut off, so search everything
+            return self.GetInitialResultSet(terms)
 
         songs = get_songs_for_ids(app.library, previous_results)
-        ids = [get_song_id(s) for s in songs if query.search(s)]
-        return ids
+        songs = search_songs(app.library, get_query(terms), songs)
+        return [get_song_id(s) for s in rank_songs(songs, terms)]
 
     @dbus.service.method(IFACE, in_signature="as",
                          out_signature="aa{sv}")
@@ -16,9 +16,11 @@ also be queried in various ways.
 import time
 
 from quodlibet import print_d
+from quodlibet import config
 import quodlibet.formats as formats
 
-from quodlibet.library.libraries import SongFileLibrary, SongLibrary
+from quodlibet.library.libraries import SongFileLibrary, SongLibrary, \
+    JournalingSongFileLibrary, SongInterner
 from quodlibet.library.librarians import SongLibrarian
 from quodlibet.util.path import mtime
 
@@ -27,14 +29,27 @@ def init(cache_fn=None):
     """Set up the library and return the main one.
 
     Return a main library, and set a librarian for
-    all future SongLibraries.
+    all future SongLibraries. If the "journal" library option is set
+    the main library only appends changes to a journal when saving,
+    with "intern_tags" songs share equal tag keys and values, with
+    "query_index" queries use an index of tag values and with "sort_cache"
+    the songs are kept presorted.
     """
     s = ", ".join(formats.modules)
     print_d("Supported formats: %s" % s)
     SongFileLibrary.librarian = SongLibrary.librarian = SongLibrarian()
-    library = SongFileLibrary("main")
+    if config.getboolean("library", "journal", False):
+        library = JournalingSongFileLibrary("main")
+    else:
+        library = SongFileLibrary("main")
+    if config.getboolean("library", "intern_tags", False):
+        library.interner = SongInterner()
     if cache_fn:
         library.load(cache_fn)
+    if config.getboolean("library", "query_index", False):
+        library.enable_query_index()
+    if config.getboolean("library", "sort_cache", False):
+        library.enable_sorter()
     return library
 
 
@@ -53,5 +68,13 @@ def save(save_period=None):
         if not filename or not lib.dirty:
             continue
 
-        if not save_period or abs(time.time() - mtime(filename)) > save_period:
+        # with a journal the snapshot only gets written on compaction
+        last_save = mtime(filename)
+        journal = getattr(lib, "journal_filename", None)
+        if journal is not None:
+            last_save = max(last_save, mtime(journal))
+
+        if not save_period or abs(time.time() - last_save) > save_period:
             lib.save()
+            if isinstance(lib, SongLibrary):
+                lib.save_sorter()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+"""Stable string IDs for library items.
+
+Interfaces like D-Bus need to refer to songs or albums by a short string
+and later find them again. IDRegistry hands out such IDs and resolves
+them without looking at every item of the library.
+"""
+
+
+class IDRegistry(object):
+    """Maps IDs to the items of a library, updated through the library
+    signals.
+
+    The ID of an item stays the same as long as it's in the library.
+    An ID of an item that got removed no longer resolves, even if a new
+    item happens to get the same ID.
+    """
+
+    def __init__(self, library):
+        self._library = library
+        self._items = {}
+        self.__added(library, library.itervalues())
+        self._sigs = [
+            library.connect('added', self.__added),
+            library.connect('removed', self.__removed),
+        ]
+
+    @classmethod
+    def get(cls, library):
+        """Returns the registry shared by all users of the library"""
+
+        registry = getattr(library, "_id_registry", None)
+        if registry is None:
+            registry = library._id_registry = cls(library)
+        return registry
+
+    def destroy(self):
+        for sig in self._sigs:
+            self._library.disconnect(sig)
+        self._items.clear()
+        if getattr(self._library, "_id_registry", None) is self:
+            del self._library._id_registry
+
+    def __len__(self):
+        return len(self._items)
+
+    @staticmethod
+    def get_id(item):
+        """Returns the ID of the item"""
+
+        return str(id(item))
+
+    def get_item(self, item_id):
+        """Returns the item for the ID or None"""
+
+        return self._items.get(str(item_id))
+
+    def get_items(self, item_ids):
+        """Returns a list of the items for the IDs, in the same order.
+        Unknown IDs are skipped."""
+
+        get = self._items.get
+        items = []
+        for item_id in item_ids:
+            item = get(str(item_id))
+            if item is not None:
+                items.append(item)
+        return items
+
+    def __contains__(self, item):
+        return self._items.get(self.get_id(item)) is item
+
+    def __added(self, library, items):
+        for item in items:
+            self._items[self.get_id(item)] = item
+
+    def __removed(self, library, items):
+        for item in items:
+            item_id = self.get_id(item)
+            if self._items.get(item_id) is item:
+                del self._items[item_id]
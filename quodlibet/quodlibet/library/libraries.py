@@ -15,7 +15,10 @@ least useful but most content-agnostic.
 
 from pickle import Unpickler
 from cStringIO import StringIO
+from bisect import bisect_left
 import cPickle as pickle
+import collections
+import multiprocessing
 import os
 import shutil
 import time
@@ -23,7 +26,8 @@ import time
 from gi.repository import GObject
 
 from quodlibet.formats import MusicFile
-from quodlibet.query import Query
+from quodlibet.formats._audio import MIGRATE, AudioFile
+from quodlibet.query import Query, QueryIndex
 from quodlibet.qltk.notif import Task
 from quodlibet.util.collection import Album
 from quodlibet.util.collections import DictMixin
@@ -32,7 +36,7 @@ from quodlibet import const
 from quodlibet import formats
 from quodlibet.util.dprint import print_d, print_w
 from quodlibet.util.path import fsdecode, expanduser, unexpand, mkdir, \
-    normalize_path
+    normalize_path, filesize
 
 
 class Library(GObject.GObject, DictMixin):
@@ -339,6 +343,236 @@ class PicklingLibrary(Library, PicklingMixin):
         Library.__init__(self, name)
 
 
+def _snapshot_stamp(filename):
+    """Identifies a snapshot file, so a journal written against it can
+    tell if the snapshot was replaced in the meantime."""
+
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime)
+
+
+def read_journal(filename, stamp):
+    """Returns the list of records of the journal at `filename` or `None`
+    if the journal is missing or doesn't belong to the snapshot with the
+    given stamp.
+
+    A truncated or broken record (e.g. after a crash during a save) ends
+    the journal, all records before it are returned.
+    """
+
+    try:
+        with open(filename, "rb") as fileobj:
+            data = fileobj.read()
+    except EnvironmentError:
+        return None
+
+    fileobj = StringIO(data)
+    try:
+        version, journal_stamp = pickle.load(fileobj)
+    except Exception:
+        print_w("Couldn't read library journal header: %r" % filename)
+        return None
+
+    if version != JournalingMixin.JOURNAL_VERSION or journal_stamp != stamp:
+        print_d("Ignoring stale library journal %r" % filename)
+        return None
+
+    records = []
+    while True:
+        try:
+            records.append(pickle.load(fileobj))
+        except EOFError:
+            break
+        except Exception:
+            print_w("Library journal %r is truncated, ignoring the rest"
+                    % filename)
+            util.print_exc()
+            break
+
+    return records
+
+
+class JournalingMixin(PicklingMixin):
+    """A mixin to provide persistence of a library using a pickled snapshot
+    and an append-only journal.
+
+    The snapshot has the same format as the one written by `PicklingMixin`,
+    so existing files can be loaded and get migrated on the first save.
+    Instead of rewriting the snapshot on every save, only the items which
+    were added, changed or removed since the last save (tracked through the
+    library signals) get appended to a journal next to it. Once the journal
+    grows larger than `compact_ratio` times the snapshot, the next save
+    writes a new snapshot and starts a new journal.
+    """
+
+    JOURNAL_VERSION = 1
+
+    compact_ratio = 0.5
+    """Compact once the journal is this size relative to the snapshot"""
+
+    def __init__(self, *args, **kwargs):
+        super(JournalingMixin, self).__init__(*args, **kwargs)
+
+        # item -> key at the time it was last written
+        self._journal_keys = {}
+        self._journal_changed = set()
+        self._journal_removed = set()
+        self._journal_active = False
+
+        self.connect('added', self.__changed)
+        self.connect('changed', self.__changed)
+        self.connect('removed', self.__removed)
+
+    @property
+    def journal_filename(self):
+        if self.filename is None:
+            return None
+        return self.filename + ".journal"
+
+    def _journal_keeps(self, item):
+        """If a removed item still has to be saved (see `get_content`)"""
+
+        return False
+
+    def __changed(self, library, items):
+        self._journal_changed.update(items)
+
+    def __removed(self, library, items):
+        self._journal_remove(
+            [i for i in items if not self._journal_keeps(i)])
+
+    def _journal_remove(self, items):
+        """Record items as removed without going through the signal"""
+
+        for item in items:
+            self._journal_changed.discard(item)
+            key = self._journal_keys.pop(item, None)
+            if key is not None:
+                self._journal_removed.add(key)
+
+    def load(self, filename):
+        """Load a library from a snapshot file and replay its journal.
+
+        Loading does not cause added, changed, or removed signals.
+        """
+
+        self.filename = filename
+        print_d("Loading contents of %r." % filename, self)
+
+        items = load_items(filename)
+        records = read_journal(
+            self.journal_filename, _snapshot_stamp(filename))
+
+        if records:
+            print_d("Replaying %d journal records." % len(records), self)
+            contents = dict((item.key, item) for item in items)
+            for removed, changed in records:
+                for key in removed:
+                    contents.pop(key, None)
+                for old_key, item in changed:
+                    if old_key is not None:
+                        contents.pop(old_key, None)
+                    contents[item.key] = item
+            items = contents.values()
+
+        self._load_init(items)
+
+        self._journal_keys = dict((i, i.key) for i in self.get_content())
+        self._journal_changed.clear()
+        self._journal_removed.clear()
+        self._journal_active = records is not None
+
+        print_d("Done loading contents of %r." % filename, self)
+
+    def save(self, filename=None):
+        """Save the library to the given filename, or the default if `None`.
+
+        Saving to the file the library was loaded from appends to the
+        journal or compacts it, saving to any other file writes a full
+        snapshot.
+        """
+
+        if self.filename is None or filename not in (None, self.filename):
+            return super(JournalingMixin, self).save(filename)
+
+        if not self._journal_active:
+            if os.path.exists(self.filename):
+                # migrate an existing snapshot without rewriting it
+                self.__start_journal()
+            else:
+                return self.compact()
+
+        journal = self.journal_filename
+        if not os.path.exists(journal):
+            # got removed, so the snapshot is missing the changes in it
+            # and records appended without a header would get ignored
+            return self.compact()
+
+        snapshot_size = filesize(self.filename)
+        if filesize(journal) > snapshot_size * self.compact_ratio:
+            return self.compact()
+
+        if not self._journal_changed and not self._journal_removed:
+            self.dirty = False
+            return
+
+        keys = self._journal_keys
+        changed = [(keys.get(i), i) for i in self._journal_changed]
+        removed = list(self._journal_removed)
+
+        print_d("Appending %d changed, %d removed items to %r." % (
+            len(changed), len(removed), journal), self)
+
+        try:
+            with open(journal, "ab") as fileobj:
+                pickle.dump((removed, changed), fileobj, 1)
+                fileobj.flush()
+                os.fsync(fileobj.fileno())
+        except EnvironmentError:
+            print_w("Couldn't append to library journal: %r" % journal)
+            return
+
+        for old_key, item in changed:
+            keys[item] = item.key
+        self._journal_changed.clear()
+        self._journal_removed.clear()
+        self.dirty = False
+
+    def compact(self):
+        """Write a new snapshot and start a new, empty journal"""
+
+        print_d("Compacting library into %r." % self.filename, self)
+
+        items = self.get_content()
+        try:
+            dump_items(self.filename, items)
+            self.__start_journal()
+        except EnvironmentError:
+            print_w("Couldn't save library to path: %r" % self.filename)
+            return
+
+        self._journal_keys = dict((i, i.key) for i in items)
+        self._journal_changed.clear()
+        self._journal_removed.clear()
+        self.dirty = False
+
+    def __start_journal(self):
+        stamp = _snapshot_stamp(self.filename)
+        with util.atomic_save(self.journal_filename, ".tmp", "wb") as fileobj:
+            pickle.dump((self.JOURNAL_VERSION, stamp), fileobj, 1)
+        self._journal_active = True
+
+
+class JournalingLibrary(JournalingMixin, Library):
+    """A library that keeps its contents in a snapshot and a journal"""
+    def __init__(self, name=None):
+        print_d("Using journaling persistence for library \"%s\"" % name)
+        super(JournalingLibrary, self).__init__(name)
+
+
 class AlbumLibrary(Library):
     """An AlbumLibrary listens to a SongLibrary and sorts its songs into
     albums.
@@ -355,6 +589,8 @@ class AlbumLibrary(Library):
             "AlbumLibrary for %s" % library._name)
 
         self._library = library
+        # song -> album, for finding the old album of changed songs
+        self._albums = {}
         self._asig = library.connect('added', self.__added)
         self._rsig = library.connect('removed', self.__removed)
         self._csig = library.connect('changed', self.__changed)
@@ -378,15 +614,21 @@ class AlbumLibrary(Library):
     def __add(self, items):
         changed = set()
         new = set()
+        added = {}
         for song in items:
             key = song.album_key
             if key in self._contents:
-                changed.add(self._contents[key])
+                album = self._contents[key]
+                changed.add(album)
             else:
                 album = Album(song)
                 self._contents[key] = album
                 new.add(album)
-            self._contents[key].songs.add(song)
+            added.setdefault(album, []).append(song)
+            self._albums[song] = album
+
+        for album, songs in added.iteritems():
+            album.add_songs(songs)
 
         changed -= new
         return changed, new
@@ -394,31 +636,32 @@ class AlbumLibrary(Library):
     def __added(self, library, items, signal=True):
         changed, new = self.__add(items)
 
-        for album in changed:
-            album.finalize()
-
         if signal:
             if new:
                 self.emit('added', new)
             if changed:
                 self.emit('changed', changed)
 
-    def __removed(self, library, items):
-        changed = set()
-        removed = set()
+    def __remove(self, items):
+        """Returns the albums which lost songs"""
+
+        removed = {}
         for song in items:
-            key = song.album_key
-            album = self._contents[key]
-            album.songs.remove(song)
-            changed.add(album)
-            if not album.songs:
-                removed.add(album)
-                del self._contents[key]
+            album = self._albums.pop(song, None)
+            if album is not None:
+                removed.setdefault(album, []).append(song)
 
-        changed -= removed
+        for album, songs in removed.iteritems():
+            album.remove_songs(songs)
+        return set(removed)
 
-        for album in changed:
-            album.finalize()
+    def __removed(self, library, items):
+        changed = self.__remove(items)
+        removed = set(a for a in changed if not a.songs)
+        for album in removed:
+            del self._contents[album.key]
+
+        changed -= removed
 
         if removed:
             self.emit('removed', removed)
@@ -426,40 +669,34 @@ class AlbumLibrary(Library):
             self.emit('changed', changed)
 
     def __changed(self, library, items):
-        """Album keys could change between already existing ones.. so we
-        have to do it the hard way and search by id."""
+        """Songs keep their album if the album key is unchanged, otherwise
+        they move to another one. Albums only update the aggregates of the
+        changed songs."""
+
         print_d("Updating affected albums for %d items" % len(items))
-        changed = set()
-        removed = set()
-        to_add = []
+        updated = {}
+        moved = []
         for song in items:
-            # in case the key hasn't changed
-            key = song.album_key
-            if key in self._contents and song in self._contents[key].songs:
-                changed.add(self._contents[key])
-            else:  # key changed.. look for it in each album
-                to_add.append(song)
-                for key, album in self._contents.iteritems():
-                    if song in album.songs:
-                        album.songs.remove(song)
-                        if not album.songs:
-                            removed.add(album)
-                        else:
-                            changed.add(album)
-                        break
+            album = self._albums.get(song)
+            if album is not None and album.key == song.album_key:
+                updated.setdefault(album, []).append(song)
+            else:
+                moved.append(song)
+
+        for album, songs in updated.iteritems():
+            album.songs_changed(songs)
+        changed = set(updated)
 
         # get new albums and changed ones because keys could have changed
-        add_changed, new = self.__add(to_add)
-        changed |= add_changed
+        removed = self.__remove(moved)
+        add_changed, new = self.__add(moved)
+        changed |= add_changed | removed
 
         # check if albums that were empty at some point are still empty
+        removed = set(a for a in removed if not a.songs)
         for album in removed:
-            if not album.songs:
-                del self._contents[album.key]
-                changed.discard(album)
-
-        for album in changed:
-            album.finalize()
+            del self._contents[album.key]
+            changed.discard(album)
 
         if removed:
             self.emit("removed", removed)
@@ -469,6 +706,227 @@ class AlbumLibrary(Library):
             self.emit("added", new)
 
 
+class SongInterner(object):
+    """Shares equal tag keys and values between songs.
+
+    Songs loaded from disk or created by the format code get their own
+    copy of every key and value, even though most of them (artist, album,
+    genre, "~mountpoint", ...) are the same for many songs. Interning
+    replaces them with one shared object per distinct value.
+
+    Values of tags which are (nearly) unique per song aren't interned,
+    as they wouldn't get shared but would be kept alive by the interner.
+    """
+
+    UNIQUE = frozenset([
+        "~filename", "title", "~#added", "~#lastplayed", "~#laststarted",
+        "~#mtime", "~#length", "~#filesize", "musicbrainz_trackid",
+        "~bookmark", "lyrics", "comment"])
+
+    def __init__(self):
+        self._keys = {}
+        self._values = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def intern_songs(self, songs):
+        """Intern the keys and values of all songs in place"""
+
+        keys = self._keys
+        values = self._values
+        unique = self.UNIQUE
+
+        for song in songs:
+            items = []
+            for key, value in dict.iteritems(song):
+                key = keys.setdefault(key, key)
+                if key not in unique:
+                    # u"1" == "1" == 1.0 == 1, don't mix types
+                    try:
+                        value = values.setdefault((type(value), value), value)
+                    except TypeError:
+                        pass
+                items.append((key, value))
+            # assigning an equal key keeps the old object, so rebuild
+            dict.clear(song)
+            dict.update(song, items)
+
+
+class SongSorter(object):
+    """Keeps all songs of a library sorted by some common sort tags and
+    persists the sort keys of all songs.
+
+    Sorting many songs of the library by one of those tags only needs
+    to pick them from the presorted order, which gives the same result
+    as sorting them by `AudioFile.sort_key` first and the tag second.
+    """
+
+    VERSION = 1
+
+    TAGS = ["", "albumsort", "artistsort", "date", "~#added"]
+    """Sort tags (as returned by `get_sort_tag`) with a presorted order,
+    "" being the default order"""
+
+    MIN_FRACTION = 0.1
+    """Sorting fewer songs than this fraction of the library is faster
+    using list.sort"""
+
+    def __init__(self, library):
+        self._library = library
+        # tag -> (sorted list of keys, songs in the same order)
+        self._orders = {}
+        # tag -> {song: key}, for finding the old key of changed songs
+        self._keys = {}
+        # tag -> {song key: key}, loaded but not used yet
+        self._saved_keys = {}
+        self._stamp = None
+        self.dirty = True
+        self._sigs = [
+            library.connect('added', self.__added),
+            library.connect('changed', self.__changed),
+            library.connect('removed', self.__removed),
+        ]
+
+    def destroy(self):
+        for sig in self._sigs:
+            self._library.disconnect(sig)
+        self._orders.clear()
+        self._keys.clear()
+        self._saved_keys.clear()
+
+    def _library_stamp(self):
+        library = self._library
+        journal = getattr(library, "journal_filename", None)
+        return (_snapshot_stamp(library.filename),
+                journal and _snapshot_stamp(journal))
+
+    def load(self, filename):
+        """Restore the sort keys saved by `save` to the songs, if the
+        library file hasn't changed since then"""
+
+        self._stamp = self._library_stamp()
+        try:
+            with open(filename, "rb") as fileobj:
+                version, stamp, sort_keys, tag_keys = pickle.load(fileobj)
+        except Exception:
+            return
+        if version != self.VERSION or stamp != self._stamp:
+            print_d("Ignoring outdated sort keys")
+            return
+
+        for song in self._library.itervalues():
+            sort_key = sort_keys.get(song.key)
+            if sort_key is not None:
+                song.__dict__["sort_key"] = sort_key
+                song.__dict__["album_key"] = sort_key[0]
+        self._saved_keys = tag_keys
+        self.dirty = False
+
+    def save(self, filename):
+        """Save the sort keys of all songs. Call after saving the library,
+        doesn't handle exceptions."""
+
+        stamp = self._library_stamp()
+        if not self.dirty and stamp == self._stamp:
+            return
+
+        songs = self._library.values()
+        sort_keys = dict((song.key, song.sort_key) for song in songs)
+        tag_keys = {}
+        for tag, keys in self._keys.iteritems():
+            tag_keys[tag] = dict((s.key, k[0]) for s, k in keys.iteritems())
+        with util.atomic_save(filename, ".tmp", "wb") as fileobj:
+            pickle.dump((self.VERSION, stamp, sort_keys, tag_keys),
+                        fileobj, pickle.HIGHEST_PROTOCOL)
+        self._stamp = stamp
+        self.dirty = False
+
+    def _get_order(self, tag):
+        if tag in self._orders:
+            return self._orders[tag]
+
+        saved = self._saved_keys.pop(tag, {})
+        sort_func = tag and AudioFile.sort_by_func(tag)
+        keys = {}
+        for song in self._library.itervalues():
+            if song.key in saved:
+                value = saved[song.key]
+            else:
+                value = sort_func and sort_func(song)
+            keys[song] = (value, song.sort_key)
+
+        pairs = sorted(keys.iteritems(), key=lambda i: i[1])
+        order = ([p[1] for p in pairs], [p[0] for p in pairs])
+        self._orders[tag] = order
+        self._keys[tag] = keys
+        return order
+
+    def sort(self, songs, orders):
+        """Sort the list of songs in place like `SongList` does for the
+        list of (sort tag, reverse) tuples.
+
+        Returns False if the songs weren't sorted, because it wouldn't be
+        faster or the songs or orders aren't supported.
+        """
+
+        if len(orders) != 1 or orders[0][0] not in self.TAGS:
+            return False
+        if len(songs) < len(self._library) * self.MIN_FRACTION:
+            return False
+
+        tag, reverse = orders[0]
+        wanted = set(songs)
+        result = [s for s in self._get_order(tag)[1] if s in wanted]
+        if len(result) != len(songs):
+            # not in the library or duplicates
+            return False
+
+        if reverse:
+            # the sort keys are unique, so this is the same as sorting
+            # with reverse=True
+            result.reverse()
+        songs[:] = result
+        return True
+
+    def __insert(self, songs):
+        for tag, (keys, sorted_songs) in self._orders.iteritems():
+            sort_func = tag and AudioFile.sort_by_func(tag)
+            song_keys = self._keys[tag]
+            for song in songs:
+                key = (sort_func and sort_func(song), song.sort_key)
+                song_keys[song] = key
+                index = bisect_left(keys, key)
+                keys.insert(index, key)
+                sorted_songs.insert(index, song)
+
+    def __remove(self, songs):
+        for tag, (keys, sorted_songs) in self._orders.iteritems():
+            song_keys = self._keys[tag]
+            for song in songs:
+                key = song_keys.pop(song, None)
+                if key is None:
+                    continue
+                index = bisect_left(keys, key)
+                while sorted_songs[index] is not song:
+                    index += 1
+                del keys[index]
+                del sorted_songs[index]
+
+    def __added(self, library, songs):
+        self.__insert(songs)
+        self.dirty = True
+
+    def __changed(self, library, songs):
+        self.__remove(songs)
+        self.__insert(songs)
+        self.dirty = True
+
+    def __removed(self, library, songs):
+        self.__remove(songs)
+        self.dirty = True
+
+
 class SongLibrary(PicklingLibrary):
     """A library for songs.
 
@@ -476,9 +934,30 @@ class SongLibrary(PicklingLibrary):
     interface.
     """
 
+    interner = None
+    """A `SongInterner` which is used for loaded and added songs, if set"""
+
+    query_index = None
+    """A `QueryIndex` used for `query`, see `enable_query_index`"""
+
+    sorter = None
+    """A `SongSorter` keeping the songs presorted, see `enable_sorter`"""
+
     def __init__(self, *args, **kwargs):
         super(SongLibrary, self).__init__(*args, **kwargs)
 
+    def _load_init(self, items):
+        if self.interner is not None:
+            items = list(items)
+            self.interner.intern_songs(items)
+        super(SongLibrary, self)._load_init(items)
+
+    def add(self, items):
+        if self.interner is not None:
+            items = [i for i in items if i not in self]
+            self.interner.intern_songs(items)
+        return super(SongLibrary, self).add(items)
+
     @util.cached_property
     def albums(self):
         return AlbumLibrary(self)
@@ -487,6 +966,37 @@ class SongLibrary(PicklingLibrary):
         super(SongLibrary, self).destroy()
         if "albums" in self.__dict__:
             self.albums.destroy()
+        if self.query_index is not None:
+            self.query_index.destroy()
+            self.query_index = None
+        if self.sorter is not None:
+            self.sorter.destroy()
+            self.sorter = None
+
+    def enable_query_index(self):
+        """Index tag values so `query` doesn't have to match every song"""
+
+        if self.query_index is None:
+            self.query_index = QueryIndex(self)
+
+    def enable_sorter(self):
+        """Keep the songs presorted and their sort keys saved next to the
+        library file. Call after loading the library."""
+
+        if self.sorter is None:
+            self.sorter = SongSorter(self)
+            if self.filename is not None:
+                self.sorter.load(self.filename + ".sort")
+
+    def save_sorter(self):
+        """Save the sort keys, if the library is saved"""
+
+        if self.sorter is None or self.filename is None or self.dirty:
+            return
+        try:
+            self.sorter.save(self.filename + ".sort")
+        except EnvironmentError:
+            print_w("Couldn't save sort keys")
 
     def tag_values(self, tag):
         """Return a list of all values for the given tag."""
@@ -518,14 +1028,255 @@ class SongLibrary(PicklingLibrary):
             self.changed(set([song]))
 
     def query(self, text, sort=None, star=Query.STAR):
-        """Query the library and return matching songs."""
-        if isinstance(text, str):
-            text = text.decode('utf-8')
+        """Query the library and return matching songs.
+
+        `text` can also be a `Query` instance.
+        """
+
+        if isinstance(text, Query):
+            query = text
+        else:
+            if isinstance(text, str):
+                text = text.decode('utf-8')
+            if text == "":
+                return self.values()
+            query = Query(text, star)
+
+        if self.query_index is not None:
+            return self.query_index.filter(query)
+        return filter(query.search, self.values())
+
+
+class DirectoryIndex(object):
+    """Remembers the mtime and subdirectories of scanned directories.
+
+    Adding, removing or renaming a file changes the mtime of its directory,
+    so the files of directories which didn't change since they were last
+    scanned can't contain anything new and don't need to be listed.
+    Modifying a file in place doesn't change the directory mtime.
+    """
+
+    VERSION = 1
+
+    RACY = 2.0
+    """Seconds an mtime has to be older than the time it was recorded,
+    for file systems with coarse timestamps"""
+
+    def __init__(self, signature=None):
+        # path -> (mtime, time recorded, subdirectory names)
+        self._dirs = {}
+        self._pending = {}
+        self._seen = set()
+        self.signature = signature
+
+    def __len__(self):
+        return len(self._dirs)
+
+    def clear(self):
+        self._dirs.clear()
+        self._pending.clear()
+        self._seen.clear()
+
+    def load(self, filename, signature):
+        """Load the index, if it was saved with a different signature
+        (e.g. other supported file types) start with an empty one."""
+
+        self.clear()
+        self.signature = signature
+        try:
+            with open(filename, "rb") as fileobj:
+                version, saved_signature, dirs = pickle.load(fileobj)
+        except Exception:
+            return
+        if version == self.VERSION and saved_signature == signature:
+            self._dirs = dirs
+
+    def save(self, filename):
+        """Doesn't handle exceptions"""
+
+        with util.atomic_save(filename, ".tmp", "wb") as fileobj:
+            pickle.dump((self.VERSION, self.signature, self._dirs),
+                        fileobj, pickle.HIGHEST_PROTOCOL)
+
+    def _unchanged(self, path, mtime):
+        try:
+            old_mtime, recorded, dirnames = self._dirs[path]
+        except KeyError:
+            return False
+        return old_mtime == mtime and recorded - mtime > self.RACY
+
+    def changed(self, path):
+        """If the directory changed since it was last committed"""
+
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return True
+        return not self._unchanged(path, mtime)
+
+    def walk(self, top, skip_unchanged=True):
+        """Like os.walk(top), but for directories which didn't change the
+        list of file names is empty (unless `skip_unchanged` is False).
+
+        The walked directories are recorded once `commit` is called.
+        """
+
+        # forget about walks which didn't get committed
+        self._pending.clear()
+        self._seen.clear()
+
+        stack = [top]
+        while stack:
+            path = stack.pop()
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            self._seen.add(path)
+
+            if skip_unchanged and self._unchanged(path, mtime):
+                dirnames = list(self._dirs[path][2])
+                filenames = []
+            else:
+                try:
+                    names = os.listdir(path)
+                except OSError:
+                    continue
+                dirnames, filenames = [], []
+                for name in names:
+                    if os.path.isdir(os.path.join(path, name)):
+                        dirnames.append(name)
+                    else:
+                        filenames.append(name)
+                self._pending[path] = (mtime, time.time(), list(dirnames))
+
+            yield path, dirnames, filenames
+
+            for name in reversed(dirnames):
+                sub = os.path.join(path, name)
+                if not os.path.islink(sub):
+                    stack.append(sub)
+
+    def commit(self, top, failed=()):
+        """Record all directories walked below `top` and forget the
+        ones which weren't found anymore.
+
+        Directories in `failed` don't get recorded, so they get listed
+        again on the next walk (e.g. because some files couldn't be loaded
+        yet).
+        """
+
+        prefix = os.path.join(top, "")
+        for path in self._dirs.keys():
+            if (path == top or path.startswith(prefix)) and \
+                    path not in self._seen:
+                del self._dirs[path]
+        for path in failed:
+            self._pending.pop(path, None)
+            self._dirs.pop(path, None)
+        self._dirs.update(self._pending)
+        self._pending.clear()
+        self._seen.clear()
+
+
+class SerialItemLoader(object):
+    """Loads items one at a time in the main process.
+
+    Has the same interface as `ParallelItemLoader` and is used in case
+    items can't be loaded in worker processes.
+    """
+
+    def __init__(self, load):
+        self._load = load
+        self._done = []
+
+    def __len__(self):
+        return len(self._done)
+
+    def full(self):
+        return False
+
+    def put(self, filename):
+        self._done.append((filename, self._load(filename)))
+
+    def flush(self):
+        pass
+
+    def get(self, timeout=0):
+        done, self._done = self._done, []
+        return done
+
+    def close(self):
+        pass
+
+
+class ParallelItemLoader(object):
+    """Loads items in a pool of worker processes.
+
+    `load_many` has to be a module level function taking a list of
+    filenames and returning a list of items (or None in case loading
+    failed). Filenames passed to put() get sent to the workers in chunks
+    and get() returns (filename, item) pairs of finished chunks in the
+    order they were put.
+    """
 
-        songs = self.values()
-        if text != "":
-            songs = filter(Query(text, star).search, songs)
-        return songs
+    CHUNK_SIZE = 16
+
+    def __init__(self, load_many, processes=None):
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        self._load_many = load_many
+        self._pool = multiprocessing.Pool(processes)
+        self._max_pending = processes * 2
+        self._pending = collections.deque()
+        self._chunk = []
+
+    def __len__(self):
+        """Number of filenames for which get() hasn't returned a result"""
+
+        return len(self._chunk) + sum(len(f) for f, r in self._pending)
+
+    def full(self):
+        """If put() shouldn't get called before results got fetched"""
+
+        return len(self._pending) >= self._max_pending
+
+    def put(self, filename):
+        self._chunk.append(filename)
+        if len(self._chunk) >= self.CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Send incomplete chunks to the workers"""
+
+        if self._chunk:
+            result = self._pool.map_async(
+                self._load_many, [self._chunk], chunksize=1)
+            self._pending.append((self._chunk, result))
+            self._chunk = []
+
+    def get(self, timeout=0):
+        """Returns a list of (filename, item) pairs, waits at most
+        `timeout` seconds for the next chunk if none is ready."""
+
+        pending = self._pending
+        if pending and timeout:
+            pending[0][1].wait(timeout)
+
+        done = []
+        while pending and pending[0][1].ready():
+            filenames, result = pending.popleft()
+            try:
+                items = result.get()[0]
+            except Exception:
+                util.print_exc()
+                items = [None] * len(filenames)
+            done.extend(zip(filenames, items))
+        return done
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
 
 
 class FileLibrary(PicklingLibrary):
@@ -535,9 +1286,66 @@ class FileLibrary(PicklingLibrary):
     and have a mountpoint attribute.
     """
 
+    load_many = None
+    """A module level function taking a list of filenames and returning
+    a list of items or None. If set, items get loaded in worker processes
+    when scanning or rebuilding the library."""
+
     def __init__(self, name=None):
         super(FileLibrary, self).__init__(name)
         self._masked = {}
+        self._dir_index = None
+
+    def _get_dir_index(self, exclude):
+        """Returns the `DirectoryIndex`, loaded from next to the library
+        file if there is one"""
+
+        signature = (sorted(exclude), sorted(formats._extensions))
+        index = self._dir_index
+        if index is None:
+            index = self._dir_index = DirectoryIndex(signature)
+            # the index only describes what is in the saved library, if
+            # that failed to load everything has to be listed again
+            if self.filename is not None and (self._contents or
+                                              self._masked):
+                index.load(self.filename + ".dirs", signature)
+        elif index.signature != signature:
+            index.clear()
+            index.signature = signature
+        return index
+
+    def _save_dir_index(self, filename=None):
+        """Saves the directory index next to the library file, in case
+        the library got saved"""
+
+        if filename is None:
+            filename = self.filename
+        if self._dir_index is None or filename is None or self.dirty:
+            return
+        try:
+            self._dir_index.save(filename + ".dirs")
+        except EnvironmentError:
+            print_w("Couldn't save directory index")
+
+    def save(self, filename=None):
+        super(FileLibrary, self).save(filename)
+        self._save_dir_index(filename)
+
+    def _parallel_loader(self):
+        """Returns a `ParallelItemLoader` or None if not available"""
+
+        if self.load_many is None or os.name == "nt":
+            return
+        try:
+            return ParallelItemLoader(self.load_many)
+        except (EnvironmentError, ImportError):
+            util.print_exc()
+
+    def _update_item(self, item, loaded):
+        """Update `item` with the content of a freshly loaded copy
+        (see `load_many`). Returns False if not supported."""
+
+        return False
 
     def _load_init(self, items):
         """Add many items to the library, check if the
@@ -637,7 +1445,8 @@ class FileLibrary(PicklingLibrary):
             else:
                 removed.add(item)
 
-    def rebuild(self, paths, force=False, exclude=[], cofuncid=None):
+    def rebuild(self, paths, force=False, exclude=[], cofuncid=None,
+                quick=False):
         """Reload or remove songs if they have changed or been deleted.
 
         This generator rebuilds the library over the course of iteration.
@@ -648,12 +1457,31 @@ class FileLibrary(PicklingLibrary):
         Only items present in the library when the rebuild is started
         will be checked.
 
+        If `quick` is True, items (keyed by filename) in directories which
+        didn't change since the last scan aren't checked and these
+        directories aren't scanned for new files. This misses files which
+        were modified in place or removed from the library.
+
         If this function is copooled, set "cofuncid" to enable pause/stop
         buttons in the UI.
         """
 
         print_d("Rebuilding, force is %s." % force, self)
 
+        index = self._get_dir_index(
+            [expanduser(path) for path in exclude if path])
+        if force:
+            index.clear()
+        dir_changed = {}
+
+        def needs_check(key):
+            if not quick:
+                return True
+            dirname = os.path.dirname(key)
+            if dirname not in dir_changed:
+                dir_changed[dirname] = index.changed(dirname)
+            return dir_changed[dirname]
+
         task = Task(_("Library"), _("Checking mount points"))
         if cofuncid:
             task.copool(cofuncid)
@@ -668,20 +1496,58 @@ class FileLibrary(PicklingLibrary):
         if cofuncid:
             task.copool(cofuncid)
         changed, removed = set(), set()
-        for i, (key, item) in task.list(enumerate(sorted(self.items()))):
-            if key in self._contents and force or not item.valid():
-                self.reload(item, changed, removed)
+
+        # reload existing files in worker processes if possible,
+        # keyed by filename
+        loader = self._parallel_loader()
+        reloading = {}
+
+        def reloaded(timeout=0):
+            for key, loaded in loader.get(timeout):
+                item = reloading.pop(key)
+                if self._contents.get(key) is not item:
+                    continue
+                if loaded is not None and self._update_item(item, loaded):
+                    changed.add(item)
+                else:
+                    self.reload(item, changed, removed)
+
+        try:
+            items = sorted(self.items())
+            for i, (key, item) in task.list(enumerate(items)):
+                if key in self._contents and force or \
+                        needs_check(key) and not item.valid():
+                    if loader is not None and item.exists():
+                        reloading[key] = item
+                        loader.put(key)
+                    else:
+                        self.reload(item, changed, removed)
+                if loader is not None:
+                    reloaded()
+                    while loader.full():
+                        reloaded(0.01)
+                        yield True
                 # These numbers are pretty empirical. We should yield more
-            # often than we emit signals; that way the main loop stays
-            # interactive and doesn't get bogged down in updates.
-            if len(changed) > 100:
-                self.emit('changed', changed)
-                changed = set()
-            if len(removed) > 100:
-                self.emit('removed', removed)
-                removed = set()
-            if len(changed) > 5 or i % 100 == 0:
-                yield True
+                # often than we emit signals; that way the main loop stays
+                # interactive and doesn't get bogged down in updates.
+                if len(changed) > 100:
+                    self.emit('changed', changed)
+                    changed = set()
+                if len(removed) > 100:
+                    self.emit('removed', removed)
+                    removed = set()
+                if len(changed) > 5 or i % 100 == 0:
+                    yield True
+
+            if loader is not None:
+                loader.flush()
+                while len(loader):
+                    reloaded(0.01)
+                    yield True
+        finally:
+            if loader is not None:
+                loader.close()
+
         print_d("Removing %d, changing %d." % (len(removed), len(changed)),
                 self)
         if removed:
@@ -689,7 +1555,7 @@ class FileLibrary(PicklingLibrary):
         if changed:
             self.emit('changed', changed)
 
-        for value in self.scan(paths, exclude, cofuncid):
+        for value in self.scan(paths, exclude, cofuncid, quick):
             yield value
 
     def add_filename(self, filename, add=True):
@@ -699,9 +1565,31 @@ class FileLibrary(PicklingLibrary):
         """
         raise NotImplementedError
 
-    def scan(self, paths, exclude=[], cofuncid=None):
+    def scan(self, paths, exclude=[], cofuncid=None, quick=False):
+        """Add all new files found in `paths`.
+
+        If `quick` is True, directories which didn't change since the last
+        scan don't get listed, so files removed from the library but not
+        from the disk don't get added again.
+        """
+
+        loader = self._parallel_loader()
+        if loader is None:
+            loader = SerialItemLoader(
+                lambda filename: self.add_filename(filename, False))
+        try:
+            for value in self._scan(paths, exclude, cofuncid, loader, quick):
+                yield value
+        finally:
+            loader.close()
+
+    def _scan(self, paths, exclude, cofuncid, loader, quick):
         added = []
+        # loaded filename -> directory it was found in
+        origins = {}
+        failed = set()
         exclude = [expanduser(path) for path in exclude if path]
+        index = self._get_dir_index(exclude)
 
         def need_yield(last_yield=[0]):
             current = time.time()
@@ -717,6 +1605,15 @@ class FileLibrary(PicklingLibrary):
                 return True
             return False
 
+        def collect(timeout=0):
+            for filename, item in loader.get(timeout):
+                path = origins.pop(filename, None)
+                if item is not None:
+                    added.append(item)
+                elif path is not None:
+                    # maybe still being copied, look again next time
+                    failed.add(path)
+
         for fullpath in paths:
             print_d("Scanning %r." % fullpath, self)
             desc = _("Scanning %s") % (unexpand(fsdecode(fullpath)))
@@ -726,7 +1623,7 @@ class FileLibrary(PicklingLibrary):
                 fullpath = expanduser(fullpath)
                 if filter(fullpath.startswith, exclude):
                     continue
-                for path, dnames, fnames in os.walk(fullpath):
+                for path, dnames, fnames in index.walk(fullpath, quick):
                     for filename in fnames:
                         fullfilename = os.path.join(path, filename)
                         if filter(fullfilename.startswith, exclude):
@@ -739,21 +1636,34 @@ class FileLibrary(PicklingLibrary):
                             if filter(fullfilename.startswith, exclude):
                                 continue
                             if fullfilename not in self._contents:
-                                item = self.add_filename(fullfilename, False)
-                                if item is not None:
-                                    added.append(item)
-                                    if len(added) > 100 or need_added():
-                                        self.add(added)
-                                        added = []
-                                        task.pulse()
-                                        yield
+                                origins[fullfilename] = path
+                                loader.put(fullfilename)
+                                collect()
+                                while loader.full():
+                                    collect(0.01)
+                                    yield
+                                if added and (
+                                        len(added) > 100 or need_added()):
+                                    self.add(added)
+                                    del added[:]
+                                    task.pulse()
+                                    yield
                                 if added and need_yield():
                                     yield
+                loader.flush()
+                while len(loader):
+                    collect(0.01)
+                    yield
                 if added:
                     self.add(added)
-                    added = []
+                    del added[:]
                     task.pulse()
-                    yield True
+                # everything found got added, so the directories don't
+                # need to be listed again. The index gets saved with the
+                # library, so they get listed if the new songs got lost.
+                index.commit(fullpath, failed)
+                failed.clear()
+                yield True
 
     def get_content(self):
         """Return visible and masked items"""
@@ -795,8 +1705,10 @@ class FileLibrary(PicklingLibrary):
             if item.mountpoint == point:
                 removed[item.key] = item
         if removed:
-            self.remove(removed.values())
+            # mask before removing, so 'removed' handlers can tell
+            # masked items apart
             self._masked.setdefault(point, {}).update(removed)
+            self.remove(removed.values())
 
     @property
     def masked_mount_points(self):
@@ -815,10 +1727,35 @@ class FileLibrary(PicklingLibrary):
         self._masked.pop(mount_point, {})
 
 
+def load_songs(filenames):
+    """Returns a song or None for each filename.
+
+    Used for loading songs in worker processes.
+    """
+
+    return [MusicFile(filename) for filename in filenames]
+
+
 class SongFileLibrary(SongLibrary, FileLibrary):
     """A library containing song files.
     Pickles contents to disk as `FileLibrary`"""
 
+    load_many = staticmethod(load_songs)
+
+    def _update_item(self, song, loaded):
+        # like AudioFile.reload()
+        if type(song) is not type(loaded) or song.key != loaded.key:
+            return False
+        saved = {}
+        for key in MIGRATE:
+            if key in song:
+                saved[key] = song[key]
+        song.clear()
+        for key, value in loaded.iteritems():
+            song[key] = value
+        song.update(saved)
+        return True
+
     def __init__(self, name=None):
         print_d("Initializing SongFileLibrary \"%s\"." % name)
         super(SongFileLibrary, self).__init__(name)
@@ -847,3 +1784,24 @@ class SongFileLibrary(SongLibrary, FileLibrary):
             song = self._contents[key]
 
         return song
+
+
+class JournalingSongFileLibrary(JournalingMixin, SongFileLibrary):
+    """A `SongFileLibrary` which saves changes to a journal
+    instead of rewriting all songs on every save."""
+
+    def _journal_keeps(self, item):
+        # masked songs are removed from the library but still get saved
+        return self._masked.get(item.mountpoint, {}).get(item.key) is item
+
+    def save(self, filename=None):
+        super(JournalingSongFileLibrary, self).save(filename)
+        if filename in (None, self.filename):
+            # appending to the journal doesn't go through FileLibrary.save
+            self._save_dir_index()
+
+    def remove_masked(self, mount_point):
+        items = self.get_masked(mount_point)
+        super(JournalingSongFileLibrary, self).remove_masked(mount_point)
+        self._journal_remove(items)
+        self.dirty = True
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+"""Coalescing of library signals.
+
+Libraries and librarians emit 'added', 'changed' and 'removed' for every
+(batch of) operation. Subscribers which don't need to react right away
+can get the items of all signals emitted within some time merged into one
+call instead, see SignalBus.
+"""
+
+from gi.repository import GLib
+
+
+ADDED, CHANGED, REMOVED = range(3)
+
+
+class Subscription(object):
+    """The pending items of one subscriber of a SignalBus"""
+
+    def __init__(self, bus, callback, latency, args):
+        self.bus = bus
+        self.callback = callback
+        self.latency = latency
+        self.args = args
+        self._pending = {}
+        self._order = []
+        self._source_id = None
+
+    @property
+    def pending(self):
+        """Whether a call is scheduled"""
+
+        return self._source_id is not None
+
+    def _merge(self, kind, items):
+        pending = self._pending
+        for item in items:
+            state = pending.get(item)
+            if state is None:
+                pending[item] = kind
+                self._order.append(item)
+            elif kind == REMOVED:
+                if state == ADDED:
+                    # never seen by the subscriber
+                    del pending[item]
+                else:
+                    pending[item] = REMOVED
+            elif kind == ADDED and state == REMOVED:
+                # removed and added again, e.g. reloaded
+                pending[item] = CHANGED
+
+        if pending and self._source_id is None:
+            if self.latency:
+                self._source_id = GLib.timeout_add(
+                    self.latency, self._timeout, priority=self.bus.priority)
+            else:
+                self._source_id = GLib.idle_add(
+                    self._timeout, priority=self.bus.priority)
+
+    def _timeout(self):
+        self._source_id = None
+        self.flush()
+        return False
+
+    def flush(self):
+        """Calls the callback with all pending items now"""
+
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+
+        pending, order = self._pending, self._order
+        self._pending, self._order = {}, []
+
+        result = ([], [], [])
+        for item in order:
+            kind = pending.pop(item, None)
+            if kind is not None:
+                result[kind].append(item)
+
+        if any(result):
+            self.bus.emitted += 1
+            self.callback(*(result + self.args))
+
+    def cancel(self):
+        """Drops all pending items and stops the subscription"""
+
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+        self._pending.clear()
+        del self._order[:]
+        self.bus._remove(self)
+
+
+class SignalBus(object):
+    """Merges the 'added', 'changed' and 'removed' signals of a library
+    or librarian for subscribers which can handle some latency.
+
+    Each subscriber gets called with three lists: the added, changed and
+    removed items since the last call. Every item is in at most one of
+    them, in the order it was first seen:
+
+    * added, then changed: added
+    * added, then removed: not included
+    * changed, then removed: removed
+    * removed, then added: changed
+
+    `received` counts the calls subscribers would have gotten without
+    coalescing, `emitted` the ones they got.
+    """
+
+    def __init__(self, library, priority=GLib.PRIORITY_DEFAULT_IDLE):
+        self.priority = priority
+        self.received = 0
+        self.emitted = 0
+        self._library = library
+        self._subscriptions = []
+        self._sigs = [
+            library.connect('added', self.__signal, ADDED),
+            library.connect('changed', self.__signal, CHANGED),
+            library.connect('removed', self.__signal, REMOVED),
+        ]
+
+    @classmethod
+    def get(cls, library):
+        """Returns the bus shared by all subscribers of the library"""
+
+        bus = getattr(library, "_signal_bus", None)
+        if bus is None:
+            bus = library._signal_bus = cls(library)
+        return bus
+
+    def destroy(self):
+        for sig in self._sigs:
+            self._library.disconnect(sig)
+        for sub in list(self._subscriptions):
+            sub.cancel()
+        if getattr(self._library, "_signal_bus", None) is self:
+            del self._library._signal_bus
+
+    def subscribe(self, callback, latency=0, *args):
+        """Calls `callback(added, changed, removed, *args)` at most
+        `latency` milliseconds after the first of the merged signals got
+        emitted (or when idle for a latency of 0).
+
+        Returns a Subscription.
+        """
+
+        sub = Subscription(self, callback, latency, args)
+        self._subscriptions.append(sub)
+        return sub
+
+    def subscribe_destroy(self, owner, callback, latency=0, *args):
+        """Like subscribe() but cancels the subscription once `owner`
+        (a widget) gets destroyed."""
+
+        sub = self.subscribe(callback, latency, *args)
+        owner.connect("destroy", lambda *x: sub.cancel())
+        return sub
+
+    def flush(self):
+        """Calls all subscribers with pending items now"""
+
+        for sub in list(self._subscriptions):
+            sub.flush()
+
+    def _remove(self, sub):
+        if sub in self._subscriptions:
+            self._subscriptions.remove(sub)
+
+    def __signal(self, library, items, kind):
+        if not self._subscriptions:
+            return
+        self.received += len(self._subscriptions)
+        for sub in self._subscriptions:
+            sub._merge(kind, items)
@@ -615,6 +615,57 @@ class ImageExtractCommand(Command):
                         shutil.copyfileobj(image.file, h)
 
 
+@Command.register
+class ImageThumbnailsCommand(Command):
+    NAME = "image-thumbnails"
+    DESCRIPTION = _("Create missing thumbnails for the cover images "
+                    "found next to the files")
+    USAGE = "[--dry-run] [-j <jobs>] <file> [<files>]"
+
+    def _add_options(self, p):
+        p.add_option("--dry-run", action="store_true",
+                     help="only list the cover images")
+        p.add_option("-j", "--jobs", action="store", type="int",
+                     help=_("Number of images to process at the same time "
+                            "(defaults to the number of processors)"))
+
+    def _execute(self, options, args):
+        if len(args) < 1:
+            raise CommandError(_("Not enough arguments"))
+        if options.jobs is not None and options.jobs < 1:
+            raise CommandError(_("Invalid number of jobs"))
+
+        # dry run implies verbose
+        if options.dry_run:
+            self.verbose = True
+
+        from quodlibet.util.cover.built_in import FilesystemCover
+        from quodlibet.util.thumbnails import create_thumbnails_many
+
+        # search once per album and directory, like the cover manager
+        groups = {}
+        for path in args:
+            song = self.load_song(path)
+            groups.setdefault(FilesystemCover.group_by(song), song)
+
+        images = set()
+        for song in groups.values():
+            fileobj = FilesystemCover(song).cover
+            if fileobj is not None:
+                images.add(fileobj.name)
+                fileobj.close()
+
+        for image in sorted(images):
+            self.log("Cover image: %r" % image)
+        if options.dry_run:
+            return
+
+        for image, created in create_thumbnails_many(
+                sorted(images), processes=options.jobs):
+            if created:
+                self.log("Created thumbnails for %r" % image)
+
+
 # @Command.register
 class RenameCommand(Command):
     NAME = "rename"
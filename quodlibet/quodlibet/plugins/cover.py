@@ -54,6 +54,18 @@ class CoverSourcePlugin(GObject.Object):
 
         return
 
+    @classmethod
+    def prefetch(cls, songs, cancellable=None):
+        """Called in a worker thread with songs whose covers will likely
+        be requested soon, to warm up caches of the source in one pass.
+
+        Should check `cancellable` regularly and stop once it's cancelled.
+
+        This default implementation does nothing.
+        """
+
+        pass
+
     @staticmethod
     def priority():
         """
@@ -44,10 +44,23 @@ class OverwriteWarning(WarningMessage):
 
 class WriteFailedError(ErrorMessage):
 
-    def __init__(self, parent, song):
-        title = _("Unable to save song")
+    def __init__(self, parent, songs):
+        """songs is a song or a list of songs"""
+
+        if not isinstance(songs, list):
+            songs = [songs]
+        song = songs[0]
+
+        title = ngettext("Unable to save song", "Unable to save songs",
+                         len(songs))
 
         fn_format = "<b>%s</b>" % util.escape(fsdecode(song("~basename")))
+        if len(songs) > 1:
+            fn_format = ngettext(
+                "%(file-name)s and %(count)d other file",
+                "%(file-name)s and %(count)d other files",
+                len(songs) - 1) % {
+                    "file-name": fn_format, "count": len(songs) - 1}
         description = _("Saving %(file-name)s failed. The file may be "
             "read-only, corrupted, or you do not have "
             "permission to edit it.") % {"file-name": fn_format}
@@ -11,7 +11,6 @@ from gi.repository import Gtk, GLib, Gdk, GdkPixbuf, Gio, GObject
 from quodlibet import qltk
 from quodlibet import config
 from quodlibet import app
-from quodlibet.util import thumbnails
 from quodlibet.util.path import is_fsnative
 from quodlibet.qltk.image import (get_scale_factor, pixbuf_from_file,
     set_image_from_pbosf, get_pbosf_for_pixbuf, pbosf_render, calc_scale_size,
@@ -138,7 +137,7 @@ class ResizeImage(Gtk.Bin):
 
         self._pixbuf = None
         if self._file:
-            self._pixbuf = thumbnails.get_thumbnail_from_file(
+            self._pixbuf = app.cover_manager.get_thumbnail_from_file(
                 self._file, (max_size, max_size))
 
         if not self._pixbuf:
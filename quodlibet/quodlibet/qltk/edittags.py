@@ -19,13 +19,12 @@ from quodlibet.util import massagers
 from quodlibet.qltk.completion import LibraryValueCompletion
 from quodlibet.qltk.tagscombobox import TagsComboBox, TagsComboBoxEntry
 from quodlibet.qltk.views import RCMHintedTreeView, TreeViewColumn
-from quodlibet.qltk.wlw import WritingWindow
 from quodlibet.qltk.window import Dialog
 from quodlibet.qltk.models import ObjectStore
 from quodlibet.qltk.ccb import ConfigCheckButton
 from quodlibet.qltk.x import SeparatorMenuItem
 from quodlibet.qltk._editutils import EditingPluginHandler, OverwriteWarning
-from quodlibet.qltk._editutils import WriteFailedError
+from quodlibet.qltk.tagwriter import TagWriter, is_pending
 from quodlibet.plugins import PluginManager
 from quodlibet.util import connect_obj
 from quodlibet.util.tags import USER_TAGS, MACHINE_TAGS, sortkey as tagsortkey
@@ -739,17 +738,13 @@ class EditTags(Gtk.VBox):
                 l = renamed.setdefault(entry.tag, [])
                 l.append((entry.origtag, entry.value, entry.origvalue))
 
-        was_changed = set()
         songs = self.__songinfo.songs
-        win = WritingWindow(self, len(songs))
-        win.show()
+        writer = TagWriter(library, self)
         all_done = False
         for song in songs:
-            if not song.valid():
-                win.hide()
+            if not is_pending(song) and not song.valid():
                 dialog = OverwriteWarning(self, song)
                 resp = dialog.run()
-                win.show()
                 if resp != OverwriteWarning.RESPONSE_SAVE:
                     break
 
@@ -795,22 +790,10 @@ class EditTags(Gtk.VBox):
                 song.add(tag, value.text)
 
             if changed:
-                try:
-                    song.write()
-                except:
-                    util.print_exc()
-                    WriteFailedError(self, song).run()
-                    library.reload(song, changed=was_changed)
-                    break
-                was_changed.add(song)
-
-            if win.step():
-                break
+                writer.add(song)
         else:
             all_done = True
 
-        win.destroy()
-        library.changed(was_changed)
         for b in [save, revert]:
             b.set_sensitive(not all_done)
 
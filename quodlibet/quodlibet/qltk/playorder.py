@@ -136,21 +136,150 @@ class OrderShuffle(OrderRemembered):
     is_shuffle = True
     priority = 1
 
+    def __init__(self, playlist):
+        super(OrderShuffle, self).__init__(playlist)
+        # number of times each path is in self._played
+        self.__played_counts = {}
+        # paths not played, in random order, built once needed
+        self.__remaining = None
+        self.__positions = {}
+
+    def __get_remaining(self, playlist):
+        if self.__remaining is None:
+            counts = self.__played_counts
+            remaining = [i for i in xrange(len(playlist)) if i not in counts]
+            random.shuffle(remaining)
+            self.__remaining = remaining
+            self.__positions = dict((p, i) for i, p in enumerate(remaining))
+        return self.__remaining
+
+    def __mark_played(self, path):
+        self._played.append(path)
+        counts = self.__played_counts
+        counts[path] = counts.get(path, 0) + 1
+        if counts[path] > 1 or self.__remaining is None:
+            return
+        # swap with the last one, so removing is O(1)
+        remaining = self.__remaining
+        positions = self.__positions
+        index = positions.pop(path, None)
+        if index is None:
+            return
+        last = remaining.pop()
+        if last != path:
+            remaining[index] = last
+            positions[last] = index
+
+    def __unmark_played(self, path):
+        counts = self.__played_counts
+        counts[path] -= 1
+        if counts[path]:
+            return
+        del counts[path]
+        if self.__remaining is not None:
+            # put it back at a random place
+            remaining = self.__remaining
+            positions = self.__positions
+            index = random.randint(0, len(remaining))
+            if index < len(remaining):
+                other = remaining[index]
+                remaining.append(other)
+                positions[other] = len(remaining) - 1
+                remaining[index] = path
+            else:
+                remaining.append(path)
+            positions[path] = index
+
     def next(self, playlist, iter):
-        super(OrderShuffle, self).next(playlist, iter)
-        played = set(self._played)
-        songs = set(range(len(playlist)))
-        remaining = songs.difference(played)
+        if iter is not None:
+            self.__mark_played(playlist.get_path(iter).get_indices()[0])
 
+        remaining = self.__get_remaining(playlist)
         if remaining:
-            return playlist.get_iter((random.choice(list(remaining)),))
+            return playlist.get_iter((remaining[-1],))
         elif playlist.repeat and not playlist.is_empty():
-            del(self._played[:])
-            return playlist.get_iter((random.choice(list(songs)),))
+            self.reset(playlist)
+            return playlist.get_iter((random.randrange(len(playlist)),))
         else:
-            del(self._played[:])
+            self.reset(playlist)
             return None
 
+    def previous(self, playlist, iter):
+        try:
+            path = self._played.pop()
+        except IndexError:
+            return None
+        else:
+            self.__unmark_played(path)
+            return playlist.get_iter(path)
+
+    def set(self, playlist, iter):
+        if iter is not None:
+            self.__mark_played(playlist.get_path(iter).get_indices()[0])
+        return iter
+
+    def reset(self, playlist):
+        super(OrderShuffle, self).reset(playlist)
+        self.__played_counts.clear()
+        self.__remaining = None
+        self.__positions = {}
+
+
+class _WeightTree(object):
+    """A Fenwick tree of weights, for picking an index with a probability
+    proportional to its weight in O(log n)"""
+
+    def __init__(self, weights):
+        self._weights = list(weights)
+        size = len(self._weights)
+        tree = [0] + self._weights
+        for i in xrange(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def __len__(self):
+        return len(self._weights)
+
+    def __getitem__(self, index):
+        return self._weights[index]
+
+    def __setitem__(self, index, weight):
+        diff = weight - self._weights[index]
+        self._weights[index] = weight
+        tree = self._tree
+        i = index + 1
+        while i < len(tree):
+            tree[i] += diff
+            i += i & -i
+
+    @property
+    def total(self):
+        total = 0
+        tree = self._tree
+        i = len(self._weights)
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def find(self, value):
+        """Returns the first index where the sum of all weights up to and
+        including it is >= value"""
+
+        tree = self._tree
+        size = len(self._weights)
+        pos = 0
+        bit = 1 << (size.bit_length() - 1) if size else 0
+        while bit:
+            next_ = pos + bit
+            if next_ <= size and tree[next_] < value:
+                pos = next_
+                value -= tree[next_]
+            bit >>= 1
+        return min(pos, size - 1)
+
 
 class OrderWeighted(OrderRemembered):
     name = "weighted"
@@ -159,18 +288,39 @@ class OrderWeighted(OrderRemembered):
     is_shuffle = True
     priority = 2
 
+    def __init__(self, playlist):
+        super(OrderWeighted, self).__init__(playlist)
+        self.__weights = None
+
     def next(self, playlist, iter):
         super(OrderWeighted, self).next(playlist, iter)
-        songs = playlist.get()
-        max_score = sum([song('~#rating') for song in songs])
-        choice = random.random() * max_score
-        current = 0.0
-        for i, song in enumerate(songs):
-            current += song("~#rating")
-            if current >= choice:
-                return playlist.get_iter((i,))
-        else:
-            return playlist.get_iter_first()
+
+        # ratings can change without the model noticing, so update the
+        # ones of the current and picked song
+        weights = self.__weights
+        if weights is None:
+            ratings = [song("~#rating") for song in playlist.get()]
+            weights = self.__weights = _WeightTree(ratings)
+        elif iter is not None:
+            path = playlist.get_path(iter).get_indices()[0]
+            weights[path] = playlist.get_value(iter)("~#rating")
+
+        while len(weights):
+            total = weights.total
+            if total <= 0:
+                break
+            path = weights.find(random.random() * total)
+            iter_ = playlist.get_iter((path,))
+            rating = playlist.get_value(iter_)("~#rating")
+            if rating == weights[path]:
+                return iter_
+            weights[path] = rating
+
+        return playlist.get_iter_first()
+
+    def reset(self, playlist):
+        super(OrderWeighted, self).reset(playlist)
+        self.__weights = None
 
 
 class OrderOneSong(OrderInOrder):
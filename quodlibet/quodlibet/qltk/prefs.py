@@ -284,6 +284,13 @@ class PreferencesWindow(UniqueWindow):
             hb.pack_start(entry, True, True, 0)
             vb.pack_start(hb, False, True, 0)
 
+            cb = CCB(_("Create missing _thumbnails on start"),
+                     'albumart', 'warm_thumbnails', populate=True,
+                     tooltip=_("Look for the covers of all albums in the "
+                               "background and create thumbnails for "
+                               "them, so they show up faster"))
+            vb.pack_start(cb, False, True, 0)
+
             f = qltk.Frame(_("Album Art"), child=vb)
             self.pack_start(f, False, True, 0)
 
@@ -594,6 +601,12 @@ class PreferencesWindow(UniqueWindow):
 
             cb = CCB(_("_Refresh library on start"),
                      "library", "refresh_on_start", populate=True)
+            quick_cb = CCB(_("Only check _changed folders"),
+                           "library", "quick_refresh", populate=True,
+                           tooltip=_("Songs which were edited in place by "
+                                     "other programs or removed from the "
+                                     "library will be missed until the "
+                                     "library gets reloaded."))
             scan_dirs = ScanBox()
 
             vb3 = Gtk.VBox(spacing=6)
@@ -618,6 +631,7 @@ class PreferencesWindow(UniqueWindow):
             grid = Gtk.Grid(column_spacing=6, row_spacing=6)
             cb.props.hexpand = True
             grid.attach(cb, 0, 0, 1, 1)
+            grid.attach(quick_cb, 0, 1, 1, 1)
             grid.attach(refresh, 1, 0, 1, 1)
             grid.attach(reload_, 1, 1, 1, 1)
 
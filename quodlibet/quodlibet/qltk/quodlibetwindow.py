@@ -617,12 +617,20 @@ class QuodLibetWindow(Window, PersistentWindowMixin):
         if config.getboolean('library', 'refresh_on_start'):
             self.__rebuild(None, False)
 
+        if config.getboolean("albumart", "warm_thumbnails") and \
+                app.cover_manager:
+            on_first_map(self, self.__warm_thumbnails, library)
+
         self.connect("key-press-event", self.__key_pressed, player)
 
         self.connect("destroy", self.__destroy)
 
         self.enable_window_tracking("quodlibet")
 
+    def __warm_thumbnails(self, library):
+        app.cover_manager.warm_thumbnails(
+            [album.songs for album in library.albums.itervalues()])
+
     def set_as_osx_window(self, osx_app):
         assert osx_app
 
@@ -28,6 +28,7 @@ from quodlibet.formats._audio import TAG_TO_SORT, AudioFile
 from quodlibet.qltk.x import SeparatorMenuItem
 from quodlibet.qltk.songlistcolumns import create_songlist_column
 from quodlibet.util import connect_destroy
+from quodlibet.library.signals import SignalBus
 
 
 DND_QL, DND_URI_LIST = range(2)
@@ -169,6 +170,49 @@ def get_sort_tag(tag):
     return tag
 
 
+class _Reversed(object):
+    """Wraps a sort key, reversing its order"""
+
+    __slots__ = ["value"]
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return self.value != other.value
+
+    def __lt__(self, other):
+        return self.value > other.value
+
+    def __gt__(self, other):
+        return self.value < other.value
+
+    def __le__(self, other):
+        return self.value >= other.value
+
+    def __ge__(self, other):
+        return self.value <= other.value
+
+
+def _combine_sort_passes(passes):
+    """Returns a key function giving the same order as sorting with each
+    of the (key function, reverse) tuples in sequence.
+
+    Later passes are more important and Python's sort is stable, also
+    when reversed, so this is their keys as a tuple, last one first.
+    """
+
+    passes = list(reversed(passes))
+
+    def key(song):
+        return tuple(_Reversed(f(song)) if r else f(song)
+                     for f, r in passes)
+    return key
+
+
 def header_tag_split(header):
     """Split a pattern or a tied tag into separate tags"""
 
@@ -371,6 +415,7 @@ class SongList(AllTreeView, SongListDnDMixin, DragScroll,
                  model_cls=PlaylistModel):
         super(SongList, self).__init__()
         self._register_instance(SongList)
+        self._library = library
         self.set_model(model_cls())
         self.info = SongInfoSelection(self)
         self.set_size_request(200, 150)
@@ -385,7 +430,9 @@ class SongList(AllTreeView, SongListDnDMixin, DragScroll,
         self.set_column_headers(self.headers)
         librarian = library.librarian or library
 
-        connect_destroy(librarian, 'changed', self.__song_updated)
+        # only redraws, so take changes in batches
+        SignalBus.get(librarian).subscribe_destroy(
+            self, self.__songs_updated, 50)
         connect_destroy(librarian, 'removed', self.__song_removed, player)
 
         if update:
@@ -720,19 +767,19 @@ class SongList(AllTreeView, SongListDnDMixin, DragScroll,
             return []
         return model.get()
 
-    def _sort_songs(self, songs):
-        """Sort passed songs in place based on the column sort orders"""
+    def _get_sort_passes(self, orders):
+        """Returns a list of (key function, reverse) tuples, sorting with
+        them in sequence gives the order for the sort orders"""
 
+        passes = []
         last_tag = None
         last_order = None
         first = True
-        for tag, reverse in self.get_sort_orders():
-            tag = get_sort_tag(tag)
-
+        for tag, reverse in orders:
             # always sort using the default sort key first
             if first:
                 first = False
-                songs.sort(key=lambda s: s.sort_key, reverse=reverse)
+                passes.append((lambda s: s.sort_key, reverse))
                 last_order = reverse
                 last_tag = ""
 
@@ -743,10 +790,23 @@ class SongList(AllTreeView, SongListDnDMixin, DragScroll,
             last_tag = tag
 
             if tag == "":
-                songs.sort(key=lambda s: s.sort_key, reverse=reverse)
+                passes.append((lambda s: s.sort_key, reverse))
             else:
-                sort_func = AudioFile.sort_by_func(tag)
-                songs.sort(key=sort_func, reverse=reverse)
+                passes.append((AudioFile.sort_by_func(tag), reverse))
+        return passes
+
+    def _sort_songs(self, songs):
+        """Sort passed songs in place based on the column sort orders"""
+
+        orders = [(get_sort_tag(t), r) for t, r in self.get_sort_orders()]
+
+        # the library might have them presorted already
+        sorter = getattr(self._library, "sorter", None)
+        if sorter is not None and sorter.sort(songs, orders):
+            return
+
+        for key, reverse in self._get_sort_passes(orders):
+            songs.sort(key=key, reverse=reverse)
 
     def add_songs(self, songs):
         """Add songs to the list in the right order and position"""
@@ -763,14 +823,36 @@ class SongList(AllTreeView, SongListDnDMixin, DragScroll,
             model.append_many(songs)
             return
 
-        # FIXME: Replace with something fast
-        old_songs = self.get_songs()
-        old_songs.extend(songs)
+        orders = [(get_sort_tag(t), r) for t, r in self.get_sort_orders()]
+        key = _combine_sort_passes(self._get_sort_passes(orders))
 
-        self._sort_songs(old_songs)
+        new_songs = sorted(songs, key=key)
+        old_songs = self.get_songs()
 
-        for index, song in sorted(zip(map(old_songs.index, songs), songs)):
-            model.insert(index, row=[song])
+        # find the positions using binary search, like bisect_right, so
+        # new songs go after equal old ones like with a stable sort
+        positions = []
+        lo = 0
+        for song in new_songs:
+            song_key = key(song)
+            hi = len(old_songs)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if song_key < key(old_songs[mid]):
+                    hi = mid
+                else:
+                    lo = mid + 1
+            positions.append(lo)
+
+        # insert runs of songs going to the same position at once
+        offset = 0
+        start = 0
+        for end in xrange(1, len(new_songs) + 1):
+            if end == len(new_songs) or positions[end] != positions[start]:
+                model.insert_many(
+                    positions[start] + offset, new_songs[start:end])
+                offset += end - start
+                start = end
 
     def set_songs(self, songs, sorted=False, scroll=True, scroll_select=False):
         """Fill the song list.
@@ -871,7 +953,11 @@ class SongList(AllTreeView, SongListDnDMixin, DragScroll,
         selection.selected_foreach(func, None)
         return songs
 
-    def __song_updated(self, librarian, songs):
+    def __songs_updated(self, added, changed, removed):
+        if changed:
+            self.__song_updated(set(changed))
+
+    def __song_updated(self, songs):
         """Only update rows that are currently displayed.
         Warning: This makes the row-changed signal useless.
         """
@@ -17,8 +17,7 @@ from quodlibet import util
 from quodlibet.plugins import PluginManager
 from quodlibet.qltk._editutils import FilterPluginBox, FilterCheckButton
 from quodlibet.qltk._editutils import EditingPluginHandler, OverwriteWarning
-from quodlibet.qltk._editutils import WriteFailedError
-from quodlibet.qltk.wlw import WritingWindow
+from quodlibet.qltk.tagwriter import TagWriter, is_pending
 from quodlibet.qltk.views import TreeViewColumn
 from quodlibet.qltk.cbes import ComboBoxEntrySave
 from quodlibet.qltk.models import ObjectStore
@@ -259,20 +258,15 @@ class TagsFromPath(Gtk.VBox):
         pattern = TagsFromPattern(pattern_text)
         model = self.view.get_model()
         add = bool(addreplace.get_active())
-        win = WritingWindow(self, len(model))
-        win.show()
-
-        was_changed = set()
+        writer = TagWriter(library, self)
 
         all_done = False
         for entry in ((model and model.itervalues()) or []):
             song = entry.song
             changed = False
-            if not song.valid():
-                win.hide()
+            if not is_pending(song) and not song.valid():
                 dialog = OverwriteWarning(self, song)
                 resp = dialog.run()
-                win.show()
                 if resp != OverwriteWarning.RESPONSE_SAVE:
                     break
 
@@ -290,22 +284,10 @@ class TagsFromPath(Gtk.VBox):
                                 changed = True
 
             if changed:
-                try:
-                    song.write()
-                except:
-                    util.print_exc()
-                    WriteFailedError(self, song).run()
-                    library.reload(song, changed=was_changed)
-                    break
-                was_changed.add(song)
-
-            if win.step():
-                break
+                writer.add(song)
         else:
             all_done = True
 
-        win.destroy()
-        library.changed(was_changed)
         self.save.set_sensitive(not all_done)
 
     def __row_edited(self, renderer, path, new, model, header):
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+"""Writing tags to files in the background.
+
+Tag editors change the songs in memory and hand them to a TagWriter,
+which writes them in worker threads and tells the library about each
+batch of written songs.
+"""
+
+import copy
+import Queue
+import threading
+import traceback
+
+from gi.repository import GLib
+
+from quodlibet.qltk.notif import Task
+from quodlibet.qltk._editutils import WriteFailedError
+
+
+class _Workers(object):
+    """A fixed number of threads running jobs.
+
+    All jobs for the same file run in the same thread, in the order they
+    got added, so writes to one file never overlap and the last one wins.
+    """
+
+    def __init__(self, count):
+        self._count = count
+        self._queues = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        self._queues = []
+        for i in xrange(self._count):
+            queue = Queue.Queue()
+            thread = threading.Thread(target=self._run, args=(queue,))
+            thread.daemon = True
+            thread.start()
+            self._queues.append(queue)
+
+    def _run(self, queue):
+        while True:
+            job = queue.get()
+            try:
+                job()
+            except Exception:
+                traceback.print_exc()
+            finally:
+                queue.task_done()
+
+    def add(self, filename, job):
+        with self._lock:
+            if self._queues is None:
+                self._start()
+        self._queues[hash(filename) % self._count].put(job)
+
+    def join(self):
+        """Blocks until all added jobs are done"""
+
+        with self._lock:
+            queues = self._queues or []
+        for queue in queues:
+            queue.join()
+
+
+_workers = _Workers(4)
+
+_CANCELLED = object()
+
+# TagWriters with pending songs
+_writers = set()
+
+# song -> number of pending writes, all TagWriters together
+_pending = {}
+
+
+def is_pending(song):
+    """If the song was added to a TagWriter and isn't written yet.
+
+    The in-memory mtime of such songs gets updated once written, so
+    `song.valid()` can't tell if they were changed on disk meanwhile.
+    """
+
+    return song in _pending
+
+
+def flush():
+    """Waits until all pending songs are written and handles the results.
+
+    Has to be called before quitting, so no file is left half written
+    and the library gets saved with the written tags.
+    """
+
+    _workers.join()
+    for writer in list(_writers):
+        writer._flush()
+
+
+class TagWriter(object):
+    """Writes the tags of changed songs in worker threads.
+
+    Songs passed to add() need to be changed in memory already. A copy of
+    each gets written, so the songs can be used and changed further while
+    writing. Written songs get passed to `library.changed` in batches.
+
+    Songs for which writing failed or got cancelled get reloaded from
+    disk. The failed ones are listed in `failed` and shown in an error
+    dialog once everything is done.
+    """
+
+    INTERVAL = 200
+    """Milliseconds between handling the finished writes"""
+
+    def __init__(self, library, parent=None, desc=None):
+        self._library = library
+        self._parent = parent
+        self._desc = desc or _("Saving tags")
+        self._results = Queue.Queue()
+        self._cancelled = False
+        self._pending = 0
+        self._total = 0
+        self._source_id = None
+        self._task = None
+        self._callbacks = []
+        self.written = []
+        self.failed = []
+
+        if parent is not None:
+            parent.connect("destroy", self.__parent_destroyed)
+
+    def __parent_destroyed(self, parent):
+        self._parent = None
+
+    @property
+    def done(self):
+        """If all added songs got written or reloaded"""
+
+        return not self._pending
+
+    def add(self, song):
+        """Writes the song in the background"""
+
+        snapshot = copy.copy(song)
+        self._pending += 1
+        self._total += 1
+        _pending[song] = _pending.get(song, 0) + 1
+        _writers.add(self)
+        _workers.add(song("~filename"), lambda: self._write(song, snapshot))
+
+        if self._source_id is None:
+            self._source_id = GLib.timeout_add(self.INTERVAL, self._poll)
+        if self._task is None:
+            self._task = Task(_("Tags"), self._desc, stop=self.cancel)
+
+    def connect_done(self, callback, *args):
+        """Calls `callback(writer, *args)` once all songs are done"""
+
+        self._callbacks.append((callback, args))
+
+    def cancel(self):
+        """Skips all songs which aren't written yet"""
+
+        self._cancelled = True
+
+    def _write(self, song, snapshot):
+        # in a worker thread
+        if self._cancelled:
+            error = _CANCELLED
+        else:
+            try:
+                snapshot.write()
+            except Exception:
+                error = traceback.format_exc()
+            else:
+                error = None
+        self._results.put((song, snapshot, error))
+
+    def _poll(self):
+        changed = set()
+        while True:
+            try:
+                song, snapshot, error = self._results.get_nowait()
+            except Queue.Empty:
+                break
+
+            self._pending -= 1
+            count = _pending.pop(song) - 1
+            if count:
+                _pending[song] = count
+
+            if error is None:
+                # take over what changed on disk, so the song stays valid
+                if song("~filename") == snapshot("~filename"):
+                    for key in ["~#mtime", "~#filesize"]:
+                        if key in snapshot:
+                            song[key] = snapshot[key]
+                changed.add(song)
+                self.written.append(song)
+            else:
+                if error is not _CANCELLED:
+                    print_w("Writing %r failed:\n%s" % (
+                        song("~filename"), error))
+                    self.failed.append(song)
+                self._library.reload(song, changed=changed)
+
+        if changed:
+            self._library.changed(changed)
+
+        if self._pending:
+            if self._task is not None:
+                self._task.update(
+                    float(self._total - self._pending) / self._total)
+            return True
+
+        self._source_id = None
+        self._finish()
+        return False
+
+    def _flush(self):
+        # all writes are done, handle them right away
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+        self._poll()
+
+    def _finish(self):
+        _writers.discard(self)
+
+        if self._task is not None:
+            self._task.finish()
+            self._task = None
+
+        if self.failed:
+            WriteFailedError(self._parent, self.failed).run()
+
+        for callback, args in self._callbacks:
+            callback(self, *args)
@@ -8,11 +8,10 @@
 from gi.repository import Gtk
 
 from quodlibet import qltk
-from quodlibet import util
 
-from quodlibet.qltk._editutils import OverwriteWarning, WriteFailedError
+from quodlibet.qltk._editutils import OverwriteWarning
 from quodlibet.qltk.views import HintedTreeView, TreeViewColumn
-from quodlibet.qltk.wlw import WritingWindow
+from quodlibet.qltk.tagwriter import TagWriter, is_pending
 from quodlibet.qltk.models import ObjectStore
 from quodlibet.util.path import fsdecode
 from quodlibet.util import connect_obj
@@ -142,37 +141,22 @@ class TrackNumbers(Gtk.VBox):
             model.path_changed(path)
 
     def __save_files(self, parent, model, library):
-        win = WritingWindow(parent, len(model))
-        was_changed = set()
+        writer = TagWriter(library, parent)
         all_done = False
         for entry in model.itervalues():
             song, track = entry.song, entry.tracknumber
             if song.get("tracknumber") == track:
-                win.step()
                 continue
-            if not song.valid():
-                win.hide()
+            if not is_pending(song) and not song.valid():
                 dialog = OverwriteWarning(self, song)
                 resp = dialog.run()
-                win.show()
                 if resp != OverwriteWarning.RESPONSE_SAVE:
                     break
             song["tracknumber"] = track
-            try:
-                song.write()
-            except:
-                util.print_exc()
-                WriteFailedError(self, song).run()
-                library.reload(song, changed=was_changed)
-                break
-            was_changed.add(song)
-            if win.step():
-                break
+            writer.add(song)
         else:
             all_done = True
 
-        library.changed(was_changed)
-        win.destroy()
         self.save.set_sensitive(not all_done)
         self.revert.set_sensitive(not all_done)
 
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+
+class QueryCompiler(object):
+    """Turns a match tree into a single Python function returning the
+    same as its search() method.
+
+    Nodes return the statements for matching the song `s` through
+    `Node._compile`, nested so that evaluation short-circuits like
+    search() does. Objects like regexes get bound to names in the
+    function scope.
+    """
+
+    def __init__(self, root):
+        self.__root = root
+
+    def compile(self):
+        self.__scope = {}
+        self.__names = {}
+
+        body = self.__root._compile(self)
+        # bind hoisted objects as default arguments, for fast lookups
+        args = ["s"] + ["%s=%s" % (n, n) for n in sorted(self.__scope)]
+        content = ["def f(%s):" % ", ".join(args)]
+        content.extend(map("  ".__add__, body))
+        content.append("  return True if m else False")
+        code = "\n".join(content)
+
+        scope = self.__scope
+        try:
+            exec compile(code, "<query>", "exec") in scope
+        except SyntaxError:
+            # too deeply nested
+            return self.__root.search
+        return scope["f"]
+
+    def hoist(self, obj):
+        """Returns a name under which `obj` is available"""
+
+        key = id(obj)
+        if key not in self.__names:
+            name = "h%d" % len(self.__names)
+            self.__names[key] = name
+            self.__scope[name] = obj
+        return self.__names[key]
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+import operator
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from quodlibet.util import tagsplit
+
+from ._match import Tag
+
+
+INDEXABLE_TAGS = frozenset([
+    "~filename", "~basename", "~dirname", "~uri", "~format", "~length",
+    "~year", "~originalyear", "~people", "~people:real", "~people:roles",
+    "~peoplesort", "~peoplesort:roles", "~performer", "~performers",
+    "~performersort", "~performerssort", "~performer:roles",
+    "~performers:roles", "~performersort:roles", "~performerssort:roles",
+    "~#length", "~#bitrate", "~#filesize", "~#added", "~#mtime",
+    "~#playcount", "~#skipcount", "~#lastplayed", "~#laststarted",
+    "~#track", "~#tracks", "~#disc", "~#discs", "~#date", "~#year",
+    "~#originalyear",
+])
+"""Internal tags which only depend on the song itself"""
+
+COMPUTED_NUMERIC = frozenset([
+    "~#track", "~#tracks", "~#disc", "~#discs", "~#date", "~#year",
+    "~#originalyear",
+])
+"""Numeric tags which don't get stored in the song"""
+
+
+def is_indexable(name):
+    """If the values of the tag only change together with the song.
+
+    The index gets updated through the library signals, so tags like
+    ~playlists, ~lyrics or ~#rating (depending on the default rating)
+    can't be indexed.
+    """
+
+    if not name.startswith("~"):
+        return True
+    if "~" in name[1:]:
+        return all(map(is_indexable, tagsplit(name)))
+    return name in INDEXABLE_TAGS
+
+
+def is_stored_numeric(name):
+    """If `name` is a numeric tag the song stores itself"""
+
+    return (name.startswith("~#") and "~" not in name[1:] and
+            name not in COMPUTED_NUMERIC and
+            not name.startswith("~#replaygain_"))
+
+
+class _TagIndex(object):
+    """Maps the values of one tag to the songs having them"""
+
+    def __init__(self, name, songs):
+        self.name = name
+        self.values = {}
+        self.song_values = {}
+        for song in songs:
+            self.add(song)
+
+    def add(self, song):
+        value = Tag.get_value(song, self.name)
+        self.song_values[song] = value
+        self.values.setdefault(value, set()).add(song)
+
+    def remove(self, song):
+        value = self.song_values.pop(song)
+        songs = self.values[value]
+        songs.discard(song)
+        if not songs:
+            del self.values[value]
+
+    def search(self, res):
+        result = set()
+        for value, songs in self.values.iteritems():
+            if res.search(value):
+                result |= songs
+        return result
+
+
+class _NumericIndex(object):
+    """Keeps the songs sorted by the (rounded) stored value of a numeric
+    tag. Songs without a stored value are in `missing`, as their value
+    might come from a default."""
+
+    def __init__(self, name, songs):
+        self.name = name
+        self.song_values = {}
+        self.missing = set()
+        pairs = []
+        for song in songs:
+            value = self._get_value(song)
+            if value is not None:
+                self.song_values[song] = value
+                pairs.append((value, id(song), song))
+            else:
+                self.missing.add(song)
+        pairs.sort()
+        self.keys = [p[0] for p in pairs]
+        self.songs = [p[2] for p in pairs]
+
+    def _get_value(self, song):
+        # like Numcmp.search(), but without the fallbacks of __call__
+        num = dict.get(song, self.name)
+        if num is not None:
+            return round(num, 2)
+
+    def add(self, song):
+        value = self._get_value(song)
+        if value is not None:
+            self.song_values[song] = value
+            i = bisect_right(self.keys, value)
+            self.keys.insert(i, value)
+            self.songs.insert(i, song)
+        else:
+            self.missing.add(song)
+
+    def remove(self, song):
+        value = self.song_values.pop(song, None)
+        if value is None:
+            self.missing.remove(song)
+            return
+        i = bisect_left(self.keys, value)
+        while self.songs[i] is not song:
+            i += 1
+        del self.keys[i]
+        del self.songs[i]
+
+    def search(self, op, value):
+        keys = self.keys
+        songs = self.songs
+        if op is operator.lt:
+            return set(songs[:bisect_left(keys, value)])
+        elif op is operator.le:
+            return set(songs[:bisect_right(keys, value)])
+        elif op is operator.gt:
+            return set(songs[bisect_right(keys, value):])
+        elif op is operator.ge:
+            return set(songs[bisect_left(keys, value):])
+        elif op is operator.eq:
+            return set(songs[bisect_left(keys, value):
+                             bisect_right(keys, value)])
+        elif op is operator.ne:
+            start = bisect_left(keys, value)
+            end = bisect_right(keys, value)
+            return set(songs[:start]) | set(songs[end:])
+
+
+class QueryIndex(object):
+    """An index of tag values for all songs in a library, used to find
+    the songs matching a query without matching each song.
+
+    Indices for tags get created on first use and are kept up to date
+    through the library signals. Only the `MAX_TAGS` most recently used
+    ones are kept.
+    """
+
+    MAX_TAGS = 12
+    """Maximum number of indexed tags"""
+
+    def __init__(self, library):
+        self._library = library
+        self.songs = set(library.itervalues())
+        self._indices = OrderedDict()
+        self._sigs = [
+            library.connect('added', self.__added),
+            library.connect('changed', self.__changed),
+            library.connect('removed', self.__removed),
+        ]
+
+    def destroy(self):
+        for sig in self._sigs:
+            self._library.disconnect(sig)
+        self._indices.clear()
+        self.songs.clear()
+
+    def __len__(self):
+        """Number of indexed tags"""
+
+        return len(self._indices)
+
+    def _get_index(self, key, type_, name):
+        indices = self._indices
+        index = indices.pop(key, None)
+        if index is None:
+            index = type_(name, self.songs)
+        indices[key] = index
+        while len(indices) > self.MAX_TAGS:
+            indices.popitem(last=False)
+        return index
+
+    def tag(self, name, res):
+        """Returns all songs where `res` matches the value of the tag or
+        None in case the tag can't be indexed"""
+
+        if not is_indexable(name):
+            return
+        index = self._get_index(name, _TagIndex, name)
+        return index.search(res)
+
+    def values(self, name):
+        """Returns a dict mapping each value of the tag, as matched by
+        queries, to the set of songs having it.
+
+        The dict belongs to the index and must not be modified.
+        Raises ValueError in case the tag can't be indexed.
+        """
+
+        if not is_indexable(name):
+            raise ValueError("%r can't be indexed" % name)
+        return self._get_index(name, _TagIndex, name).values
+
+    def numeric(self, name, op, value):
+        """Returns a (songs, exact) tuple like Node._plan() for
+        op(song(name), value).
+
+        Songs without a stored value are always included, so `exact`
+        is only True if all songs have one.
+        """
+
+        if not is_stored_numeric(name):
+            return None, False
+        try:
+            index = self._get_index((name, "#"), _NumericIndex, name)
+        except TypeError:
+            # not a number
+            return None, False
+        songs = index.search(op, value)
+        if index.missing:
+            return songs | index.missing, False
+        return songs, True
+
+    def filter(self, query, songs=None):
+        """Returns a list of songs matching the query.
+
+        If `songs` is given, only those get considered.
+        """
+
+        candidates, exact = query._plan(self)
+        if candidates is None:
+            candidates = self.songs
+        if songs is not None:
+            candidates = candidates.intersection(songs)
+        if exact:
+            return list(candidates)
+        return filter(query.search, candidates)
+
+    def __added(self, library, songs):
+        self.songs.update(songs)
+        self.__update(songs, remove=False)
+
+    def __removed(self, library, songs):
+        self.songs.difference_update(songs)
+        self.__update(songs, add=False)
+
+    def __changed(self, library, songs):
+        self.__update(songs)
+
+    def __update(self, songs, add=True, remove=True):
+        for key, index in self._indices.items():
+            try:
+                for song in songs:
+                    if remove:
+                        index.remove(song)
+                    if add:
+                        index.add(song)
+            except (TypeError, KeyError):
+                # either the values can't be indexed anymore or we
+                # missed an update; rebuild once needed again
+                del self._indices[key]
@@ -34,6 +34,27 @@ class Node(object):
     def filter(self, sequence):
         return filter(self.search, sequence)
 
+    def _plan(self, index):
+        """Returns a (songs, exact) tuple using a `QueryIndex`.
+
+        `songs` is a set of songs which contains all matching songs or
+        None for all songs, `exact` is True if all songs in it match.
+        """
+
+        return None, False
+
+    def _compile(self, compiler):
+        """Returns a list of Python statements which set `m` to a true
+        value if the song `s` matches, see `QueryCompiler`"""
+
+        return ["m = %s(s)" % compiler.hoist(self.search)]
+
+    def _estimate(self):
+        """Returns a (cost, probability) tuple: the relative cost of
+        search() and the estimated fraction of songs matching"""
+
+        return 4.0, 0.5
+
     def _unpack(self):
         return self
 
@@ -47,6 +68,17 @@ class Node(object):
         return Neg(self._unpack())
 
 
+def _chain(blocks, condition):
+    """Nests the statement blocks so each one only runs if `condition`
+    holds after the previous one"""
+
+    lines = list(blocks[0])
+    if len(blocks) > 1:
+        lines.append("if %s:" % condition)
+        lines.extend(map("  ".__add__, _chain(blocks[1:], condition)))
+    return lines
+
+
 class True_(Node):
     """Always True"""
 
@@ -56,6 +88,15 @@ class True_(Node):
     def filter(self, list_):
         return list(list_)
 
+    def _plan(self, index):
+        return None, True
+
+    def _compile(self, compiler):
+        return ["m = True"]
+
+    def _estimate(self):
+        return 0.0, 1.0
+
     def __repr__(self):
         return "<True>"
 
@@ -79,6 +120,39 @@ class Union(Node):
                 return True
         return False
 
+    def _plan(self, index):
+        result = set()
+        exact = True
+        for re in self.res:
+            songs, sub_exact = re._plan(index)
+            exact = exact and sub_exact
+            if songs is None:
+                return None, exact
+            result |= songs
+        return result, exact
+
+    def _order(self):
+        # cheap children likely to match first
+        def key(node):
+            cost, prob = node._estimate()
+            return cost / prob if prob > 0 else float("inf")
+        return sorted(self.res, key=key)
+
+    def _compile(self, compiler):
+        if not self.res:
+            return ["m = False"]
+        blocks = [re._compile(compiler) for re in self._order()]
+        return _chain(blocks, "not m")
+
+    def _estimate(self):
+        total = 0.0
+        miss = 1.0
+        for re in self._order():
+            cost, prob = re._estimate()
+            total += miss * cost
+            miss *= 1.0 - prob
+        return total, 1.0 - miss
+
     def __repr__(self):
         return "<Union %r>" % self.res
 
@@ -113,6 +187,38 @@ class Inter(Node):
                 return False
         return True
 
+    def _plan(self, index):
+        result = None
+        exact = True
+        for re in self.res:
+            songs, sub_exact = re._plan(index)
+            exact = exact and sub_exact
+            if songs is not None:
+                result = songs if result is None else result & songs
+        return result, exact
+
+    def _order(self):
+        # cheap children likely to fail first
+        def key(node):
+            cost, prob = node._estimate()
+            return cost / (1.0 - prob) if prob < 1 else float("inf")
+        return sorted(self.res, key=key)
+
+    def _compile(self, compiler):
+        if not self.res:
+            return ["m = True"]
+        blocks = [re._compile(compiler) for re in self._order()]
+        return _chain(blocks, "m")
+
+    def _estimate(self):
+        total = 0.0
+        hit = 1.0
+        for re in self._order():
+            cost, prob = re._estimate()
+            total += hit * cost
+            hit *= prob
+        return total, hit
+
     def __repr__(self):
         return "<Inter %r>" % self.res
 
@@ -143,6 +249,21 @@ class Neg(Node):
     def search(self, data):
         return not self.res.search(data)
 
+    def _plan(self, index):
+        songs, exact = self.res._plan(index)
+        if not exact:
+            return None, False
+        if songs is None:
+            return set(), True
+        return index.songs - songs, True
+
+    def _compile(self, compiler):
+        return self.res._compile(compiler) + ["m = not m"]
+
+    def _estimate(self):
+        cost, prob = self.res._estimate()
+        return cost, 1.0 - prob
+
     def __repr__(self):
         return "<Neg %r>" % self.res
 
@@ -180,6 +301,23 @@ class Numcmp(Node):
             return self.__op(round(num, 2), self.__value)
         return False
 
+    def _plan(self, index):
+        return index.numeric(self.__ftag, self.__op, self.__value)
+
+    def _compile(self, compiler):
+        return [
+            "n = s(%r, None)" % self.__ftag,
+            "m = n is not None and %s(round(n, 2), %s)" % (
+                compiler.hoist(self.__op), compiler.hoist(self.__value)),
+        ]
+
+    def _estimate(self):
+        if self.__op is operator.eq:
+            return 3.0, 0.05
+        elif self.__op is operator.ne:
+            return 3.0, 0.95
+        return 3.0, 0.5
+
     def __repr__(self):
         return "<Numcmp tag=%r, op=%r, value=%.2f>" % (
             self.__tag, self.__op.__name__, self.__value)
@@ -250,6 +388,60 @@ class Tag(Node):
 
         return False
 
+    @staticmethod
+    def get_value(data, name):
+        """The value a name (as passed to __init__, not abbreviated)
+        gets matched against, the same as in search()"""
+
+        if name[:1] == "~":
+            if name in FS_KEYS:
+                return fsdecode(data(name))
+            return data(name)
+
+        val = data.get(name)
+        if val is None:
+            if name == "filename":
+                val = fsdecode(data.get("~filename", ""))
+            else:
+                val = data.get("~" + name, "")
+        return val
+
+    def _plan(self, index):
+        result = set()
+        for name in self.__names + self.__intern + self.__fs:
+            songs = index.tag(name, self.res)
+            if songs is None:
+                return None, False
+            result |= songs
+        return result, True
+
+    def _compile(self, compiler):
+        search = compiler.hoist(self.res.search)
+        blocks = []
+        for name in self.__names:
+            block = ["v = s.get(%r)" % name, "if v is None:"]
+            if name == "filename":
+                block.append("  v = %s(s.get('~filename', ''))" %
+                             compiler.hoist(fsdecode))
+            else:
+                block.append("  v = s.get(%r, '')" % ("~" + name))
+            block.append("m = %s(v)" % search)
+            blocks.append(block)
+        for name in self.__intern:
+            blocks.append(["m = %s(s(%r))" % (search, name)])
+        for name in self.__fs:
+            blocks.append(["m = %s(%s(s(%r)))" % (
+                search, compiler.hoist(fsdecode), name)])
+        if not blocks:
+            return ["m = False"]
+        return _chain(blocks, "not m")
+
+    def _estimate(self):
+        # real tags are dict lookups, the others need to be computed
+        cost = len(self.__names) + 4.0 * len(self.__intern + self.__fs)
+        count = len(self.__names + self.__intern + self.__fs)
+        return cost, 1.0 - 0.9 ** count
+
     def __repr__(self):
         names = self.__names + self.__intern
         return ("<Tag names=%r, res=%r>" % (names, self.res))
@@ -8,6 +8,7 @@
 from . import _match as match
 from ._match import error, Node
 from ._parser import QueryLexer, QueryParser
+from ._compiler import QueryCompiler
 from quodlibet.util import re_escape, enum, cached_property
 
 
@@ -96,11 +97,14 @@ class Query(Node):
 
     @cached_property
     def search(self):
-        return self._match.search
+        return QueryCompiler(self._match).compile()
 
     @cached_property
     def filter(self):
-        return self._match.filter
+        if isinstance(self._match, match.True_):
+            return self._match.filter
+        search = self.search
+        return lambda sequence: filter(search, sequence)
 
     @classmethod
     def is_valid(cls, string):
@@ -136,6 +140,15 @@ class Query(Node):
         except error:
             return QueryType.INVALID
 
+    def _plan(self, index):
+        return self._match._plan(index)
+
+    def _compile(self, compiler):
+        return self._match._compile(compiler)
+
+    def _estimate(self):
+        return self._match._estimate()
+
     def _unpack(self):
         # so that other classes can see the wrapped one and optimize
         # the result using the type information
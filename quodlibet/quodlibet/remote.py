@@ -6,8 +6,10 @@
 # published by the Free Software Foundation
 
 import os
+import json
 
-from quodlibet.util import fifo
+from quodlibet import util
+from quodlibet.util import fifo, unixsocket
 from quodlibet import const
 try:
     from quodlibet.util import winpipe
@@ -92,13 +94,32 @@ class QuodLibetWinRemote(RemoteBase):
 
 
 class QuodLibetUnixRemote(RemoteBase):
+    """Listens on the control FIFO and on the control socket.
+
+    The socket accepts any number of commands per connection, one per
+    line. In the default text mode each response is terminated by a NULL
+    byte. Lines starting with "{" are JSON requests like::
+
+        {"id": 1, "command": "print-query", "args": ["artist=foo"]}
+
+    which get answered with JSON lines: {"id": 1, "output": "..."} for
+    each part of the response (decoded as UTF-8, invalid bytes get
+    replaced) and a final {"id": 1, "done": true, "error": null}.
+    """
 
     _PATH = const.CONTROL
+    _SOCKET_PATH = const.CONTROL_SOCKET
+
+    _READ_TIMEOUT = 60
+    """Seconds to wait for the next part of a response, large responses
+    get created while sending"""
 
     def __init__(self, app, cmd_registry):
         self._app = app
         self._cmd_registry = cmd_registry
         self._fifo = fifo.FIFO(self._PATH, self._callback)
+        self._server = unixsocket.UnixSocketServer(
+            self._SOCKET_PATH, self._socket_callback)
 
     @classmethod
     def remote_exists(cls):
@@ -106,6 +127,24 @@ class QuodLibetUnixRemote(RemoteBase):
 
     @classmethod
     def send_message(cls, message):
+        if b"\n" not in message:
+            try:
+                client = unixsocket.UnixSocketClient(cls._SOCKET_PATH)
+            except EnvironmentError:
+                # no socket (e.g. an older instance), try the fifo
+                client = None
+
+            if client is not None:
+                with client:
+                    # the command might run from here on, so sending it
+                    # again through the fifo isn't safe
+                    try:
+                        client.send(message)
+                        client.set_timeout(cls._READ_TIMEOUT)
+                        return client.read_until(b"\x00")
+                    except EnvironmentError as e:
+                        raise RemoteError(e)
+
         try:
             return fifo.write_fifo(cls._PATH, message)
         except EnvironmentError as e:
@@ -117,7 +156,17 @@ class QuodLibetUnixRemote(RemoteBase):
         except fifo.FIFOError as e:
             raise RemoteError(e)
 
+        try:
+            self._server.start()
+        except unixsocket.UnixSocketError as e:
+            self._fifo.destroy()
+            raise RemoteError(e)
+        except EnvironmentError as e:
+            # the fifo still works
+            print_w("Couldn't create control socket: %s" % e)
+
     def stop(self):
+        self._server.stop()
         self._fifo.destroy()
 
     def _callback(self, data):
@@ -133,6 +182,45 @@ class QuodLibetUnixRemote(RemoteBase):
                     if response is not None:
                         h.write(response)
 
+    def _socket_callback(self, line):
+        if line.startswith(b"{"):
+            return self._json_response(line)
+        return self._text_response(line)
+
+    def _text_response(self, line):
+        for data in self._cmd_registry.handle_line_iter(self._app, line):
+            yield data
+        yield b"\x00"
+
+    def _json_response(self, line):
+        from quodlibet.commands import CommandError
+
+        def dump(**kwargs):
+            return json.dumps(kwargs) + b"\n"
+
+        id_ = None
+        error = None
+        try:
+            try:
+                request = json.loads(line)
+                id_ = request.get("id")
+                command = request["command"].encode("utf-8")
+                args = [a.encode("utf-8") for a in request.get("args", [])]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                raise CommandError("invalid request %r" % line)
+
+            print_d("command: %s(*%r)" % (command, args))
+
+            for data in self._cmd_registry.run_iter(
+                    self._app, command, *args):
+                yield dump(id=id_, output=data.decode("utf-8", "replace"))
+        except CommandError as e:
+            error = str(e)
+        except Exception as e:
+            util.print_exc()
+            error = str(e) or type(e).__name__
+
+        yield dump(id=id_, done=True, error=error)
 
 if os.name == "nt":
     Remote = QuodLibetWinRemote
@@ -11,6 +11,8 @@ from __future__ import absolute_import
 
 import os
 import random
+import threading
+from contextlib import contextmanager
 
 from quodlibet import util
 from quodlibet import config
@@ -39,9 +41,13 @@ def avg(nums):
 def bayesian_average(nums, c=None, m=None):
     """Returns the Bayesian average of an iterable of numbers,
     with parameters defaulting to config specific to ~#rating."""
+    return _bayesian_average(sum(nums), len(nums), c, m)
+
+
+def _bayesian_average(total, count, c=None, m=None):
     m = m or config.RATINGS.default
     c = c or config.getfloat("settings", "bayesian_rating_factor", 0.0)
-    ret = float(m * c + sum(nums)) / (c + len(nums))
+    ret = float(m * c + total) / (c + count)
     return ret
 
 NUM_DEFAULT_FUNCS = {
@@ -67,6 +73,83 @@ NUM_FUNCS = {
 }
 
 
+class NumericStats(object):
+    """Running aggregates of a numeric tag over a set of songs, giving the
+    same results as the functions in NUM_FUNCS.
+
+    Songs can be added, changed and removed without going over all songs:
+    the sum gets adjusted by the difference of the old and new value and
+    minimum/maximum only get recomputed if one of them was removed.
+    """
+
+    def __init__(self, key, songs=()):
+        self.key = key
+        self.values = {}
+        self.total = 0
+        self.__extremes = None
+        self.__changes = 0
+        self.update(songs)
+        self.__changes = 0
+
+    def update(self, songs):
+        """Add songs or take over the new values of changed ones"""
+
+        key = self.key
+        values = self.values
+        for song in songs:
+            old = values.pop(song, None)
+            if old is not None:
+                self.__discard(old)
+            value = song(key)
+            if value == "":
+                continue
+            values[song] = value
+            self.total += value
+            self.__changes += 1
+            if self.__extremes is not None:
+                low, high = self.__extremes
+                self.__extremes = (min(low, value), max(high, value))
+
+    def remove(self, songs):
+        values = self.values
+        for song in songs:
+            old = values.pop(song, None)
+            if old is not None:
+                self.__discard(old)
+
+    def __discard(self, value):
+        self.total -= value
+        self.__changes += 1
+        if self.__extremes is not None and value in self.__extremes:
+            self.__extremes = None
+
+    def get(self, func):
+        """Returns the aggregate for a key of NUM_FUNCS or None if no song
+        has a value"""
+
+        values = self.values
+        if not values:
+            return None
+        if func in ("min", "max"):
+            if self.__extremes is None:
+                self.__extremes = (
+                    min(values.itervalues()), max(values.itervalues()))
+            return self.__extremes[func == "max"]
+
+        # don't let float errors of the running sum add up
+        if self.__changes > len(values):
+            self.total = sum(values.itervalues())
+            self.__changes = 0
+
+        if func == "sum":
+            return self.total
+        elif func == "avg":
+            return float(self.total) / len(values)
+        elif func == "bav":
+            return _bayesian_average(self.total, len(values))
+        raise ValueError(func)
+
+
 class Collection(object):
     """A collection of songs which implements some methods similar to the
     AudioFile class.
@@ -92,6 +175,12 @@ class Collection(object):
         self.__default.clear()
         self.__used = []
 
+    def _get_stats(self, key):
+        """Returns NumericStats for the numeric key or None if the
+        aggregates should be computed from the songs each time"""
+
+        return None
+
     def get(self, key, default=u"", connector=u" - "):
         if not self.songs:
             return default
@@ -176,6 +265,10 @@ class Collection(object):
                 func = NUM_DEFAULT_FUNCS.get(key, "avg")
 
             key = "~#" + key
+            if func in NUM_FUNCS:
+                stats = self._get_stats(key)
+                if stats is not None:
+                    return stats.get(func)
             func = NUM_FUNCS.get(func)
             if func:
                 # If none of the songs can return a numeric key,
@@ -295,6 +388,7 @@ class Album(Collection):
     def __init__(self, song):
         super(Album, self).__init__()
         self.songs = set()
+        self.__stats = {}
         # albumsort is part of the album_key, so every song has the same
         self.sort = util.human_sort_key(song("albumsort"))
         self.key = song.album_key
@@ -305,10 +399,40 @@ class Album(Collection):
 
     def finalize(self):
         """Finalize this album. Call after songs get added or removed"""
+        self.__stats.clear()
+        self.__invalidate()
+
+    def __invalidate(self):
         super(Album, self).finalize()
         self.__dict__.pop("peoplesort", None)
         self.__dict__.pop("genre", None)
 
+    def _get_stats(self, key):
+        stats = self.__stats.get(key)
+        if stats is None:
+            stats = self.__stats[key] = NumericStats(key, self.songs)
+        return stats
+
+    def add_songs(self, songs):
+        """Add songs, updating numeric aggregates instead of recomputing
+        them. Replaces changing `songs` and calling finalize()."""
+
+        self.songs.update(songs)
+        self.songs_changed(songs)
+
+    def remove_songs(self, songs):
+        self.songs.difference_update(songs)
+        for stats in self.__stats.itervalues():
+            stats.remove(songs)
+        self.__invalidate()
+
+    def songs_changed(self, songs):
+        """Call after tags of contained songs have changed"""
+
+        for stats in self.__stats.itervalues():
+            stats.update(songs)
+        self.__invalidate()
+
     def scan_cover(self, force=False, scale_factor=1,
             callback=None, cancel=None):
         if (self.scanned and not force) or not self.songs:
@@ -331,14 +455,65 @@ class Album(Collection):
         return "Album(%s)" % repr(self.key)
 
 
+class _IndexedList(HashedList):
+    """A HashedList which also records itself as containing its items
+    in `index`, a dict of item -> {id(owner): owner} shared by all
+    lists."""
+
+    def __init__(self, owner, index, arg=None):
+        super(_IndexedList, self).__init__(arg)
+        self._owner = owner
+        self._index = index
+        self.__added(self)
+
+    def __added(self, items):
+        key, owner = id(self._owner), self._owner
+        for item in items:
+            self._index.setdefault(item, {})[key] = owner
+
+    def __removed(self, items):
+        key = id(self._owner)
+        for item in items:
+            if item not in self:
+                owners = self._index.get(item, {})
+                owners.pop(key, None)
+                if not owners:
+                    self._index.pop(item, None)
+
+    def __setitem__(self, index, item):
+        if isinstance(index, slice):
+            item = list(item)
+            old, new = self[index], item
+        else:
+            old, new = [self[index]], [item]
+        super(_IndexedList, self).__setitem__(index, item)
+        self.__removed(old)
+        self.__added(new)
+
+    def __delitem__(self, index):
+        old = self[index]
+        if not isinstance(index, slice):
+            old = [old]
+        super(_IndexedList, self).__delitem__(index)
+        self.__removed(old)
+
+    def insert(self, index, item):
+        super(_IndexedList, self).insert(index, item)
+        self.__added([item])
+
+
 class Playlist(Collection, Iterable):
     """A Playlist is a `Collection` that has list-like features
     Songs can appear more than once.
 
+    The playlist file only gets read once the content is needed.
+
     TODO: Fix this crap
     """
 
     __instances = []
+    # song or filename -> {id(playlist): playlist}, for read playlists
+    __featuring = {}
 
     quote = staticmethod(escape_filename)
     unquote = staticmethod(unescape_filename)
@@ -385,11 +560,40 @@ class Playlist(Collection, Iterable):
     def playlists_featuring(cls, song):
         """Returns the list of playlists in which this song appears"""
 
-        playlists = []
+        # the index only knows the playlists which were read
         for instance in cls.__instances:
-            if song in instance._list:
-                playlists.append(instance)
-        return playlists
+            instance._list
+        return sorted(cls.__featuring.get(song, {}).itervalues())
+
+    def finalize(self):
+        if self.__batch:
+            self.__finalize_pending = True
+        else:
+            super(Playlist, self).finalize()
+
+    @contextmanager
+    def batch(self):
+        """Groups many changes: aggregates only get invalidated once at the
+        end and all write()/write_async() calls become one write_async().
+
+        with playlist.batch():
+            playlist.remove_songs(removed)
+            playlist.extend(added)
+            playlist.write()
+        """
+
+        self.__batch += 1
+        try:
+            yield self
+        finally:
+            self.__batch -= 1
+            if not self.__batch:
+                if self.__finalize_pending:
+                    self.__finalize_pending = False
+                    self.finalize()
+                if self.__write_pending:
+                    self.__write_pending = False
+                    self.write_async()
 
     # List-like methods, for compatibilty with original Playlist class.
     def extend(self, songs):
@@ -435,7 +639,31 @@ class Playlist(Collection, Iterable):
         self.name = name
         self.dir = dir
         self.library = library
-        self._list = HashedList()
+        self.__list = None
+        self.__batch = 0
+        self.__finalize_pending = False
+        self.__write_pending = False
+        self.__save_lock = threading.Lock()
+        self.__save_pending = None
+        self.__saver = None
+        if self.name and not os.path.exists(self.filename):
+            self.write()
+
+    @property
+    def loaded(self):
+        """If the content of the playlist file was read"""
+
+        return self.__list is not None
+
+    @property
+    def _list(self):
+        if self.__list is None:
+            self.__list = _IndexedList(self, self.__featuring, self.__read())
+        return self.__list
+
+    def __read(self):
+        library = self.library
+        items = []
         try:
             with open(self.filename, "rb") as h:
                 for line in h:
@@ -446,12 +674,12 @@ class Playlist(Collection, Iterable):
                         # decoding failed
                         continue
                     if line in library:
-                        self._list.append(library[line])
+                        items.append(library[line])
                     elif library and library.masked(line):
-                        self._list.append(line)
+                        items.append(line)
         except IOError:
-            if self.name:
-                self.write()
+            pass
+        return items
 
     @property
     def filename(self):
@@ -468,6 +696,9 @@ class Playlist(Collection, Iterable):
             raise ValueError(
                 _("A playlist named %s already exists.") % newname)
         else:
+            # read the content before the old file is gone
+            self._list
+            self.__wait_for_save()
             try:
                 os.unlink(self.filename)
             except EnvironmentError:
@@ -485,30 +716,39 @@ class Playlist(Collection, Iterable):
 
     def remove_songs(self, songs, leave_dupes=False):
         """Removes `songs` from this playlist if they are there,
-         removing only the first reference if `leave_dupes` is True
+         removing only the first reference if `leave_dupes` is True.
+
+        Songs which are masked in the library get replaced by their
+        filename instead, so they come back once the mount point does.
+
+        Returns True if the playlist changed.
         """
-        changed = False
+
+        masked = set()
+        removed = set()
         for song in songs:
-            # TODO: document the "library.masked" business
+            if song not in self._list:
+                continue
             if self.library is not None and self.library.masked(song):
-                while True:
-                    try:
-                        self._list[self.index(song)] = song("~filename")
-                    except ValueError:
-                        break
-                    else:
-                        changed = True
+                masked.add(song)
             else:
-                while song in self._list:
-                    self._list.remove(song)
-                    if leave_dupes:
-                        changed = True
-                        break
-                else:
-                    changed = True
-        if changed:
-            self.finalize()
-        return changed
+                removed.add(song)
+        if not masked and not removed:
+            return False
+
+        items = []
+        for item in self._list:
+            if item in masked:
+                items.append(item("~filename"))
+            elif item in removed:
+                if leave_dupes:
+                    removed.discard(item)
+            else:
+                items.append(item)
+        self._list[:] = items
+
+        self.finalize()
+        return True
 
     def has_songs(self, songs):
         # TODO(rm): consider the "library.masked" business
@@ -523,6 +763,7 @@ class Playlist(Collection, Iterable):
 
     def delete(self):
         self.clear()
+        self.__wait_for_save()
         try:
             os.unlink(self.filename)
         except EnvironmentError:
@@ -530,13 +771,67 @@ class Playlist(Collection, Iterable):
         if self in self.__instances:
             self.__instances.remove(self)
 
+    def __dump(self):
+        lines = []
+        for song in self._list:
+            if isinstance(song, basestring):
+                lines.append(fsnative2bytes(song) + "\n")
+            else:
+                lines.append(fsnative2bytes(song("~filename")) + "\n")
+        return "".join(lines)
+
+    @staticmethod
+    def __save(filename, data):
+        with util.atomic_save(filename, ".tmp", "wb") as fileobj:
+            fileobj.write(data)
+
     def write(self):
-        with open(self.filename, "wb") as f:
-            for song in self._list:
-                if isinstance(song, basestring):
-                    f.write(fsnative2bytes(song) + "\n")
-                else:
-                    f.write(fsnative2bytes(song("~filename")) + "\n")
+        """Replaces the playlist file with the current content.
+
+        Can raise EnvironmentError.
+        """
+
+        if self.__batch:
+            self.__write_pending = True
+            return
+        # an older background save shouldn't overwrite this one
+        self.__wait_for_save()
+        self.__save(self.filename, self.__dump())
+
+    def write_async(self):
+        """Like write(), but the file gets written in a background thread.
+
+        Calls while a save is running result in one more save with the
+        newest content once it is done. Errors get printed.
+        """
+
+        if self.__batch:
+            self.__write_pending = True
+            return
+
+        with self.__save_lock:
+            self.__save_pending = (self.filename, self.__dump())
+            if self.__saver is None:
+                self.__saver = threading.Thread(target=self.__save_thread)
+                self.__saver.start()
+
+    def __save_thread(self):
+        while True:
+            with self.__save_lock:
+                pending = self.__save_pending
+                self.__save_pending = None
+                if pending is None:
+                    self.__saver = None
+                    return
+            try:
+                self.__save(*pending)
+            except EnvironmentError as e:
+                print_w("Couldn't save playlist %r: %s" % (pending[0], e))
+
+    def __wait_for_save(self):
+        saver = self.__saver
+        if saver is not None:
+            saver.join()
 
     def format(self):
         """Return a markup representation of information for this playlist"""
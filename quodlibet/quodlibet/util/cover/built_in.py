@@ -10,6 +10,7 @@ import re
 
 from quodlibet.plugins.cover import CoverSourcePlugin
 from quodlibet.util.path import fsdecode
+from quodlibet.util import dircache
 from quodlibet import config
 
 
@@ -64,6 +65,53 @@ class FilesystemCover(CoverSourcePlugin):
     def priority():
         return 0.80
 
+    @classmethod
+    def _list_images(cls, base):
+        """Returns (subdir, filename) pairs for all images in the directory
+        and its cover subdirectories, subdir being None for the former"""
+
+        get_ext = lambda s: os.path.splitext(s)[1].lstrip('.')
+
+        entries = []
+        try:
+            entries = dircache.listdir(base)
+        except EnvironmentError:
+            pass
+
+        fns = []
+        for entry in entries:
+            lentry = entry.lower()
+            if get_ext(lentry) in cls.cover_exts:
+                fns.append((None, entry))
+            if lentry in cls.cover_subdirs:
+                subdir = os.path.join(base, entry)
+                sub_entries = []
+                try:
+                    sub_entries = dircache.listdir(subdir)
+                except EnvironmentError:
+                    pass
+                for sub_entry in sub_entries:
+                    lsub_entry = sub_entry.lower()
+                    if get_ext(lsub_entry) in cls.cover_exts:
+                        fns.append((entry, sub_entry))
+        return fns
+
+    @classmethod
+    def prefetch(cls, songs, cancellable=None):
+        if config.getboolean("albumart", "force_filename"):
+            return
+
+        seen = set()
+        for song in songs:
+            if cancellable and cancellable.is_cancelled():
+                return
+            if not song.is_file:
+                continue
+            base = song('~dirname')
+            if base not in seen:
+                seen.add(base)
+                cls._list_images(base)
+
     @property
     def cover(self):
         # TODO: Deserves some refactoring
@@ -79,30 +127,7 @@ class FilesystemCover(CoverSourcePlugin):
             if os.path.isfile(path):
                 images = [(100, path)]
         else:
-            get_ext = lambda s: os.path.splitext(s)[1].lstrip('.')
-
-            entries = []
-            try:
-                entries = os.listdir(base)
-            except EnvironmentError:
-                pass
-
-            fns = []
-            for entry in entries:
-                lentry = entry.lower()
-                if get_ext(lentry) in self.cover_exts:
-                    fns.append((None, entry))
-                if lentry in self.cover_subdirs:
-                    subdir = os.path.join(base, entry)
-                    sub_entries = []
-                    try:
-                        sub_entries = os.listdir(subdir)
-                    except EnvironmentError:
-                        pass
-                    for sub_entry in sub_entries:
-                        lsub_entry = sub_entry.lower()
-                        if get_ext(lsub_entry) in self.cover_exts:
-                            fns.append((entry, sub_entry))
+            fns = self._list_images(base)
 
             for sub, fn in fns:
                 dec_lfn = fsdecode(fn, False).lower()
@@ -6,16 +6,23 @@
 # it under the terms of the GNU General Public License version 2 as
 # published by the Free Software Foundation
 
-from itertools import chain
+import os
+import tempfile
+import threading
+import cPickle as pickle
+from itertools import chain, groupby
 from multiprocessing.pool import ThreadPool
 
-from gi.repository import GObject, GLib
+from gi.repository import GObject, GLib, Gio
 
 from quodlibet import config
+from quodlibet import util
+from quodlibet.util import copool, thumbnails
 from quodlibet.plugins import PluginManager, PluginHandler
 from quodlibet.util.cover import built_in
-from quodlibet.util.thumbnails import get_thumbnail_from_file
-from quodlibet.plugins.cover import CoverSourcePlugin
+from quodlibet.util.path import xdg_get_cache_home
+from quodlibet.util.thumbnails import get_thumbnail_from_file, PixbufCache
+from quodlibet.plugins.cover import CoverSourcePlugin, cover_dir
 
 
 class CoverPluginHandler(PluginHandler):
@@ -49,6 +56,86 @@ class CoverPluginHandler(PluginHandler):
             yield p
 
 
+class CoverCache(object):
+    """Remembers which image file get_cover_many() found for a group of
+    songs, or that it found none, across sessions.
+
+    Entries consist of a key and a stamp. A lookup with a different stamp
+    (because a directory or song changed) invalidates the entry.
+    """
+
+    VERSION = 1
+
+    MAX_ENTRIES = 50000
+    """If more entries get stored, all old ones get dropped"""
+
+    SAVE_DELAY = 5
+    """Seconds after a change until the cache gets saved"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._entries = None
+        self._save_id = None
+
+    def _get_entries(self):
+        if self._entries is None:
+            self._entries = {}
+            try:
+                with open(self.filename, "rb") as fileobj:
+                    version, entries = pickle.load(fileobj)
+            except (EnvironmentError, EOFError, ValueError, TypeError,
+                    pickle.UnpicklingError) as e:
+                print_d("Couldn't load cover cache: %s" % e)
+            else:
+                if version == self.VERSION:
+                    self._entries = entries
+        return self._entries
+
+    def lookup(self, key, stamp):
+        """Returns (True, path) for a cached result, path being None if
+        there was no cover, or (False, None) if unknown"""
+
+        entries = self._get_entries()
+        entry = entries.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] != stamp:
+            del entries[key]
+            self._schedule_save()
+            return False, None
+        return True, entry[1]
+
+    def store(self, key, stamp, path):
+        entries = self._get_entries()
+        if len(entries) >= self.MAX_ENTRIES:
+            entries.clear()
+        entries[key] = (stamp, path)
+        self._schedule_save()
+
+    def clear(self):
+        self._get_entries().clear()
+        self._schedule_save()
+
+    def _schedule_save(self):
+        if self._save_id is None:
+            self._save_id = GLib.timeout_add_seconds(
+                self.SAVE_DELAY, self._save_cb)
+
+    def _save_cb(self):
+        self._save_id = None
+        self.save()
+        return False
+
+    def save(self):
+        if self._entries is None:
+            return
+        try:
+            with util.atomic_save(self.filename, ".tmp", "wb") as fileobj:
+                pickle.dump((self.VERSION, self._entries), fileobj, 2)
+        except EnvironmentError as e:
+            print_w("Couldn't save cover cache: %s" % e)
+
+
 class CoverManager(GObject.Object):
 
     __gsignals__ = {
@@ -59,10 +146,19 @@ class CoverManager(GObject.Object):
 
     plugin_handler = None
 
+    POOL_SIZE = 4
+    """Number of worker threads for decoding images"""
+
+    MAX_PIXBUF_BYTES = 32 * 1024 * 1024
+    """Memory used for keeping decoded covers around"""
+
     def __init__(self, use_built_in=True):
         super(CoverManager, self).__init__()
         self.plugin_handler = CoverPluginHandler(use_built_in)
-        self._pool = ThreadPool()
+        self._pool = ThreadPool(self.POOL_SIZE)
+        self._pixbufs = PixbufCache(self.MAX_PIXBUF_BYTES)
+        self._cache = CoverCache(
+            os.path.join(xdg_get_cache_home(), "quodlibet", "covers.cache"))
 
     def init_plugins(self):
         """Register the cover sources plugin handler with the global
@@ -84,51 +180,86 @@ class CoverManager(GObject.Object):
         to re-fetch the cover and do a display update.
         """
 
+        self._cache.clear()
+        self._pixbufs.clear()
         self.emit("cover-changed", songs)
 
     def acquire_cover(self, callback, cancellable, song):
         """
         Try to get covers from all cover sources until a cover is found.
 
+        Sources with the same priority get asked at the same time; the
+        first one finding a cover wins and the others get cancelled.
+
         * callback(found, result) is the function which will be called when
         this method completes its job.
         * cancellable – Gio.Cancellable which will interrupt the search.
         The callback won't be called when the operation is cancelled.
         """
-        sources = self.sources
-
-        def success(source, result):
-            name = source.__class__.__name__
-            print_d('Successfully got cover from {0}'.format(name))
-            source.disconnect_by_func(success)
-            source.disconnect_by_func(failure)
-            if not cancellable or not cancellable.is_cancelled():
-                callback(True, result)
-
-        def failure(source, msg):
-            name = source.__class__.__name__
-            print_d("Didn't get cover from {0}: {1}".format(name, msg))
-            source.disconnect_by_func(success)
-            source.disconnect_by_func(failure)
-            if not cancellable or not cancellable.is_cancelled():
-                run()
+
+        groups = groupby(self.sources, lambda s: s.priority())
+
+        def is_cancelled():
+            return cancellable and cancellable.is_cancelled()
 
         def run():
             try:
-                provider = next(sources)(song, cancellable)
+                group = list(next(groups)[1])
             except StopIteration:
                 return callback(False, None)  # No cover found
 
-            cover = provider.cover
-            if cover:
+            # cancels the other sources of the group once one succeeded
+            group_cancellable = Gio.Cancellable()
+            providers = [source(song, group_cancellable) for source in group]
+
+            for provider in providers:
+                cover = provider.cover
+                if cover:
+                    name = provider.__class__.__name__
+                    print_d('Found local cover from {0}'.format(name))
+                    return callback(True, cover)
+
+            pending = list(providers)
+            parent_id = None
+            if cancellable:
+                parent_id = GObject.Object.connect(
+                    cancellable, "cancelled",
+                    lambda c: group_cancellable.cancel())
+
+            def finish(provider):
+                provider.disconnect_by_func(success)
+                provider.disconnect_by_func(failure)
+                pending.remove(provider)
+                if not pending and parent_id is not None:
+                    GObject.Object.disconnect(cancellable, parent_id)
+
+            def success(provider, result):
                 name = provider.__class__.__name__
-                print_d('Found local cover from {0}'.format(name))
-                callback(True, cover)
-            else:
+                print_d('Successfully got cover from {0}'.format(name))
+                finish(provider)
+                group_cancellable.cancel()
+                for other in list(pending):
+                    finish(other)
+                if not is_cancelled():
+                    callback(True, result)
+
+            def failure(provider, msg):
+                name = provider.__class__.__name__
+                print_d("Didn't get cover from {0}: {1}".format(name, msg))
+                finish(provider)
+                if not pending and not is_cancelled():
+                    run()
+
+            for provider in providers:
                 provider.connect('fetch-success', success)
                 provider.connect('fetch-failure', failure)
+            for provider in providers:
+                # a source could have succeeded synchronously
+                if provider not in pending:
+                    break
                 provider.fetch_cover()
-        if not cancellable or not cancellable.is_cancelled():
+
+        if not is_cancelled():
             run()
 
     def acquire_cover_sync(self, song, embedded=True, external=True):
@@ -144,6 +275,11 @@ class CoverManager(GObject.Object):
         """Same as acquire_cover_sync but returns a cover for multiple
         images"""
 
+        return self._acquire_cover_sync_many(songs, embedded, external)[0]
+
+    def _acquire_cover_sync_many(self, songs, embedded, external):
+        """Returns (cover, source) or (None, None)"""
+
         for plugin in self.sources:
             if not embedded and plugin.embedded:
                 continue
@@ -160,7 +296,8 @@ class CoverManager(GObject.Object):
                 song = sorted(group, key=lambda s: s.key)[0]
                 cover = plugin(song).cover
                 if cover:
-                    return cover
+                    return cover, plugin
+        return None, None
 
     def get_cover(self, song):
         """Returns a cover file object for one song or None.
@@ -171,6 +308,29 @@ class CoverManager(GObject.Object):
 
         return self.get_cover_many([song])
 
+    def prefetch_many(self, songs_list, cancel=None):
+        """Lets all sources warm up their caches for the given song
+        collections (e.g. all visible albums) in a worker thread, making
+        later get_cover_many() calls for them faster.
+
+        songs_list is a list of song lists, ordered by importance.
+        cancel is a Gio.Cancellable.
+        """
+
+        songs = list(chain.from_iterable(songs_list))
+        sources = list(self.sources)
+
+        def prefetch():
+            for source in sources:
+                if cancel and cancel.is_cancelled():
+                    return
+                try:
+                    source.prefetch(songs, cancel)
+                except Exception:
+                    util.print_exc()
+
+        self._pool.apply_async(prefetch)
+
     def get_cover_many(self, songs):
         """Returns a cover file object for many songs or None.
 
@@ -179,27 +339,85 @@ class CoverManager(GObject.Object):
         same cover for the same set of songs.
         """
 
-        prefer_embedded = config.getboolean(
-            "albumart", "prefer_embedded", False)
+        key, stamp = self._get_cache_key(songs)
+        return self._get_cover_many(songs, key, stamp)
 
-        get = self.acquire_cover_sync_many
-        if prefer_embedded:
-            return get(songs, True, False) or get(songs, False, True)
+    def _get_cover_many(self, songs, key, stamp):
+        cached, path = self._cache.lookup(key, stamp)
+        if cached:
+            if path is None:
+                return
+            try:
+                return open(path, "rb")
+            except EnvironmentError:
+                pass
+
+        get = self._acquire_cover_sync_many
+        if config.getboolean("albumart", "prefer_embedded", False):
+            cover, source = get(songs, True, False)
+            if not cover:
+                cover, source = get(songs, False, True)
         else:
-            return get(songs, False, True) or get(songs, True, False)
+            cover, source = get(songs, False, True)
+            if not cover:
+                cover, source = get(songs, True, False)
+
+        if not cover:
+            self._cache.store(key, stamp, None)
+        elif not source.embedded and \
+                os.path.isfile(getattr(cover, "name", "")):
+            # embedded images are in temporary files
+            self._cache.store(key, stamp, cover.name)
+        return cover
+
+    def _get_cache_key(self, songs):
+        """Returns a key and a stamp for the cover cache.
+
+        The stamp covers what the cover search depends on: the song
+        directories (for added images), the songs (for embedded images),
+        downloaded covers, the active sources and the settings.
+        """
+
+        def mtime(path):
+            try:
+                return os.path.getmtime(path)
+            except EnvironmentError:
+                return None
+
+        groups = set()
+        song_mtime = 0
+        for song in songs:
+            groups.add((song("~dirname"), song.album_key))
+            song_mtime = max(song_mtime, song("~#mtime", 0))
+        key = tuple(sorted(groups))
+
+        dirs = sorted(set(d for d, k in groups))
+        stamp = (
+            tuple(mtime(d) for d in dirs), song_mtime, mtime(cover_dir),
+            tuple(s.__name__ for s in self.sources),
+            config.getboolean("albumart", "prefer_embedded", False),
+            config.getboolean("albumart", "force_filename"),
+            config.get("albumart", "filename"))
+        return key, stamp
 
     def get_pixbuf_many(self, songs, width, height):
         """Returns a Pixbuf which fits into the boundary defined by width
         and height or None.
 
-        Uses the thumbnail cache if possible.
+        Uses the thumbnail cache if possible and keeps the result in memory
+        until the cover changes.
         """
 
-        fileobj = self.get_cover_many(songs)
+        key, stamp = self._get_cache_key(songs)
+        pixbuf = self._pixbufs.get((key, (width, height)), stamp)
+        if pixbuf is not None:
+            return pixbuf
+
+        fileobj = self._get_cover_many(songs, key, stamp)
         if fileobj is None:
             return
 
-        return get_thumbnail_from_file(fileobj, (width, height))
+        return self._decode((key, (width, height)), stamp, fileobj)
 
     def get_pixbuf(self, song, width, height):
         """see get_pixbuf_many()"""
@@ -210,10 +428,17 @@ class CoverManager(GObject.Object):
         """Async variant; callback gets called with a pixbuf or not called
         in case of an error. cancel is a Gio.Cancellable.
 
-        The callback will be called in the main loop.
+        The callback will be called in the main loop, right away in case
+        the pixbuf is in memory already.
         """
 
-        fileobj = self.get_cover_many(songs)
+        key, stamp = self._get_cache_key(songs)
+        pixbuf = self._pixbufs.get((key, (width, height)), stamp)
+        if pixbuf is not None:
+            callback(pixbuf)
+            return
+
+        fileobj = self._get_cover_many(songs, key, stamp)
         if fileobj is None:
             return
 
@@ -221,12 +446,105 @@ class CoverManager(GObject.Object):
             if not cancel.is_cancelled():
                 callback(result)
 
+        def decode():
+            # the request might be outdated by the time a thread is free
+            if cancel.is_cancelled():
+                return
+            return self._decode((key, (width, height)), stamp, fileobj)
+
         def thread_callback(result):
             if cancel.is_cancelled():
                 return
             GLib.idle_add(main_loop_callback, result,
                           priority=GLib.PRIORITY_DEFAULT)
 
-        self._pool.apply_async(
-            get_thumbnail_from_file, args=(fileobj, (width, height)),
-            callback=thread_callback)
+        self._pool.apply_async(decode, callback=thread_callback)
+
+    def warm_thumbnails(self, songs_list):
+        """Creates missing thumbnails for the covers of all song
+        collections in the background.
+
+        The covers get looked up in the main loop, the thumbnails get
+        created in worker threads. Only image files of external sources
+        are considered; embedded covers get extracted to temporary files,
+        which don't get thumbnails cached. Progress is shown as a task
+        once the first missing thumbnail is found.
+        """
+
+        from quodlibet.qltk.notif import Task
+
+        cancel = Gio.Cancellable()
+        state = {"task": None}
+        tempdir = tempfile.gettempdir()
+
+        def find_cover(songs):
+            key, stamp = self._get_cache_key(songs)
+            cached, path = self._cache.lookup(key, stamp)
+            if cached:
+                return path
+            cover = self._acquire_cover_sync_many(songs, False, True)[0]
+            if cover is not None:
+                cover.close()
+                return getattr(cover, "name", None)
+
+        def find_covers():
+            paths = set()
+            for songs in songs_list:
+                if cancel.is_cancelled():
+                    return
+                path = find_cover(songs)
+                if path and os.path.isfile(path) and \
+                        not path.startswith(tempdir):
+                    paths.add(path)
+                yield True
+
+            thread = threading.Thread(
+                target=create_thumbnails, args=(sorted(paths),))
+            thread.daemon = True
+            thread.start()
+
+        def update(frac):
+            if cancel.is_cancelled():
+                return
+            if state["task"] is None:
+                state["task"] = Task(
+                    _("Covers"), _("Creating thumbnails"), stop=cancel.cancel)
+            state["task"].update(frac)
+
+        def finish():
+            if state["task"] is not None and not cancel.is_cancelled():
+                state["task"].finish()
+
+        def create_thumbnails(paths):
+            for i, (path, created) in enumerate(
+                    thumbnails.create_thumbnails_many(
+                        paths, processes=self.POOL_SIZE, cancellable=cancel)):
+                if created:
+                    GLib.idle_add(update, float(i + 1) / len(paths))
+            GLib.idle_add(finish)
+
+        copool.add(find_covers)
+
+    def get_thumbnail_from_file(self, fileobj, boundary):
+        """Like thumbnails.get_thumbnail_from_file(), but keeps the result
+        in memory as long as the file doesn't change"""
+
+        path = fileobj.name
+        try:
+            stat = os.stat(path)
+        except EnvironmentError:
+            return get_thumbnail_from_file(fileobj, boundary)
+
+        stamp = (stat.st_mtime, stat.st_size)
+        key = (path, boundary)
+        return self._pixbufs.get(key, stamp) or \
+            self._decode(key, stamp, fileobj)
+
+    def _decode(self, key, stamp, fileobj):
+        """Returns a thumbnail fitting in the boundary given as last item
+        of `key` and stores it in the pixbuf cache. Thread-safe."""
+
+        pixbuf = get_thumbnail_from_file(fileobj, key[-1])
+        if pixbuf is not None:
+            self._pixbufs.set(key, pixbuf, stamp)
+        return pixbuf
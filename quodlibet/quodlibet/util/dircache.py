@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+"""A shared cache of directory listings.
+
+Listing a directory can be expensive (e.g. on network file systems) while
+checking its modification time is usually cheap, so listings get reused
+as long as the directory hasn't changed.
+"""
+
+from __future__ import absolute_import
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+
+class DirectoryCache(object):
+    """Caches directory listings, validated through the directory mtime.
+
+    Can be used from multiple threads.
+    """
+
+    MAX_ENTRIES = 5000
+    """Number of listings to keep, the least recently used get dropped"""
+
+    RACY_TIME = 2
+    """Directories changed less than this many seconds ago don't get
+    cached, as a following change might not change their mtime"""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def listdir(self, path):
+        """Like os.listdir() but returns a tuple, which might be shared
+        with other callers.
+
+        Raises EnvironmentError.
+        """
+
+        try:
+            stat = os.stat(path)
+        except EnvironmentError:
+            with self._lock:
+                self._entries.pop(path, None)
+            raise
+        stamp = (stat.st_mtime, stat.st_ino)
+
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None and entry[0] == stamp:
+                self._entries[path] = entry
+                return entry[1]
+
+        names = tuple(os.listdir(path))
+        if time.time() - stat.st_mtime < self.RACY_TIME:
+            return names
+
+        with self._lock:
+            self._entries[path] = (stamp, names)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return names
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = DirectoryCache()
+
+listdir = _cache.listdir
+clear = _cache.clear
@@ -8,6 +8,7 @@
 
 import re
 import sys
+import time
 
 from quodlibet import app
 from quodlibet import config
@@ -63,17 +64,23 @@ def scan_library(library, force):
     paths = get_scan_dirs()
     exclude = split_scan_dirs(config.get("library", "exclude"))
     exclude = [bytes2fsnative(e) for e in exclude]
-    copool.add(library.rebuild, paths, force, exclude,
+    quick = config.getboolean("library", "quick_refresh")
+    copool.add(library.rebuild, paths, force, exclude, quick=quick,
                cofuncid="library", funcid="library")
 
 
 def emit_signal(songs, signal="changed", block_size=50, name=None,
-                cofuncid=None):
+                cofuncid=None, budget=0.02):
     """
     A generator that signals `signal` on the library
     in blocks of `block_size`. Useful for copools.
+
+    The block size gets adjusted so each emission takes about `budget`
+    seconds, few large blocks for cheap handlers and small ones for
+    expensive handlers.
     """
     i = 0
+    blocks = 0
     with Task(_("Library"), name or signal) as task:
         if cofuncid:
             task.copool(cofuncid)
@@ -82,10 +89,17 @@ def emit_signal(songs, signal="changed", block_size=50, name=None,
             more = songs[i:i + block_size]
             if not more:
                 return
-            if 0 == ((i / block_size) % 10):
+            if 0 == (blocks % 10):
                 print_d("Signalling '%s' (%d/%d songs)"
                         % (signal, i, total))
             task.update(float(i) / total)
+            start = time.time()
             app.library.emit(signal, more)
-            i += block_size
+            elapsed = time.time() - start
+            i += len(more)
+            blocks += 1
+            if elapsed < budget / 2:
+                block_size *= 2
+            elif elapsed > budget:
+                block_size = max(1, block_size // 2)
             yield
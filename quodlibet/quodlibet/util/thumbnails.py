@@ -5,9 +5,15 @@
 # it under the terms of the GNU General Public License version 2 as
 # published by the Free Software Foundation
 
+from __future__ import absolute_import
+
 import os
 import tempfile
 import hashlib
+import struct
+import threading
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
 from gi.repository import GdkPixbuf, GLib
 
@@ -70,6 +76,54 @@ def get_cache_info(path, boundary):
     return (thumb_path, thumb_size)
 
 
+class PixbufCache(object):
+    """A LRU cache of pixbufs, limited by their combined size in bytes.
+
+    Entries can have a stamp; looking them up with a different one drops
+    them. Thread-safe.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, stamp=None):
+        """Returns the pixbuf or None"""
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return
+            if entry[0] != stamp:
+                self.size -= entry[2]
+                return
+            self._entries[key] = entry
+            return entry[1]
+
+    def set(self, key, pixbuf, stamp=None):
+        size = pixbuf.get_rowstride() * pixbuf.get_height()
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= old[2]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (stamp, pixbuf, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self.size -= self._entries.popitem(last=False)[1][2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
 def get_thumbnail_from_file(fileobj, boundary):
     """Like get_thumbnail() but works with files that can't be reopened.
 
@@ -147,13 +201,28 @@ def get_thumbnail(path, boundary):
                 if meta_mtime == int(path_mtime):
                     return pb
 
+    thumb_pb = _create_thumbnail(path, path_mtime, thumb_path, thumb_size)
+    if thumb_pb is None:
+        return new_from_file_at_size(path, width, height)
+
+    return scale(thumb_pb, boundary)
+
+
+def _create_thumbnail(path, path_mtime, thumb_path, thumb_size):
+    """Saves a thumbnail for `path` to `thumb_path` and returns it, or
+    None if the image is smaller than the thumbnail would be.
+
+    Can raise GLib.GError.
+    """
+
     info, pw, ph = GdkPixbuf.Pixbuf.get_file_info(path)
 
     # Too small picture, no thumbnail needed
     if pw < thumb_size and ph < thumb_size:
-        return new_from_file_at_size(path, width, height)
+        return
 
-    thumb_pb = new_from_file_at_size(path, thumb_size, thumb_size)
+    thumb_pb = GdkPixbuf.Pixbuf.new_from_file_at_size(
+        path, thumb_size, thumb_size)
 
     uri = "file://" + pathname2url(path)
     mime = info.get_mime_types()[0]
@@ -173,4 +242,80 @@ def get_thumbnail(path, boundary):
     except OSError:
         pass
 
-    return scale(thumb_pb, boundary)
+    return thumb_pb
+
+
+def get_thumbnail_mtime(thumb_path):
+    """Returns the mtime of the source image stored in the thumbnail at
+    `thumb_path` or None, without loading the image data.
+    """
+
+    try:
+        with open(thumb_path, "rb") as h:
+            if h.read(8) != b"\x89PNG\r\n\x1a\n":
+                return
+            while True:
+                header = h.read(8)
+                if len(header) != 8:
+                    return
+                length, type_ = struct.unpack(">I4s", header)
+                # text chunks come before the image data
+                if type_ in (b"IDAT", b"IEND"):
+                    return
+                if type_ != b"tEXt":
+                    h.seek(length + 4, 1)
+                    continue
+                key, sep, value = h.read(length).partition(b"\0")
+                h.seek(4, 1)
+                if key == b"Thumb::MTime":
+                    return int(value)
+    except (EnvironmentError, ValueError, struct.error):
+        return
+
+
+def create_thumbnails(path, sizes=(ThumbSize.NORMAL, ThumbSize.LARGE)):
+    """Makes sure up to date thumbnails of the given sizes exist for the
+    image at `path`.
+
+    Returns True if any needed to be created. Thread-safe.
+    """
+
+    path_mtime = mtime(path)
+    if path_mtime == 0 or path.startswith(tempfile.gettempdir()):
+        return False
+
+    created = False
+    for size in sizes:
+        thumb_path, thumb_size = get_cache_info(path, (size, size))
+        if get_thumbnail_mtime(thumb_path) == int(path_mtime):
+            continue
+        try:
+            mkdir(os.path.dirname(thumb_path), 0700)
+            if _create_thumbnail(path, path_mtime, thumb_path, thumb_size):
+                created = True
+        except (OSError, GLib.GError):
+            pass
+    return created
+
+
+def create_thumbnails_many(paths, sizes=(ThumbSize.NORMAL, ThumbSize.LARGE),
+                           processes=None, cancellable=None):
+    """Calls create_thumbnails() for all paths using `processes` threads.
+
+    Yields (path, created) in the order they get done. Stops once the
+    Gio.Cancellable `cancellable` gets cancelled.
+    """
+
+    def create(path):
+        if cancellable and cancellable.is_cancelled():
+            return path, False
+        return path, create_thumbnails(path, sizes)
+
+    pool = ThreadPool(processes)
+    try:
+        for result in pool.imap_unordered(create, paths):
+            if cancellable and cancellable.is_cancelled():
+                return
+            yield result
+    finally:
+        pool.terminate()
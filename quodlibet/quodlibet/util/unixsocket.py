@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 as
+# published by the Free Software Foundation
+
+"""A line based request/response server on a Unix domain socket.
+
+Clients can keep a connection open and send many requests, one per line,
+without waiting for the responses. Responses get sent back in request
+order and can be created piece by piece while they are being sent.
+"""
+
+from __future__ import absolute_import
+
+import os
+import errno
+import socket
+from collections import deque
+
+from gi.repository import GLib
+
+from quodlibet import util
+from quodlibet.util.path import mkdir
+
+
+class UnixSocketError(Exception):
+    pass
+
+
+def socket_exists(path):
+    """If something accepts connections on the socket at path"""
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+    return True
+
+
+class UnixSocketClient(object):
+    """A blocking connection to a UnixSocketServer.
+
+    Raises EnvironmentError in case connecting, sending or receiving
+    fails or takes longer than `timeout` seconds.
+    """
+
+    BUFFER_SIZE = 64 * 1024
+
+    def __init__(self, path, timeout=5):
+        self._buffer = b""
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        try:
+            self._sock.connect(path)
+        except EnvironmentError:
+            self._sock.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def set_timeout(self, timeout):
+        """Seconds to wait for sending or receiving data or None to wait
+        forever"""
+
+        self._sock.settimeout(timeout)
+
+    def send(self, line):
+        """Send one request, can't contain newlines"""
+
+        assert b"\n" not in line
+        self._sock.sendall(line + b"\n")
+
+    def read_until(self, terminator):
+        """Returns all data up to the terminator, which gets skipped"""
+
+        while True:
+            index = self._buffer.find(terminator)
+            if index != -1:
+                data = self._buffer[:index]
+                self._buffer = self._buffer[index + len(terminator):]
+                return data
+            data = self._sock.recv(self.BUFFER_SIZE)
+            if not data:
+                raise EnvironmentError("connection closed")
+            self._buffer += data
+
+    def close(self):
+        self._sock.close()
+
+
+class _Connection(object):
+
+    def __init__(self, server, sock):
+        from quodlibet import qltk
+
+        self._server = server
+        self._sock = sock
+        self._input = b""
+        self._output = b""
+        self._responses = deque()
+        self._eof = False
+        self._write_id = None
+
+        sock.setblocking(False)
+        self._read_id = qltk.io_add_watch(
+            sock.fileno(), GLib.PRIORITY_DEFAULT,
+            GLib.IO_IN | GLib.IO_ERR | GLib.IO_HUP, self._read)
+
+    def close(self):
+        for id_ in (self._read_id, self._write_id):
+            if id_ is not None:
+                GLib.source_remove(id_)
+        self._read_id = self._write_id = None
+        self._responses.clear()
+        self._sock.close()
+        self._server._remove(self)
+
+    def _read(self, fd, condition):
+        if not condition & GLib.IO_IN:
+            self._read_id = None
+            self.close()
+            return False
+
+        try:
+            data = self._sock.recv(UnixSocketServer.BUFFER_SIZE)
+        except socket.error as e:
+            if e.errno in (errno.EWOULDBLOCK, errno.EAGAIN, errno.EINTR):
+                return True
+            self._read_id = None
+            self.close()
+            return False
+
+        if not data:
+            # the client is done sending, but might still wait for
+            # responses
+            self._read_id = None
+            self._eof = True
+            self._start_write()
+            return False
+
+        self._input += data
+        lines = self._input.split(b"\n")
+        self._input = lines.pop(-1)
+        if len(self._input) > UnixSocketServer.MAX_LINE:
+            print_w("Request too long, closing connection")
+            self._read_id = None
+            self.close()
+            return False
+
+        for line in lines:
+            line = line.rstrip(b"\r")
+            try:
+                response = self._server._callback(line)
+            except Exception:
+                util.print_exc()
+                response = None
+            if response is not None:
+                self._responses.append(iter(response))
+
+        self._start_write()
+        return True
+
+    def _start_write(self):
+        if self._write_id is not None:
+            return
+
+        if not self._responses and not self._output:
+            if self._eof:
+                self.close()
+            return
+
+        from quodlibet import qltk
+
+        # below redraws, so streaming large responses keeps the UI usable
+        self._write_id = qltk.io_add_watch(
+            self._sock.fileno(), GLib.PRIORITY_DEFAULT_IDLE,
+            GLib.IO_OUT | GLib.IO_ERR | GLib.IO_HUP, self._write)
+
+    def _write(self, fd, condition):
+        if not condition & GLib.IO_OUT:
+            self._write_id = None
+            self.close()
+            return False
+
+        responses = self._responses
+        output = [self._output]
+        size = len(self._output)
+        while size < UnixSocketServer.BUFFER_SIZE and responses:
+            try:
+                data = next(responses[0])
+            except StopIteration:
+                responses.popleft()
+                continue
+            except Exception:
+                util.print_exc()
+                responses.popleft()
+                continue
+            output.append(data)
+            size += len(data)
+        self._output = b"".join(output)
+
+        try:
+            sent = self._sock.send(self._output)
+        except socket.error as e:
+            if e.errno in (errno.EWOULDBLOCK, errno.EAGAIN, errno.EINTR):
+                return True
+            self._write_id = None
+            self.close()
+            return False
+        self._output = self._output[sent:]
+
+        if self._output or responses:
+            return True
+
+        self._write_id = None
+        if self._eof:
+            self.close()
+        return False
+
+
+class UnixSocketServer(object):
+    """Listens on a Unix domain socket and passes each received line
+    (without the newline) to `callback`.
+
+    The callback returns None or an iterable of byte strings, which get
+    sent back to the client as the socket gets writable.
+    """
+
+    BUFFER_SIZE = 64 * 1024
+    """Amount of data to send or receive at once"""
+
+    MAX_LINE = 1024 * 1024
+    """Maximum length of one request"""
+
+    def __init__(self, path, callback):
+        self._path = path
+        self._callback = callback
+        self._sock = None
+        self._id = None
+        self._connections = []
+
+    def start(self):
+        """Creates the socket and listens to it.
+
+        Raises UnixSocketError in case another process is already
+        listening and EnvironmentError in case creating the socket fails.
+        """
+
+        from quodlibet import qltk
+
+        mkdir(os.path.dirname(self._path))
+        if os.path.exists(self._path):
+            if socket_exists(self._path):
+                raise UnixSocketError("socket already in use")
+            # stale, left over from a crash
+            os.unlink(self._path)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(self._path)
+            os.chmod(self._path, 0o600)
+            sock.listen(5)
+        except EnvironmentError:
+            sock.close()
+            raise
+        sock.setblocking(False)
+
+        self._sock = sock
+        self._id = qltk.io_add_watch(
+            sock.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN, self._accept)
+
+    def stop(self):
+        for conn in list(self._connections):
+            conn.close()
+
+        if self._sock is None:
+            return
+
+        GLib.source_remove(self._id)
+        self._id = None
+        self._sock.close()
+        self._sock = None
+
+        try:
+            os.unlink(self._path)
+        except EnvironmentError:
+            pass
+
+    def _remove(self, conn):
+        if conn in self._connections:
+            self._connections.remove(conn)
+
+    def _accept(self, fd, condition):
+        try:
+            sock, addr = self._sock.accept()
+        except socket.error as e:
+            if e.errno not in (errno.EWOULDBLOCK, errno.EAGAIN, errno.EINTR):
+                print_w("Accepting connection failed: %s" % e)
+            return True
+
+        self._connections.append(_Connection(self, sock))
+        return True
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks, not run by default.
+
+./setup.py test --suite=bench
+"""
+
+import os
+import time
+import resource
+import multiprocessing
+
+from quodlibet.formats._audio import AudioFile
+
+
+def get_rss():
+    """The resident set size of the current process in bytes"""
+
+    try:
+        with open("/proc/self/statm", "rb") as h:
+            pages = int(h.read().split()[1])
+    except (EnvironmentError, ValueError, IndexError):
+        # peak, not current, but good enough if nothing was freed
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage * 1024
+    return pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def run_in_process(func, *args):
+    """Run func(*args) in a new process and return the result, so memory
+    measurements don't get influenced by earlier allocations."""
+
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply(func, args)
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+class Timer(object):
+    """with Timer() as t: ...; t.elapsed"""
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self.elapsed = time.time() - self._start
+
+
+def synthetic_songs(count, start=0):
+    """Returns a list of `count` AudioFiles with tags similar to a real
+    library: 12 songs per album, 5 albums per artist. `start` is the
+    index of the first song, for creating libraries in batches.
+
+    Every value is a new object, like after unpickling.
+    """
+
+    songs = []
+    for i in xrange(start, start + count):
+        album = i // 12
+        artist = album // 5
+        song = AudioFile()
+        song["~filename"] = "/music/%d/%d/%02d.ogg" % (artist, album, i % 12)
+        song["~mountpoint"] = "/mnt/%s" % "music"
+        song["title"] = u"Title %d" % i
+        song["artist"] = u"Artist %d" % artist
+        song["albumartist"] = u"Artist %d" % artist
+        song["album"] = u"Album %d" % album
+        song["genre"] = u"Genre %d" % (artist % 20)
+        song["date"] = u"%d" % (1950 + album % 60)
+        song["tracknumber"] = u"%d/12" % (i % 12 + 1)
+        song["discnumber"] = u"1"
+        song["musicbrainz_albumid"] = u"%032x" % album
+        song["~#added"] = 1400000000 + i
+        song["~#lastplayed"] = 1400000000 + i * 2
+        song["~#playcount"] = i % 7
+        song["~#rating"] = 0.25 * (i % 5)
+        song["~#bitrate"] = 128 + 64 * (i % 4)
+        song["~#length"] = 120.0 + i % 300
+        song["~#mtime"] = 1300000000.0 + i
+        song["~#filesize"] = 4000000 + i
+        songs.append(song)
+    return songs
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from tests import TestCase
+from tests.bench import Timer, synthetic_songs
+
+from quodlibet import config
+from quodlibet.library.libraries import SongLibrary
+
+
+SONGS = 180000
+KEYS = ["~#rating", "~#length", "~#playcount", "~#added"]
+
+
+class TAlbumStats(TestCase):
+
+    def setUp(self):
+        config.init()
+        self.library = SongLibrary()
+        self.library.add(synthetic_songs(SONGS))
+        self.albums = self.library.albums
+
+    def tearDown(self):
+        self.library.destroy()
+        config.quit()
+
+    def _sort(self):
+        for key in KEYS:
+            sorted(self.albums.itervalues(), key=lambda a: a(key))
+
+    def test_sort_after_changes(self):
+        self._sort()
+        songs = self.library.values()[::SONGS // 1000]
+
+        def bump():
+            for song in songs:
+                song["~#playcount"] = song("~#playcount") + 1
+                self.library.changed([song])
+                for key in KEYS:
+                    self.albums[song.album_key](key)
+
+        with Timer() as incremental:
+            bump()
+            self._sort()
+
+        # what every change cost before: all aggregates from scratch
+        for album in self.albums.itervalues():
+            album.finalize()
+        with Timer() as full:
+            self._sort()
+
+        print
+        print "%d albums: resort after %d changes %.3fs, full %.3fs" % (
+            len(self.albums), len(songs), incremental.elapsed, full.elapsed)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import sys
+
+from tests import TestCase
+from tests.bench import get_rss, run_in_process, synthetic_songs
+
+from quodlibet.library.libraries import SongInterner
+
+
+SONGS = 150000
+BATCH = 1000
+
+
+def _object_size(songs):
+    """Size of all songs, keys and values, counting shared objects once"""
+
+    seen = set()
+    size = 0
+    for song in songs:
+        size += sys.getsizeof(song)
+        for obj in song.iteritems():
+            for o in obj:
+                if id(o) not in seen:
+                    seen.add(id(o))
+                    size += sys.getsizeof(o)
+    return size
+
+
+def _songs_memory(intern):
+    before = get_rss()
+    # songs get added in batches, like during a library scan
+    interner = SongInterner()
+    songs = []
+    for i in xrange(0, SONGS, BATCH):
+        batch = synthetic_songs(BATCH, i)
+        if intern:
+            interner.intern_songs(batch)
+        songs.extend(batch)
+    return get_rss() - before, _object_size(songs)
+
+
+class TLibraryMemory(TestCase):
+
+    def test_intern(self):
+        plain_rss, plain_size = run_in_process(_songs_memory, False)
+        rss, size = run_in_process(_songs_memory, True)
+
+        mb = 1024.0 ** 2
+        print
+        print "%d songs, plain:    %6.1f MB RSS, %6.1f MB objects" % (
+            SONGS, plain_rss / mb, plain_size / mb)
+        print "%d songs, interned: %6.1f MB RSS, %6.1f MB objects" % (
+            SONGS, rss / mb, size / mb)
+
+        self.assertTrue(size < plain_size)
+        self.assertTrue(rss < plain_rss)
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from tests import TestCase
+from tests.bench import Timer, synthetic_songs
+
+from quodlibet import config
+from quodlibet.query import Query
+
+
+SONGS = 100000
+
+QUERIES = [
+    u"artist 1",
+    u"title 99 album",
+    u"artist=/^Artist 1/",
+    u"&(genre=Genre 3, #(playcount > 3))",
+    u"|(album=Album 7, #(rating = 1.0), ~dirname=/music\\/12\\//)",
+    u"!&(date=1960, artist=Artist 2)",
+]
+
+
+class TQueryCompiler(TestCase):
+
+    def setUp(self):
+        config.init()
+
+    def tearDown(self):
+        config.quit()
+
+    def test_compiled(self):
+        songs = synthetic_songs(SONGS)
+        print
+        for text in QUERIES:
+            query = Query(text)
+
+            with Timer() as interpreted:
+                expected = filter(query._match.search, songs)
+            with Timer() as compiled:
+                result = filter(query.search, songs)
+
+            print "%-60r %6.3fs -> %6.3fs (%5d songs)" % (
+                text, interpreted.elapsed, compiled.elapsed, len(result))
+            self.assertEqual(result, expected)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from tests import TestCase
+from tests.bench import Timer, synthetic_songs
+
+from quodlibet import config
+from quodlibet.library import SongLibrary
+from quodlibet.qltk.songlist import SongList
+
+
+ROWS = 100000
+ADDED = 10000
+
+
+class TSongListAdd(TestCase):
+
+    def setUp(self):
+        config.init()
+        self.songlist = SongList(SongLibrary())
+
+    def tearDown(self):
+        self.songlist.destroy()
+        config.quit()
+
+    def test_add_songs(self):
+        songs = synthetic_songs(ROWS + ADDED)
+        old, new = songs[ADDED:], songs[:ADDED]
+
+        s = self.songlist
+        s.set_column_headers(["artist", "date", "title"])
+        s.set_sort_orders([("date", True)])
+        s.set_songs(old)
+
+        with Timer() as t:
+            s.add_songs(new)
+        print
+        print "%d songs added to %d rows: %.3fs" % (ADDED, ROWS, t.elapsed)
+
+        s._sort_songs(songs)
+        self.assertEqual(s.get_songs(), songs)
@@ -60,6 +60,14 @@ class TMPDServer(PluginTestCase):
         self.assertEqual(getline("discnumber", "2/3"), "Disc: 2/3")
         self.assertEqual(getline("date", "2009-03-04"), "Date: 2009")
 
+    def test_get_music_root(self):
+        get_music_root = self.mod.main.get_music_root
+
+        self.assertEqual(get_music_root(["/a/b", "/a/c/d"]), "/a/")
+        self.assertEqual(get_music_root(["/a/b/"]), "/a/b/")
+        self.assertEqual(get_music_root(["/ab", "/ac"]), "/")
+        self.assertEqual(get_music_root([]), "/")
+
 
 @skipIf(os.name == "nt", "mpd server not supported under Windows")
 class TMPDCommands(PluginTestCase):
@@ -109,3 +117,94 @@ class TMPDCommands(PluginTestCase):
     def test_idle_close(self):
         for cmd in ["idle", "noidle", "close"]:
             self._cmd(cmd + b"\n")
+
+    def test_write_lines(self):
+        conn = self.conn
+        conn.write_line(u"a")
+        conn.write_lines(iter([u"b", u"\xf6"]))
+        conn.write_lines(u"%d" % i for i in xrange(5000))
+        conn.write_line(u"d")
+
+        data = bytearray()
+        while conn.can_write():
+            chunk = conn.handle_write()
+            self.assertTrue(len(chunk) < 8192)
+            data.extend(chunk)
+        lines = [u"a", u"b", u"\xf6"] + map(unicode, xrange(5000)) + [u"d"]
+        self.assertEqual(data.decode("utf-8"), u"\n".join(lines) + u"\n")
+
+
+@skipIf(os.name == "nt", "mpd server not supported under Windows")
+class TMPDDatabase(PluginTestCase):
+
+    def setUp(self):
+        self.mod = self.modules["mpd_server"]
+        config.init()
+        config.set("settings", "scan", "/music")
+        init_fake_app()
+
+        def AF(filename, **kwargs):
+            song = AudioFile(kwargs)
+            song["~filename"] = filename
+            song["~#length"] = 100
+            return song
+
+        app.library.add([
+            AF("/music/a/1.mp3", artist=u"Foo\nBar", album=u"A"),
+            AF("/music/a/2.mp3", artist=u"Foo", album=u"A"),
+            AF("/music/b/c/3.mp3", artist=u"Baz", album=u"B"),
+        ])
+        self.service = self.mod.main.MPDService(app)
+
+    def tearDown(self):
+        self.service.destroy()
+        destroy_fake_app()
+        config.quit()
+
+    def _uris(self, songs):
+        return [self.service.get_uri(s) for s in songs]
+
+    def test_find_search(self):
+        find = self.service.find
+        self.assertEqual(
+            self._uris(find([(u"Artist", u"Foo")])), ["a/1.mp3", "a/2.mp3"])
+        self.assertEqual(self._uris(find([(u"artist", u"fo")])), [])
+        self.assertEqual(
+            self._uris(find([(u"artist", u"BA")], exact=False)),
+            ["a/1.mp3", "b/c/3.mp3"])
+        self.assertEqual(
+            self._uris(find([(u"album", u"A"), (u"artist", u"Bar")])),
+            ["a/1.mp3"])
+        self.assertEqual(
+            self._uris(find([(u"file", u"b/c/3.mp3")])), ["b/c/3.mp3"])
+        self.assertEqual(
+            self._uris(find([(u"base", u"b")])), ["b/c/3.mp3"])
+        self.assertRaises(
+            self.mod.main.MPDRequestError, find, [(u"foo", u"x")])
+
+    def test_list_count(self):
+        self.assertEqual(self.service.list(u"artist"), ["Bar", "Baz", "Foo"])
+        self.assertEqual(
+            self.service.list(u"Album", [(u"artist", u"Baz")]), ["B"])
+        self.assertEqual(self.service.count([(u"album", u"A")]), (2, 200))
+
+    def test_changed(self):
+        song = app.library.values()[0]
+        self.service.list(u"artist")
+        song["artist"] = u"New"
+        app.library.changed([song])
+        self.assertTrue(u"New" in self.service.list(u"artist"))
+
+    def test_lsinfo(self):
+        self.assertEqual(self.service.lsinfo(), (["a", "b"], []))
+        dirs, songs = self.service.lsinfo(u"a")
+        self.assertEqual(dirs, [])
+        self.assertEqual(self._uris(songs), ["a/1.mp3", "a/2.mp3"])
+        self.assertRaises(
+            self.mod.main.MPDRequestError, self.service.lsinfo, u"x")
+
+    def test_listall(self):
+        listing = [(d, self._uris(s)) for d, s in self.service.listall()]
+        self.assertEqual(listing, [
+            (None, []), ("a", ["a/1.mp3", "a/2.mp3"]), ("b", []),
+            ("b/c", ["b/c/3.mp3"])])
@@ -1,10 +1,25 @@
 # -*- coding: utf-8 -*-
-from tests import TestCase
+import os
+import shutil
+import threading
+import BaseHTTPServer
+import SocketServer
 
-from quodlibet.browsers.audiofeeds import AudioFeeds
+from tests import TestCase, mkdtemp, skipUnless
+from helper import capture_output
+
+from gi.repository import GLib
+
+from quodlibet.browsers.audiofeeds import AudioFeeds, Feed, FeedStore, \
+    FeedRefresher
 from quodlibet.library import SongLibrary
 import quodlibet.config
 
+try:
+    import feedparser
+except ImportError:
+    feedparser = None
+
 
 class TAudioFeeds(TestCase):
     def setUp(self):
@@ -20,3 +35,168 @@ class TAudioFeeds(TestCase):
         self.bar.destroy()
         self.library.destroy()
         quodlibet.config.quit()
+
+
+class TFeedStore(TestCase):
+
+    def setUp(self):
+        self.dir = mkdtemp()
+        self.path = os.path.join(self.dir, "feeds")
+        self.store = FeedStore(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_empty(self):
+        self.assertTrue(self.store.load() is None)
+        self.store.save_index([])
+        self.assertEqual(self.store.load(), [])
+
+    def test_save_load(self):
+        feeds = [Feed("http://foo/%d" % i) for i in xrange(3)]
+        feeds[1].name = "Bar"
+        feeds[1].etag = "etag"
+        self.store.save_index(feeds)
+
+        loaded = FeedStore(self.path).load()
+        self.assertEqual([f.uri for f in loaded], [f.uri for f in feeds])
+        self.assertEqual(loaded[1].name, "Bar")
+        self.assertEqual(loaded[1].etag, "etag")
+
+    def test_save_feed(self):
+        feeds = [Feed("http://foo/%d" % i) for i in xrange(3)]
+        self.store.save_index(feeds)
+        records = [os.path.join(self.path, n) for n in os.listdir(self.path)]
+        for filename in records:
+            os.utime(filename, (0, 0))
+
+        feeds[0].name = "Foo"
+        self.store.save_feed(feeds[0])
+        changed = [f for f in records if os.path.getmtime(f) != 0]
+        self.assertEqual(len(changed), 1)
+        self.assertEqual(self.store.load()[0].name, "Foo")
+
+    def test_remove(self):
+        feeds = [Feed("http://foo/%d" % i) for i in xrange(3)]
+        self.store.save_index(feeds)
+        self.store.save_index(feeds[1:])
+        self.assertEqual(len(os.listdir(self.path)), 3)
+        self.assertEqual([f.uri for f in self.store.load()],
+                         ["http://foo/1", "http://foo/2"])
+
+    def test_broken_record(self):
+        feed = Feed("http://foo")
+        self.store.save_index([feed])
+        with open(self.store._filename(feed.uri), "wb") as h:
+            h.write("garbage")
+        with capture_output():
+            loaded = self.store.load()
+        self.assertEqual([f.uri for f in loaded], ["http://foo"])
+
+
+FEED = """\
+<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0">
+<channel>
+<title>Podcast %(id)d</title>
+<item>
+<title>Episode</title>
+<enclosure url="http://foo/%(id)d.mp3" length="42" type="audio/mpeg"/>
+</item>
+</channel>
+</rss>
+"""
+
+
+class FeedHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(
+                (self.path, self.headers.get("If-None-Match")))
+            server.active += 1
+            server.max_active = max(server.active, server.max_active)
+
+        try:
+            etag = '"%s"' % self.path
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+
+            data = FEED % {"id": int(self.path.strip("/"))}
+            self.send_response(200)
+            self.send_header("Content-Type", "application/rss+xml")
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadedServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+
+
+@skipUnless(feedparser, "feedparser missing")
+class TFeedRefresher(TestCase):
+
+    def setUp(self):
+        self.server = ThreadedServer(("127.0.0.1", 0), FeedHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.active = 0
+        self.server.max_active = 0
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        host, port = self.server.server_address
+        self.feeds = [Feed("http://%s:%d/%d" % (host, port, i))
+                      for i in xrange(20)]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _refresh(self):
+        results = []
+        done = []
+        refresher = FeedRefresher(
+            self.feeds, lambda *args: results.append(args),
+            lambda: done.append(True))
+        refresher.start()
+        context = GLib.MainContext.default()
+        while not done:
+            context.iteration(True)
+        return results
+
+    def test_refresh(self):
+        results = self._refresh()
+        self.assertEqual(len(results), len(self.feeds))
+        self.assertTrue(all(changed for feed, changed in results))
+        for i, feed in enumerate(self.feeds):
+            self.assertEqual(feed.name, "Podcast %d" % i)
+            self.assertEqual(feed[0]("~uri"), "http://foo/%d.mp3" % i)
+            self.assertEqual(feed.etag, '"/%d"' % i)
+        self.assertTrue(
+            self.server.max_active <= FeedRefresher.MAX_THREADS)
+
+    def test_not_modified(self):
+        self._refresh()
+        del self.server.requests[:]
+        results = self._refresh()
+        self.assertFalse(any(changed for feed, changed in results))
+        self.assertTrue(all(etag for path, etag in self.server.requests))
+        self.assertEqual(len(self.feeds[0]), 1)
+        self.assertTrue(self.feeds[0].get_age() < 60)
+
+    def test_empty(self):
+        self.feeds = []
+        self.assertEqual(self._refresh(), [])
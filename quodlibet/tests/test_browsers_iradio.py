@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
-from tests import TestCase
+import os
+
+from tests import TestCase, mkstemp
 
 from quodlibet.library import SongLibrary
 from quodlibet.formats._audio import AudioFile
-from quodlibet.browsers.iradio import InternetRadio, IRFile, QuestionBar
+from quodlibet.browsers.iradio import InternetRadio, IRFile, QuestionBar, \
+    TaglistParser, parse_taglist, StationCache, GenreFilter, GenreIndex
 import quodlibet.config
 
 quodlibet.config.RATINGS = quodlibet.config.HardCodedRatingsPrefs()
@@ -91,3 +94,121 @@ class TIRFile(TestCase):
         new.from_dump(dump)
         self.assertTrue("title" not in new)
         self.assertTrue("artist" not in new)
+
+
+TAGLIST = """\
+uri=http://foo.bar/1
+title=Foo
+genre=Rock
+bitrate=128000
+~listenerpeak=42
+uri=http://foo.bar/2
+title=Bar
+genre=Jazz
+audio-codec=MPEG-1 Layer 3 (MP3)
+uri=http://foo.bar/3
+title=Baz
+genre=none"""
+
+
+class TTaglistParser(TestCase):
+
+    def test_parse(self):
+        stations = parse_taglist(TAGLIST)
+        self.assertEqual(len(stations), 3)
+        foo, bar, baz = stations
+        self.assertEqual(foo("~uri"), "http://foo.bar/1")
+        self.assertEqual(foo("title"), "Foo")
+        self.assertEqual(foo("~#bitrate"), 128)
+        self.assertEqual(foo("~#listenerpeak"), 42)
+        self.assertEqual(bar("audio-codec"), "MP3")
+        self.assertFalse("genre" in baz)
+
+    def test_chunks(self):
+        parser = TaglistParser()
+        entries = []
+        for i in xrange(0, len(TAGLIST), 5):
+            entries.extend(parser.feed(TAGLIST[i:i + 5]))
+        entries.extend(parser.close())
+
+        parser = TaglistParser()
+        self.assertEqual(entries, parser.feed(TAGLIST) + parser.close())
+        self.assertEqual([e[0] for e in entries],
+                         ["http://foo.bar/%d" % i for i in [1, 2, 3]])
+
+    def test_incremental(self):
+        parser = TaglistParser()
+        self.assertEqual(parser.feed("uri=http://foo.bar/1\ntitle=Fo"), [])
+        entries = parser.feed("o\nuri=http://foo.bar/2\n")
+        self.assertEqual(entries, [("http://foo.bar/1", {"title": u"Foo"})])
+        self.assertEqual(parser.close(), [("http://foo.bar/2", {})])
+
+    def test_garbage(self):
+        self.assertEqual(parse_taglist("title=foo\n\nbar\n"), [])
+
+
+class TStationCache(TestCase):
+
+    def setUp(self):
+        fd, self.filename = mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test_save_load(self):
+        parser = TaglistParser()
+        entries = parser.feed(TAGLIST) + parser.close()
+        stamp = {"If-None-Match": "foo"}
+        StationCache(self.filename).save(stamp, entries)
+        self.assertEqual(StationCache(self.filename).load(), (stamp, entries))
+
+    def test_missing(self):
+        os.remove(self.filename)
+        self.assertEqual(StationCache(self.filename).load(), ({}, []))
+
+    def test_version(self):
+        cache = StationCache(self.filename)
+        cache.save({}, [("http://foo.bar", {})])
+        cache.VERSION = -1
+        self.assertEqual(cache.load(), ({}, []))
+
+
+class TGenreIndex(TestCase):
+
+    def setUp(self):
+        self.library = SongLibrary()
+        self.library.add(parse_taglist(TAGLIST))
+        self.index = GenreIndex(self.library, GenreFilter())
+
+    def tearDown(self):
+        self.index.destroy()
+        self.library.destroy()
+
+    def _titles(self, stations):
+        return sorted(s("title") for s in stations)
+
+    def test_stations(self):
+        self.assertEqual(self._titles(self.index.stations("rock")), ["Foo"])
+        self.assertEqual(self._titles(self.index.stations("jazz")), ["Bar"])
+        self.assertEqual(self._titles(self.index.uncategorized()), ["Baz"])
+        self.assertFalse(self.index.stations("metal"))
+
+    def test_genres(self):
+        foo = self.library["http://foo.bar/1"]
+        self.assertEqual(self.index.genres(foo), ["rock"])
+
+    def test_update(self):
+        self.index.stations("rock")
+        foo, bar = self.library["http://foo.bar/1"], \
+            self.library["http://foo.bar/2"]
+        bar["genre"] = u"rock"
+        self.library.changed([bar])
+        self.assertEqual(self._titles(self.index.stations("rock")),
+                         ["Bar", "Foo"])
+        self.library.remove([foo])
+        self.assertEqual(self._titles(self.index.stations("rock")), ["Bar"])
+        new = parse_taglist("uri=http://foo.bar/4\ngenre=Hard Rock")
+        self.library.add(new)
+        self.assertTrue(new[0] in self.index.stations("rock"))
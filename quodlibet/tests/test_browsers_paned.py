@@ -499,6 +499,48 @@ class TPaneModel(TestCase):
             m.remove_songs([song], True)
             self._verify_model(m)
 
+    def test_remove_songs_changed(self):
+        conf = PaneConfig("artist")
+        m = PaneModel(conf)
+        m.add_songs(SONGS)
+        song = AudioFile(SONGS[0])
+        m.add_songs([song])
+        length = len(m)
+
+        # the row stays until something gets removed for real
+        m.remove_songs([song], False)
+        song["artist"] = "zzz"
+        m.add_songs([song])
+        self._verify_model(m)
+        self.assertEqual(len(m), length + 1)
+        self.assertEqual(m.get_entry("zzz").songs, set([song]))
+
+        m.remove_songs([SONGS[0]], True)
+        self._verify_model(m)
+        self.assertEqual(len(m), length)
+        self.assertEqual(m.get_entry("boris"), None)
+        self.assertEqual(m[-2][0].key, "zzz")
+
+    def test_add_songs_sorted(self):
+        conf = PaneConfig("artist")
+        m = PaneModel(conf)
+        m.add_songs(SONGS)
+        for name in ["a", "n", "zz"]:
+            m.add_songs([AudioFile({"artist": name})])
+            self._verify_model(m)
+        keys = [e.key for e in m.itervalues()][1:-1]
+        self.assertEqual(keys, ["a", "boris", "mu", "n", "piman", "zz"])
+        self.assertEqual(m.get_entry("").songs, set([SONGS[-1]]))
+
+    def test_filter_songs(self):
+        conf = PaneConfig("artist")
+        m = PaneModel(conf)
+        m.add_songs(SONGS)
+        self.assertEqual(m.filter_songs([], SONGS), set(SONGS))
+        self.assertEqual(m.filter_songs([0], SONGS[:2]), set(SONGS[:2]))
+        self.assertEqual(m.filter_songs([1], SONGS), set([SONGS[0]]))
+        self.assertEqual(m.filter_songs([1, 2], SONGS[1:]), set([SONGS[1]]))
+
     def test_matches(self):
         conf = PaneConfig("artist")
         m = PaneModel(conf)
@@ -7,7 +7,7 @@ from gi.repository import Gtk
 from quodlibet import config
 from quodlibet import app
 
-from quodlibet.commands import registry
+from quodlibet.commands import registry, CommandRegistry, CommandError
 
 
 class TCommands(TestCase):
@@ -69,3 +69,50 @@ class TCommands(TestCase):
         self.__send("status")
         self.__send("toggle-window")
         self.__send("unqueue /dev/null")
+
+    def test_print_query(self):
+        self.assertEqual(registry.run(app, "print-query", "nope"), "\n")
+        self.assertEqual(
+            list(registry.run_iter(app, "print-query", "nope")), ["\n"])
+
+
+class TCommandRegistry(TestCase):
+
+    def setUp(self):
+        self.registry = CommandRegistry()
+        self.calls = []
+
+        @self.registry.register("stream", optional=1)
+        def stream(app, count="3"):
+            self.calls.append(count)
+            for i in xrange(int(count)):
+                yield "%d\n" % i
+            if not int(count):
+                raise CommandError("nothing")
+
+        @self.registry.register("plain")
+        def plain(app):
+            return "plain"
+
+    def test_run(self):
+        self.assertEqual(self.registry.run(None, "stream"), "0\n1\n2\n")
+        self.assertEqual(self.registry.run(None, "plain"), "plain")
+        self.assertRaises(CommandError, self.registry.run, None, "stream", "0")
+        self.assertRaises(CommandError, self.registry.run, None, "nope")
+
+    def test_run_iter(self):
+        result = self.registry.run_iter(None, "stream")
+        # runs right away
+        self.assertEqual(self.calls, ["3"])
+        self.assertEqual(list(result), ["0\n", "1\n", "2\n"])
+        self.assertEqual(list(self.registry.run_iter(None, "plain")),
+                         ["plain"])
+        self.assertRaises(
+            CommandError, self.registry.run_iter, None, "stream", "0")
+
+    def test_handle_line_iter(self):
+        result = self.registry.handle_line_iter(None, "stream 2")
+        self.assertEqual(list(result), ["0\n", "1\n"])
+        with capture_output():
+            self.assertEqual(
+                list(self.registry.handle_line_iter(None, "nope")), [])
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from tests import TestCase
+
+from quodlibet.library.libraries import Library
+from quodlibet.library.ids import IDRegistry
+
+
+class Item(object):
+
+    def __init__(self, key):
+        self.key = key
+
+
+class TIDRegistry(TestCase):
+
+    def setUp(self):
+        self.library = Library()
+        self.items = [Item(i) for i in xrange(10)]
+        self.library.add(self.items[:5])
+        self.registry = IDRegistry.get(self.library)
+
+    def tearDown(self):
+        self.registry.destroy()
+        self.library.destroy()
+
+    def test_get(self):
+        self.assertTrue(IDRegistry.get(self.library) is self.registry)
+        self.registry.destroy()
+        self.assertFalse(IDRegistry.get(self.library) is self.registry)
+
+    def test_lookup(self):
+        self.assertEqual(len(self.registry), 5)
+        for item in self.items[:5]:
+            item_id = self.registry.get_id(item)
+            self.assertTrue(isinstance(item_id, str))
+            self.assertTrue(self.registry.get_item(item_id) is item)
+            self.assertTrue(item in self.registry)
+        self.assertTrue(self.registry.get_item("foo") is None)
+        self.assertFalse(self.items[5] in self.registry)
+
+    def test_get_items(self):
+        ids = map(self.registry.get_id, reversed(self.items))
+        self.assertEqual(self.registry.get_items(ids),
+                         list(reversed(self.items[:5])))
+
+    def test_signals(self):
+        self.library.add(self.items[5:])
+        self.library.remove(self.items[:2])
+        self.assertEqual(len(self.registry), 8)
+        ids = map(self.registry.get_id, self.items)
+        self.assertEqual(self.registry.get_items(ids), self.items[2:])
+        self.assertTrue(self.registry.get_item(ids[0]) is None)
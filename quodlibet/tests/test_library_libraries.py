@@ -7,7 +7,7 @@ from quodlibet import config
 from quodlibet.util import connect_obj
 from quodlibet.formats._audio import AudioFile
 
-from tests import TestCase, DATA_DIR, mkstemp
+from tests import TestCase, DATA_DIR, mkstemp, mkdtemp
 from helper import capture_output
 
 from quodlibet.library.libraries import *
@@ -270,6 +270,112 @@ class TPicklingMixin(TestCase):
             os.unlink(filename)
 
 
+class TJournalingLibrary(TestCase):
+    Library = JournalingLibrary
+
+    def setUp(self):
+        fd, self.filename = mkstemp()
+        os.close(fd)
+        os.unlink(self.filename)
+        self.library = self.Library()
+        self.library.load(self.filename)
+
+    def tearDown(self):
+        self.library.destroy()
+        for filename in [self.filename, self.library.journal_filename]:
+            if os.path.exists(filename):
+                os.unlink(filename)
+
+    def _loaded_items(self):
+        library = self.Library()
+        library.load(self.filename)
+        items = sorted(library.items())
+        library.destroy()
+        return items
+
+    def test_save_load(self):
+        self.library.add(Frange(30))
+        self.library.save()
+        self.failIf(self.library.dirty)
+        self.assertEqual(self._loaded_items(), sorted(self.library.items()))
+
+    def test_append_to_journal(self):
+        self.library.add(Frange(30))
+        self.library.save()
+        snapshot = os.stat(self.filename)
+
+        self.library.add(Frange(30, 35))
+        self.library.remove(Frange(3))
+        self.library.save()
+
+        self.assertEqual(os.stat(self.filename).st_mtime, snapshot.st_mtime)
+        self.assertTrue(os.path.getsize(self.library.journal_filename))
+        self.assertEqual(self._loaded_items(), sorted(self.library.items()))
+
+    def test_rename(self):
+        items = Frange(10)
+        self.library.add(items)
+        self.library.save()
+
+        item = items[3]
+        del self.library._contents[item.key]
+        item.key = 100
+        self.library._contents[item.key] = item
+        self.library._changed(set([item]))
+        self.library.save()
+
+        keys = [k for k, v in self._loaded_items()]
+        self.assertTrue(100 in keys)
+        self.assertFalse(3 in keys)
+        self.assertEqual(len(keys), 10)
+
+    def test_compact(self):
+        self.library.add(Frange(10))
+        self.library.save()
+        self.library.compact_ratio = 0
+        self.library.remove(Frange(5))
+        self.library.save()
+        self.assertEqual(
+            sorted(load_items(self.filename)), sorted(self.library.values()))
+        self.assertEqual(read_journal(self.library.journal_filename,
+            (os.path.getsize(self.filename),
+             os.path.getmtime(self.filename))), [])
+
+    def test_stale_journal(self):
+        self.library.add(Frange(10))
+        self.library.save()
+        self.library.remove(Frange(5))
+        self.library.save()
+        # snapshot replaced by something not knowing about the journal
+        os.unlink(self.filename)
+        dump_items(self.filename, Frange(3))
+        self.assertEqual(
+            [v for k, v in self._loaded_items()], Frange(3))
+
+    def test_journal_removed(self):
+        self.library.add(Frange(10))
+        self.library.save()
+        self.library.remove(Frange(5))
+        self.library.save()
+        os.unlink(self.library.journal_filename)
+        self.library.add(Frange(10, 12))
+        self.library.save()
+        self.assertTrue(os.path.exists(self.library.journal_filename))
+        self.assertEqual(self._loaded_items(), sorted(self.library.items()))
+
+    def test_migrate_pickled(self):
+        self.library.destroy()
+        dump_items(self.filename, Frange(10))
+        snapshot = os.stat(self.filename)
+        self.library = self.Library()
+        self.library.load(self.filename)
+        self.library.add(Frange(10, 12))
+        self.library.save()
+        self.assertEqual(os.stat(self.filename).st_mtime, snapshot.st_mtime)
+        self.assertEqual(
+            [v for k, v in self._loaded_items()], Frange(12))
+
+
 class TSongLibrary(TLibrary):
     Fake = FakeSong
     Frange = staticmethod(FSrange)
@@ -311,6 +417,144 @@ class TSongLibrary(TLibrary):
         self.failIf(self.changed or self.added or self.removed)
 
 
+class TSongInterner(TestCase):
+
+    def test_intern(self):
+        songs = [AlbumSong(i, album=u"Album") for i in range(3)]
+        for song in songs:
+            song["~#rating"] = 0.5
+        SongInterner().intern_songs(songs)
+        a, b, c = songs
+        self.assertTrue(a["album"] is b["album"] is c["album"])
+        self.assertTrue(a["~#rating"] is b["~#rating"])
+        self.assertFalse(a["title"] is b["title"])
+        self.assertEqual(a["title"], "Song 1")
+
+    def test_keep_types(self):
+        a, b = AlbumSong(1), AlbumSong(2)
+        a["foo"] = u"1"
+        b["foo"] = "1"
+        SongInterner().intern_songs([a, b])
+        self.assertTrue(isinstance(a["foo"], unicode))
+        self.assertTrue(isinstance(b["foo"], str))
+
+    def test_library(self):
+        library = SongLibrary()
+        library.interner = SongInterner()
+        songs = [AlbumSong(i, album=u"Album") for i in range(3)]
+        library.add(songs)
+        self.assertEqual(len(library), 3)
+        self.assertTrue(songs[0]["album"] is songs[1]["album"])
+        library.destroy()
+
+
+class TSongSorter(TestCase):
+
+    ORDERS = [[("", False)], [("", True)], [("albumsort", False)],
+              [("artistsort", True)], [("date", False)], [("~#added", True)]]
+
+    def setUp(self):
+        config.init()
+        self.library = SongLibrary()
+        songs = [AlbumSong(i) for i in range(20)]
+        for i, song in enumerate(songs):
+            song["artist"] = u"Artist %d" % (i % 4)
+            song["date"] = u"%d" % (2000 + i % 5)
+            song["~#added"] = i % 3
+        self.library.add(songs)
+        self.sorter = SongSorter(self.library)
+        self.sorter.MIN_FRACTION = 0
+
+    def tearDown(self):
+        self.sorter.destroy()
+        self.library.destroy()
+        config.quit()
+
+    def _expected(self, songs, orders):
+        tag, reverse = orders[0]
+        songs = sorted(songs, key=lambda s: s.sort_key, reverse=reverse)
+        if tag:
+            songs.sort(key=AudioFile.sort_by_func(tag), reverse=reverse)
+        return songs
+
+    def _check(self, songs=None):
+        if songs is None:
+            songs = self.library.values()
+        for orders in self.ORDERS:
+            result = list(songs)
+            self.assertTrue(self.sorter.sort(result, orders))
+            self.assertEqual(result, self._expected(songs, orders))
+
+    def test_sort(self):
+        self._check()
+        self._check(self.library.values()[::3])
+
+    def test_not_supported(self):
+        songs = self.library.values()
+        self.assertFalse(self.sorter.sort(songs, []))
+        self.assertFalse(self.sorter.sort(songs, [("title", False)]))
+        self.assertFalse(
+            self.sorter.sort(songs, [("date", False), ("", False)]))
+        self.assertFalse(self.sorter.sort(songs + [AlbumSong(42)],
+                                          [("date", False)]))
+        self.sorter.MIN_FRACTION = 0.5
+        self.assertFalse(self.sorter.sort(songs[:5], [("date", False)]))
+
+    def test_update(self):
+        self._check()
+        self.library.add([AlbumSong(i) for i in range(20, 25)])
+        self._check()
+        songs = self.library.values()[:5]
+        for song in songs:
+            song["date"] = u"1990"
+            song["album"] = u"Other"
+        self.library.changed(songs)
+        self._check()
+        self.library.remove(songs)
+        self._check()
+
+    def test_save_load(self):
+        fd, filename = mkstemp()
+        os.close(fd)
+        try:
+            self.library.filename = filename
+            self.library.save()
+            self._check()
+            self.sorter.save(filename + ".sort")
+
+            library = SongLibrary()
+            library.load(filename)
+            sorter = SongSorter(library)
+            sorter.load(filename + ".sort")
+            song = library.values()[0]
+            self.assertTrue("sort_key" in song.__dict__)
+            self.assertEqual(
+                song.sort_key, self.library[song.key].sort_key)
+            self.assertFalse(sorter.dirty)
+            sorter.destroy()
+
+            # the library changed, don't use the saved keys
+            self.library.remove(self.library.values()[:1])
+            self.library.save(filename + ".other")
+            shutil.move(filename + ".other", filename)
+            library = SongLibrary()
+            library.load(filename)
+            sorter = SongSorter(library)
+            sorter.load(filename + ".sort")
+            self.assertFalse("sort_key" in library.values()[0].__dict__)
+            self.assertTrue(sorter.dirty)
+            sorter.destroy()
+        finally:
+            for name in [filename, filename + ".sort"]:
+                if os.path.exists(name):
+                    os.remove(name)
+
+    def test_library_enable(self):
+        self.library.enable_sorter()
+        self.assertTrue(self.library.sorter)
+        self.library.save_sorter()
+
+
 class TFileLibrary(TLibrary):
     Fake = FakeSongFile
     Library = FileLibrary
@@ -493,6 +737,261 @@ class TSongFileLibrary(TSongLibrary):
         config.quit()
 
 
+class TDirectoryIndex(TestCase):
+
+    def setUp(self):
+        self.dir = mkdtemp()
+        os.mkdir(os.path.join(self.dir, "sub"))
+        for name in ["a", os.path.join("sub", "b")]:
+            open(os.path.join(self.dir, name), "wb").close()
+        self.index = DirectoryIndex()
+        # make fresh mtimes count as reliable
+        self.index.RACY = -1
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _files(self):
+        found = []
+        for path, dirnames, filenames in self.index.walk(self.dir):
+            found.extend(os.path.join(path, f) for f in filenames)
+        return sorted(os.path.relpath(f, self.dir) for f in found)
+
+    def _touch_dir(self, path, offset):
+        mtime = os.path.getmtime(path) + offset
+        os.utime(path, (mtime, mtime))
+
+    def test_walk(self):
+        self.assertEqual(self._files(), ["a", os.path.join("sub", "b")])
+        # not committed, so list again
+        self.assertEqual(len(self._files()), 2)
+        self.index.commit(self.dir)
+        self.assertEqual(self._files(), [])
+        self.assertFalse(self.index.changed(self.dir))
+        walked = list(self.index.walk(self.dir, skip_unchanged=False))
+        self.assertEqual(walked[0][2], ["a"])
+
+    def test_changed(self):
+        self._files()
+        self.index.commit(self.dir)
+        sub = os.path.join(self.dir, "sub")
+        open(os.path.join(sub, "c"), "wb").close()
+        self._touch_dir(sub, 10)
+        self.assertTrue(self.index.changed(sub))
+        self.assertFalse(self.index.changed(self.dir))
+        self.assertEqual(self._files(), [os.path.join("sub", "b"),
+                                         os.path.join("sub", "c")])
+
+    def test_racy(self):
+        self.index.RACY = 2.0
+        self._files()
+        self.index.commit(self.dir)
+        self.assertTrue(self.index.changed(self.dir))
+        self._touch_dir(self.dir, -10)
+        self._touch_dir(os.path.join(self.dir, "sub"), -10)
+        self._files()
+        self.index.commit(self.dir)
+        self.assertFalse(self.index.changed(self.dir))
+
+    def test_failed(self):
+        self._files()
+        sub = os.path.join(self.dir, "sub")
+        self.index.commit(self.dir, [sub])
+        self.assertFalse(self.index.changed(self.dir))
+        self.assertTrue(self.index.changed(sub))
+        self.assertEqual(self._files(), [os.path.join("sub", "b")])
+
+    def test_removed_dir(self):
+        self._files()
+        self.index.commit(self.dir)
+        self.assertEqual(len(self.index), 2)
+        shutil.rmtree(os.path.join(self.dir, "sub"))
+        self._touch_dir(self.dir, 10)
+        self.assertEqual(self._files(), ["a"])
+        self.index.commit(self.dir)
+        self.assertEqual(len(self.index), 1)
+
+    def test_save_load(self):
+        self._files()
+        self.index.commit(self.dir)
+        fd, filename = mkstemp()
+        os.close(fd)
+        try:
+            self.index.save(filename)
+            index = DirectoryIndex()
+            index.RACY = -1
+            index.load(filename, None)
+            self.assertFalse(index.changed(self.dir))
+            index.load(filename, "other")
+            self.assertFalse(len(index))
+        finally:
+            os.unlink(filename)
+
+
+def _upper_many(filenames):
+    return [f.upper() if f else None for f in filenames]
+
+
+class TItemLoader(TestCase):
+
+    def _get_all(self, loader):
+        loader.flush()
+        result = []
+        while len(loader):
+            result.extend(loader.get(0.1))
+        return result
+
+    def test_serial(self):
+        loader = SerialItemLoader(lambda f: f.upper())
+        loader.put("a")
+        self.assertEqual(len(loader), 1)
+        self.assertEqual(self._get_all(loader), [("a", "A")])
+        loader.close()
+
+    def test_parallel(self):
+        loader = ParallelItemLoader(_upper_many, processes=2)
+        try:
+            names = ["a%d" % i for i in range(50)] + [""]
+            for name in names:
+                loader.put(name)
+            result = self._get_all(loader)
+            self.assertEqual(
+                result, [(n, n.upper() or None) for n in names])
+            self.assertFalse(len(loader))
+        finally:
+            loader.close()
+
+
+class TSongFileLibraryScan(TestCase):
+
+    def setUp(self):
+        config.init()
+        self.library = SongFileLibrary()
+        self.dir = mkdtemp()
+        for i in range(20):
+            shutil.copy(os.path.join(DATA_DIR, 'empty.flac'),
+                        os.path.join(self.dir, "%02d.flac" % i))
+
+    def tearDown(self):
+        self.library.destroy()
+        shutil.rmtree(self.dir)
+        config.quit()
+
+    def test_scan(self):
+        for x in self.library.scan([self.dir]):
+            pass
+        self.assertEqual(len(self.library), 20)
+        self.assertEqual(
+            sorted(s("~basename") for s in self.library),
+            ["%02d.flac" % i for i in range(20)])
+
+    def test_scan_serial(self):
+        self.library.load_many = None
+        for x in self.library.scan([self.dir]):
+            pass
+        self.assertEqual(len(self.library), 20)
+
+    def test_rescan_unchanged(self):
+        for x in self.library.scan([self.dir]):
+            pass
+        self.library._dir_index.RACY = -1
+        for x in self.library.scan([self.dir], quick=True):
+            pass
+        self.library.remove(self.library.values())
+        for x in self.library.scan([self.dir], quick=True):
+            pass
+        # nothing changed, nothing to find
+        self.assertEqual(len(self.library), 0)
+        for x in self.library.rebuild([self.dir], force=True, quick=True):
+            pass
+        self.assertEqual(len(self.library), 20)
+
+    def test_rescan_removed(self):
+        for x in self.library.scan([self.dir]):
+            pass
+        self.library._dir_index.RACY = -1
+        self.library.remove(self.library.values()[:5])
+        self.assertEqual(len(self.library), 15)
+        for x in self.library.scan([self.dir]):
+            pass
+        self.assertEqual(len(self.library), 20)
+        self.library.remove(self.library.values()[:5])
+        for x in self.library.rebuild([self.dir]):
+            pass
+        self.assertEqual(len(self.library), 20)
+
+    def test_rescan_failed(self):
+        broken = os.path.join(self.dir, "broken.flac")
+        with open(broken, "wb") as h:
+            h.write("not a flac file")
+        with capture_output():
+            for x in self.library.scan([self.dir]):
+                pass
+        self.assertEqual(len(self.library), 20)
+
+        # finished copying, doesn't change the directory
+        self.library._dir_index.RACY = -1
+        shutil.copy(os.path.join(DATA_DIR, 'empty.flac'), broken)
+        for x in self.library.scan([self.dir], quick=True):
+            pass
+        self.assertEqual(len(self.library), 21)
+
+    def test_dir_index_saved_with_library(self):
+        filename = os.path.join(mkdtemp(), "songs")
+        try:
+            self.library.load(filename)
+            for x in self.library.scan([self.dir]):
+                pass
+            self.assertFalse(os.path.exists(filename + ".dirs"))
+            self.library.save()
+            self.assertTrue(os.path.exists(filename + ".dirs"))
+
+            library = SongFileLibrary()
+            library.load(filename)
+            self.assertTrue(len(library._get_dir_index([])))
+            library.destroy()
+
+            # new songs got lost, so the index is useless
+            os.remove(filename)
+            library = SongFileLibrary()
+            library.load(filename)
+            self.assertFalse(len(library._get_dir_index([])))
+            for x in library.scan([self.dir]):
+                pass
+            self.assertEqual(len(library), 20)
+            library.destroy()
+        finally:
+            shutil.rmtree(os.path.dirname(filename))
+
+    def test_rebuild_quick(self):
+        for x in self.library.scan([self.dir]):
+            pass
+        self.library._dir_index.RACY = -1
+        for x in self.library.scan([self.dir]):
+            pass
+        song = self.library.values()[0]
+        song["~#mtime"] = 0
+        for x in self.library.rebuild([], quick=True):
+            pass
+        self.assertEqual(song["~#mtime"], 0)
+        for x in self.library.rebuild([]):
+            pass
+        self.assertNotEqual(song["~#mtime"], 0)
+
+    def test_rebuild_force(self):
+        for x in self.library.scan([self.dir]):
+            pass
+        song = self.library.values()[0]
+        song["~#playcount"] = 3
+        song["title"] = u"foo"
+        for x in self.library.rebuild([], force=True):
+            pass
+        self.assertTrue(song in self.library)
+        self.assertEqual(song("~#playcount"), 3)
+        self.assertFalse("title" in song)
+        self.assertEqual(len(self.library), 20)
+
+
 class TAlbumLibrary(TestCase):
     Fake = FakeSong
     Frange = staticmethod(ASrange)
@@ -581,6 +1080,33 @@ class TAlbumLibrary(TestCase):
         # It shouldn't implement FileLibrary etc
         self.failIf(getattr(self.library, "filename", None))
 
+    def test_changed_aggregates(self):
+        song = self.underlying.get("file_1.mp3")
+        album = self.library[song.album_key]
+        self.failUnlessEqual(album("~#playcount"), 0)
+        song["~#playcount"] = 3
+        self.underlying.changed([song])
+        self.failUnlessEqual(album("~#playcount"), 3)
+        self.failUnlessEqual(album("~#playcount:max"), 3)
+
+    def test_changed_album_key(self):
+        song = self.underlying.get("file_1.mp3")
+        old = self.library[song.album_key]
+        song["album"] = song["labelid"] = "Album 2"
+        self.underlying.changed([song])
+        self.failUnlessEqual(len(old.songs), 3)
+        new = self.library[song.album_key]
+        self.failUnless(song in new.songs)
+        self.failUnlessEqual(len(new.songs), 5)
+        self.failUnlessEqual(new("~#tracks"), 5)
+
+        # moving the last song removes the album
+        for song in list(old.songs):
+            song["album"] = song["labelid"] = "Album 2"
+        self.underlying.changed(list(old.songs))
+        self.failIf(old.key in self.library)
+        self.failUnlessEqual(len(new.songs), 8)
+
 
 class TAlbumLibrarySignals(TestCase):
     def setUp(self):
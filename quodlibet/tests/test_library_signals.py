@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from tests import TestCase
+
+from quodlibet.library.libraries import Library
+from quodlibet.library.signals import SignalBus
+
+
+class TSignalBus(TestCase):
+
+    def setUp(self):
+        self.library = Library()
+        self.bus = SignalBus.get(self.library)
+        self.calls = []
+        self.sub = self.bus.subscribe(self._callback, 100)
+
+    def tearDown(self):
+        self.bus.destroy()
+
+    def _callback(self, added, changed, removed):
+        self.calls.append((added, changed, removed))
+
+    def test_get(self):
+        self.assertTrue(SignalBus.get(self.library) is self.bus)
+        self.bus.destroy()
+        self.assertFalse(SignalBus.get(self.library) is self.bus)
+
+    def test_merge(self):
+        self.library.emit("added", [1, 2, 3])
+        self.library.emit("changed", [1, 4, 5])
+        self.library.emit("removed", [2, 4])
+        self.library.emit("changed", [4, 6])
+        self.library.emit("removed", [7])
+        self.library.emit("added", [7, 3])
+        self.assertTrue(self.sub.pending)
+        self.assertFalse(self.calls)
+
+        self.bus.flush()
+        self.assertFalse(self.sub.pending)
+        self.assertEqual(self.calls, [([1, 3], [5, 6, 7], [4])])
+
+        self.bus.flush()
+        self.assertEqual(len(self.calls), 1)
+
+    def test_added_again(self):
+        self.library.emit("added", [1])
+        self.library.emit("removed", [1])
+        self.library.emit("added", [1])
+        self.sub.flush()
+        self.assertEqual(self.calls, [([1], [], [])])
+
+    def test_nothing_left(self):
+        self.library.emit("added", [1])
+        self.library.emit("removed", [1])
+        self.sub.flush()
+        self.assertFalse(self.calls)
+
+    def test_counters(self):
+        other = []
+        self.bus.subscribe(lambda *args: other.append(args), 0)
+        for i in range(10):
+            self.library.emit("changed", [i])
+        self.bus.flush()
+        self.assertEqual(self.bus.received, 20)
+        self.assertEqual(self.bus.emitted, 2)
+        self.assertEqual(other, [([], range(10), [])])
+
+    def test_args(self):
+        result = []
+        self.bus.subscribe(lambda *args: result.append(args), 0, "foo")
+        self.library.emit("removed", [1])
+        self.bus.flush()
+        self.assertEqual(result, [([], [], [1], "foo")])
+
+    def test_cancel(self):
+        self.library.emit("changed", [1])
+        self.sub.cancel()
+        self.assertFalse(self.sub.pending)
+        self.bus.flush()
+        self.library.emit("changed", [1])
+        self.bus.flush()
+        self.assertFalse(self.calls)
+        self.assertEqual(self.bus.received, 1)
+
+    def test_timeout(self):
+        self.sub.cancel()
+        sub = self.bus.subscribe(self._callback, 0)
+        self.library.emit("changed", [1])
+        sub._timeout()
+        self.assertEqual(self.calls, [([], [1], [])])
@@ -9,7 +9,7 @@ import os
 import sys
 import shutil
 
-from tests import TestCase, DATA_DIR, mkstemp
+from tests import TestCase, DATA_DIR, mkstemp, mkdtemp
 from helper import capture_output
 
 from quodlibet import config
@@ -611,6 +611,53 @@ class TOperonImageClear(TOperonBase):
         self.assertEqual(len(images), 0)
 
 
+class TOperonImageThumbnails(TOperonBase):
+    # [--dry-run] [-j <jobs>] <file> [<files>]
+
+    def setUp(self):
+        super(TOperonImageThumbnails, self).setUp()
+        from gi.repository import GdkPixbuf
+
+        self.dir = mkdtemp()
+        self.song = os.path.join(self.dir, "song.ogg")
+        shutil.copy(self.f, self.song)
+        self.image = os.path.join(self.dir, "cover.png")
+        pb = GdkPixbuf.Pixbuf.new(GdkPixbuf.Colorspace.RGB, True, 8, 150, 150)
+        pb.savev(self.image, "png", [], [])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        super(TOperonImageThumbnails, self).tearDown()
+
+    def test_misc(self):
+        self.check_true(["image-thumbnails", "-h"], True, False)
+        self.check_true(["image-thumbnails", self.f], False, False)
+        self.check_false(["image-thumbnails"], False, True)
+        self.check_false(["image-thumbnails", "-j", "0", self.f],
+                         False, True)
+
+    def test_create(self):
+        from quodlibet.util import thumbnails
+
+        path = thumbnails.get_cache_info(self.image, (128, 128))[0]
+        if os.path.exists(path):
+            os.unlink(path)
+
+        out, err = self.check_true(
+            ["image-thumbnails", "--dry-run", self.song], False, True)
+        self.assertTrue("cover.png" in err)
+        self.assertFalse(os.path.exists(path))
+
+        self.check_true(
+            ["image-thumbnails", "-j", "2", self.song, self.song],
+            False, False)
+        self.assertTrue(os.path.exists(path))
+
+        out, err = self.check_true(
+            ["-v", "image-thumbnails", self.song], False, True)
+        self.assertFalse("Created" in err)
+
+
 class TOperonFill(TOperonBase):
     # [--dry-run] <pattern> <file> [<files>]
 
@@ -5,6 +5,8 @@ import shutil
 
 from gi.repository import Gtk
 from gi.repository import GdkPixbuf
+from gi.repository import GLib
+from gi.repository import Gio
 
 from tests import TestCase, mkdtemp, mkstemp, DATA_DIR
 
@@ -14,7 +16,8 @@ from quodlibet.formats.mp3 import MP3File
 from quodlibet.formats._audio import AudioFile
 from quodlibet.formats._image import EmbeddedImage
 from quodlibet.plugins.cover import CoverSourcePlugin
-from quodlibet.util.cover.manager import CoverPluginHandler, CoverManager
+from quodlibet.util.cover.manager import CoverPluginHandler, CoverManager, \
+    CoverCache
 from quodlibet.util.path import path_equal
 
 DUMMY_COVER = io.StringIO()
@@ -60,6 +63,29 @@ class DummyCoverSource3(CoverSourcePlugin):
         DummyCoverSource3.fetch_call = True
         return self.emit('fetch-success', DUMMY_COVER)
 
+
+class DummyCoverSource4(CoverSourcePlugin):
+    @staticmethod
+    def priority():
+        return 0.2
+
+    def fetch_cover(self):
+        DummyCoverSource4.fetch_call = True
+        self.cancellable.connect(
+            lambda c: setattr(DummyCoverSource4, "cancelled", True))
+        # succeeds later
+        GLib.idle_add(self.emit, 'fetch-success', DUMMY_COVER)
+
+
+class DummyCoverSource5(CoverSourcePlugin):
+    @staticmethod
+    def priority():
+        return 0.2
+
+    def fetch_cover(self):
+        DummyCoverSource5.fetch_call = True
+        return self.emit('fetch-failure', "nothing")
+
 dummy_sources = [Plugin(s) for s in
     [DummyCoverSource1, DummyCoverSource2, DummyCoverSource3]
 ]
@@ -188,6 +214,39 @@ class TCoverManager(TestCase):
         self.assertFalse(dummy_sources[1].cls.fetch_call)
         self.assertTrue(dummy_sources[2].cls.fetch_call)
 
+    def test_acquire_cover_same_priority(self):
+        # sources with the same priority get asked at once, the first
+        # success wins and cancels the others
+        manager = CoverManager(use_built_in=False)
+        handler = manager.plugin_handler
+        sources = [Plugin(DummyCoverSource4), Plugin(DummyCoverSource5)]
+        for source in sources:
+            handler.plugin_handle(source)
+            handler.plugin_enable(source)
+            source.cls.fetch_call = False
+        DummyCoverSource4.cancelled = False
+
+        result = []
+        manager.acquire_cover(
+            lambda *args: result.append(args), None, None)
+        self.assertFalse(result)
+        self.assertTrue(DummyCoverSource4.fetch_call)
+        self.assertTrue(DummyCoverSource5.fetch_call)
+        self.runLoop()
+        self.assertEqual(result, [(True, DUMMY_COVER)])
+        self.assertTrue(DummyCoverSource4.cancelled)
+
+        # cancelled from outside, no callback
+        del result[:]
+        DummyCoverSource4.cancelled = False
+        cancellable = Gio.Cancellable()
+        manager.acquire_cover(
+            lambda *args: result.append(args), cancellable, None)
+        cancellable.cancel()
+        self.assertTrue(DummyCoverSource4.cancelled)
+        self.runLoop()
+        self.assertFalse(result)
+
     def runLoop(self):
         while Gtk.events_pending():
             Gtk.main_iteration()
@@ -243,6 +302,77 @@ class TCoverManagerBuiltin(TestCase):
 
         self.assertEqual(called_with, [self.manager, [obj]])
 
+    def test_cache(self):
+        shutil.move(self.file1, self.dir1)
+        self.file1 = os.path.join(self.dir1, os.path.basename(self.file1))
+        song = MP3File(self.file1)
+        key, stamp = self.manager._get_cache_key([song])
+
+        self.assertIs(self.manager.get_cover_many([song]), None)
+        self.assertEqual(self.manager._cache.lookup(key, stamp), (True, None))
+
+        # adding an image invalidates the negative entry
+        dest = os.path.join(self.dir1, "cover.png")
+        shutil.move(self.cover1, dest)
+        self.cover1 = dest
+        key, stamp = self.manager._get_cache_key([song])
+        self.assertEqual(self.manager._cache.lookup(key, stamp), (False, None))
+        self.assertTrue(
+            path_equal(self.manager.get_cover_many([song]).name, dest))
+        found, path = self.manager._cache.lookup(key, stamp)
+        self.assertTrue(found)
+        self.assertTrue(path_equal(path, dest))
+        self.assertTrue(
+            path_equal(self.manager.get_cover_many([song]).name, dest))
+
+        self.manager.cover_changed([song])
+        self.assertEqual(self.manager._cache.lookup(key, stamp), (False, None))
+
+    def test_pixbuf_cache(self):
+        dest = os.path.join(self.dir1, "cover.png")
+        shutil.move(self.cover1, dest)
+        self.cover1 = dest
+        shutil.move(self.file1, self.dir1)
+        self.file1 = os.path.join(self.dir1, os.path.basename(self.file1))
+        song = MP3File(self.file1)
+
+        pb = self.manager.get_pixbuf_many([song], 5, 5)
+        self.assertEqual(pb.get_width(), 5)
+        self.assertTrue(self.manager.get_pixbuf_many([song], 5, 5) is pb)
+        self.assertTrue(self.manager.get_pixbuf_many([song], 4, 4) is not pb)
+
+        result = []
+        self.manager.get_pixbuf_many_async(
+            [song], 5, 5, Gio.Cancellable(), result.append)
+        self.assertEqual(result, [pb])
+
+        self.manager.cover_changed([song])
+        self.assertTrue(self.manager.get_pixbuf_many([song], 5, 5) is not pb)
+
+        with open(dest, "rb") as h:
+            pb = self.manager.get_thumbnail_from_file(h, (5, 5))
+            self.assertTrue(
+                self.manager.get_thumbnail_from_file(h, (5, 5)) is pb)
+
+    def test_cache_persistent(self):
+        filename = os.path.join(self.main, "cache")
+        cache = CoverCache(filename)
+        cache.store(("a", "b"), (1, 2), "path")
+        cache.store(("c",), (3,), None)
+        cache.save()
+
+        cache = CoverCache(filename)
+        self.assertEqual(cache.lookup(("a", "b"), (1, 2)), (True, "path"))
+        self.assertEqual(cache.lookup(("c",), (3,)), (True, None))
+        self.assertEqual(cache.lookup(("c",), (4,)), (False, None))
+        self.assertEqual(cache.lookup(("c",), (3,)), (False, None))
+        self.assertEqual(cache.lookup(("d",), (3,)), (False, None))
+
+        with open(filename, "wb") as h:
+            h.write("garbage")
+        self.assertEqual(CoverCache(filename).lookup(("a", "b"), (1, 2)),
+                         (False, None))
+
     def test_get_primary_image(self):
         self.assertFalse(MP3File(self.file1).has_images)
         self.assertFalse(MP3File(self.file1).has_images)
@@ -63,6 +63,8 @@ class TEditDialogs(TestCase):
 
     def test_write_failed(self):
         WriteFailedError(None, DUMMY_SONG).destroy()
+        WriteFailedError(None, [DUMMY_SONG]).destroy()
+        WriteFailedError(None, [DUMMY_SONG, DUMMY_SONG]).destroy()
 
 
 class TFilterPluginBox(TestCase):
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from tests import TestCase
 
-from quodlibet.qltk.playorder import PlayOrder
+from quodlibet.qltk.playorder import PlayOrder, _WeightTree
 import quodlibet.config
 import quodlibet.plugins
 
@@ -68,3 +68,30 @@ class TPlayOrder(TestCase):
         self.po.set_shuffle(True)
         self.assertTrue(self.po.get_shuffle())
         self.assertEqual(self.po.get_active_name(), "weighted")
+
+
+class TWeightTree(TestCase):
+
+    def test_find(self):
+        tree = _WeightTree([1, 0, 2, 0.5])
+        self.assertEqual(len(tree), 4)
+        self.assertEqual(tree.total, 3.5)
+        self.assertEqual(tree.find(0.5), 0)
+        self.assertEqual(tree.find(1), 0)
+        self.assertEqual(tree.find(1.1), 2)
+        self.assertEqual(tree.find(3), 2)
+        self.assertEqual(tree.find(3.2), 3)
+        self.assertEqual(tree.find(10), 3)
+
+    def test_set(self):
+        tree = _WeightTree([1, 0, 2, 0.5])
+        tree[1] = 4
+        self.assertEqual(tree[1], 4)
+        self.assertEqual(tree.total, 7.5)
+        self.assertEqual(tree.find(1.1), 1)
+        self.assertEqual(tree.find(5.5), 2)
+
+    def test_empty(self):
+        tree = _WeightTree([])
+        self.assertEqual(len(tree), 0)
+        self.assertEqual(tree.total, 0)
@@ -165,6 +165,27 @@ class TSongList(TestCase):
 
         self.assertEqual(self.songlist.get_songs(), [song] * 4)
 
+    def test_add_songs_sorted(self):
+        songs = [AudioFile({"~filename": fsnative(u"/dev/%d" % i),
+                            "artist": u"Artist %d" % (i % 3),
+                            "album": u"Album %d" % (i % 4),
+                            "~#rating": (i % 5) / 4.0})
+                 for i in range(30)]
+
+        s = self.songlist
+        s.set_column_headers(["artist", "album", "~#rating"])
+        for orders in [[("artist", False)], [("album", True)],
+                       [("~#rating", True), ("artist", False)],
+                       [("artist", True), ("album", False)]]:
+            s.set_sort_orders(orders)
+            expected = list(songs)
+            s._sort_songs(expected)
+
+            s.set_songs(songs[::2])
+            s.add_songs(songs[1::4])
+            s.add_songs(songs[3::4])
+            self.assertEqual(s.get_songs(), expected)
+
     def test_header_menu(self):
         from quodlibet import browsers
         from quodlibet.library import SongLibrary, SongLibrarian
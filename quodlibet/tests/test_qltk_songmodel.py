@@ -140,6 +140,42 @@ class TPlaylistModel(TestCase):
         self.assert_(songs.count(r2) > songs.count(r1))
         self.assert_(songs.count(r3) > songs.count(r2))
 
+    def test_shuffle_previous_set(self):
+        self.pl.order = ORDERS[1](self.pl)
+        self.pl.next()
+        first = self.pl.current
+        self.pl.next()
+        self.pl.previous()
+        self.assertEqual(self.pl.current, first)
+        self.pl.go_to(self.pl.find(9), explicit=True)
+        numbers = [self.pl.current for i in range(9)
+                   if self.pl.next() or True]
+        self.assertEqual(sorted(numbers + [9]), range(10))
+        self.pl.next()
+        self.assertEqual(self.pl.current, None)
+
+    def test_shuffle_reset(self):
+        self.pl.order = ORDERS[1](self.pl)
+        self.pl.next()
+        self.pl.set(range(20, 25))
+        numbers = [self.pl.current for i in range(5)
+                   if self.pl.next() or True]
+        self.assertEqual(sorted(numbers), range(20, 25))
+
+    def test_weighted_rating_changed(self):
+        self.pl.order = ORDERS[2](self.pl)
+        r0 = AudioFile({'~#rating': 0})
+        r1 = AudioFile({'~#rating': 1})
+        self.pl.set([r0, r1])
+        songs = [self.pl.current for i in range(10)
+                 if self.pl.next() or True]
+        self.assertEqual(songs, [r1] * 10)
+        r0["~#rating"] = 1
+        r1["~#rating"] = 0
+        songs = [self.pl.current for i in range(10)
+                 if self.pl.next() or True]
+        self.assertEqual(songs[1:], [r0] * 9)
+
     def test_shuffle_repeat(self):
         self.pl.order = ORDERS[1](self.pl)
         self.pl.repeat = True
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+import threading
+
+from tests import TestCase
+from helper import capture_output
+
+from gi.repository import Gtk
+
+from quodlibet.formats._audio import AudioFile
+from quodlibet.qltk import tagwriter
+from quodlibet.qltk.tagwriter import TagWriter, is_pending
+
+
+WRITTEN = []
+
+
+class WriteSong(AudioFile):
+
+    block = None
+
+    def write(self):
+        if self.block is not None:
+            self.block.wait()
+        if self("title") == "fail":
+            raise IOError
+        WRITTEN.append(dict(self))
+        self["~#mtime"] = 42
+
+
+class Library(object):
+
+    def __init__(self):
+        self.changed_songs = set()
+        self.reloaded = []
+
+    def changed(self, songs):
+        self.changed_songs.update(songs)
+
+    def reload(self, song, changed=None):
+        self.reloaded.append(song)
+
+
+class Dialog(object):
+
+    def __init__(self, parent, songs):
+        Dialog.songs = songs
+
+    def run(self):
+        pass
+
+
+class TTagWriter(TestCase):
+
+    def setUp(self):
+        self.library = Library()
+        self.writer = TagWriter(self.library)
+        self.done = []
+        self.writer.connect_done(self.done.append)
+        self._dialog = tagwriter.WriteFailedError
+        tagwriter.WriteFailedError = Dialog
+        Dialog.songs = None
+
+    def tearDown(self):
+        tagwriter.WriteFailedError = self._dialog
+        WriteSong.block = None
+        del WRITTEN[:]
+
+    def _wait(self):
+        while not self.writer.done or not self.done:
+            Gtk.main_iteration()
+
+    def _song(self, title, filename=None):
+        song = WriteSong({
+            "title": title, "~filename": filename or "/dev/" + title})
+        song["~#mtime"] = 1
+        return song
+
+    def test_write(self):
+        songs = [self._song(str(i)) for i in range(10)]
+        for song in songs:
+            self.writer.add(song)
+            song["title"] = "changed"
+        self._wait()
+
+        self.assertEqual(self.done, [self.writer])
+        self.assertEqual(
+            sorted(s["title"] for s in WRITTEN), sorted(map(str, range(10))))
+        self.assertEqual(self.library.changed_songs, set(songs))
+        self.assertEqual(set(self.writer.written), set(songs))
+        self.assertFalse(self.writer.failed)
+        for song in songs:
+            self.assertEqual(song("~#mtime"), 42)
+            self.assertEqual(song("title"), "changed")
+
+    def test_failed(self):
+        good, bad = self._song("good"), self._song("fail")
+        self.writer.add(good)
+        self.writer.add(bad)
+        with capture_output():
+            self._wait()
+
+        self.assertEqual(self.writer.written, [good])
+        self.assertEqual(self.writer.failed, [bad])
+        self.assertEqual(self.library.reloaded, [bad])
+        self.assertEqual(self.library.changed_songs, set([good]))
+        self.assertEqual(Dialog.songs, [bad])
+
+    def test_cancel(self):
+        WriteSong.block = threading.Event()
+        # the same file, so they get written one after another
+        songs = [self._song(str(i), "/dev/null") for i in range(3)]
+        for song in songs:
+            self.writer.add(song)
+        self.writer.cancel()
+        WriteSong.block.set()
+        self._wait()
+
+        self.assertTrue(len(self.writer.written) <= 1)
+        self.assertEqual(
+            len(self.writer.written) + len(self.library.reloaded), 3)
+        self.assertFalse(self.writer.failed)
+        self.assertTrue(Dialog.songs is None)
+
+    def test_pending(self):
+        WriteSong.block = threading.Event()
+        song = self._song("foo")
+        self.writer.add(song)
+        self.writer.add(song)
+        self.assertTrue(is_pending(song))
+        WriteSong.block.set()
+        self._wait()
+        self.assertFalse(is_pending(song))
+
+    def test_flush(self):
+        WriteSong.block = threading.Event()
+        songs = [self._song(str(i)) for i in range(10)]
+        for song in songs:
+            self.writer.add(song)
+        threading.Timer(0.1, WriteSong.block.set).start()
+        tagwriter.flush()
+
+        self.assertTrue(self.writer.done)
+        self.assertEqual(self.done, [self.writer])
+        self.assertEqual(len(WRITTEN), 10)
+        self.assertEqual(self.library.changed_songs, set(songs))
+        for song in songs:
+            self.assertEqual(song("~#mtime"), 42)
+            self.assertFalse(is_pending(song))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import re
+
+from tests import TestCase
+
+from quodlibet import config
+from quodlibet.formats._audio import AudioFile
+from quodlibet.query import Query
+from quodlibet.query._compiler import QueryCompiler
+from quodlibet.query import _match as match
+
+
+class TQueryCompiler(TestCase):
+
+    QUERIES = [
+        u"", u"foo", u"foo bar", u"artist=foo", u"a=/^f/", u"!artist=foo",
+        u"#(playcount > 2)", u"#(playcount = 3)", u"#(rating < 0.5)",
+        u"|(artist=foo, title=baz)", u"&(artist=foo, #(playcount > 0))",
+        u"&(artist=foo, !title=bar)", u"filename=/\\.mp3$/",
+        u"~dirname=/sub/", u"album=''", u"artist, title=bar",
+        u"artist=|(foo, quux)", u"artist=&(foo, !quux)", u"~people=foo",
+        u"#(2 < playcount < 5)", u"filename=b.ogg", u"&()", u"|()",
+    ]
+
+    def setUp(self):
+        config.init()
+        self.songs = [
+            AudioFile({"~filename": "/dir/a.mp3", "artist": u"foo",
+                       "title": u"bar", "~#playcount": 3}),
+            AudioFile({"~filename": "/dir/sub/b.ogg",
+                       "artist": u"Foo\nquux", "title": u"baz",
+                       "album": u"x", "~#rating": 0.2, "~#playcount": 1}),
+            AudioFile({"~filename": "/dir/c.mp3", "artist": u"other",
+                       "title": u"foo bar", "~title": u"quux"}),
+            AudioFile({"~filename": "/dir/sub/d.mp3", "album": u"foo",
+                       "~#playcount": 5}),
+        ]
+
+    def tearDown(self):
+        config.quit()
+
+    def test_same_result(self):
+        for text in self.QUERIES:
+            query = Query(text, star=["artist", "title"])
+            func = QueryCompiler(query._match).compile()
+            for song in self.songs:
+                self.assertEqual(
+                    func(song), query._match.search(song),
+                    msg="%r %r" % (text, song.key))
+
+    def test_query_search(self):
+        query = Query(u"artist=foo")
+        self.assertTrue(query.search(self.songs[0]) is True)
+        self.assertTrue(query.search(self.songs[2]) is False)
+        self.assertEqual(query.filter(self.songs), self.songs[:2])
+        self.assertEqual(
+            query.filter(iter(self.songs)), query.filter(self.songs))
+
+    def test_inter_order(self):
+        # the cheaper and more selective numeric comparison goes first
+        inter = match.Inter([match.Tag(["~people"], re.compile("foo")),
+                             match.Numcmp("playcount", "=", "3")])
+        self.assertTrue(
+            isinstance(inter._order()[0], match.Numcmp))
+
+        union = match.Union(list(reversed(inter.res)))
+        self.assertTrue(isinstance(union._order()[-1], match.Numcmp))
+
+    def test_estimate(self):
+        for text in self.QUERIES:
+            cost, prob = Query(text)._estimate()
+            self.assertTrue(cost >= 0)
+            self.assertTrue(0 <= prob <= 1)
+
+    def test_deeply_nested(self):
+        text = u"&(%s)" % u", ".join([u"artist=foo"] * 200)
+        query = Query(text)
+        self.assertTrue(query.search(self.songs[0]))
+        self.assertFalse(query.search(self.songs[2]))
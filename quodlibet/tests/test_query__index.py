@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+import shutil
+
+from tests import TestCase, mkdtemp
+
+from quodlibet import config
+from quodlibet.formats._audio import AudioFile
+from quodlibet.library.libraries import SongLibrary
+from quodlibet.query import Query, QueryIndex
+from quodlibet.util.collection import Playlist
+
+
+def AF(filename, **kwargs):
+    song = AudioFile(kwargs)
+    song["~filename"] = filename
+    return song
+
+
+class TQueryIndex(TestCase):
+
+    QUERIES = [
+        u"", u"foo", u"artist=foo", u"a=/^f/", u"!artist=foo",
+        u"#(playcount > 2)", u"#(playcount <= 2)", u"#(playcount = 3)",
+        u"#(playcount != 3)", u"#(rating < 0.5)", u"!#(playcount > 2)",
+        u"|(artist=foo, title=baz)", u"&(artist=foo, #(playcount > 0))",
+        u"&(artist=foo, !title=bar)", u"filename=/\\.mp3$/",
+        u"~dirname=/sub/", u"album=''", u"#(length > 10)",
+        u"artist, title=bar", u"&(title=foo, #(playcount < 2))",
+    ]
+
+    def setUp(self):
+        config.init()
+        self.library = SongLibrary()
+        self.songs = [
+            AF("/dir/a.mp3", artist=u"foo", title=u"bar",
+               **{"~#playcount": 3}),
+            AF("/dir/sub/b.ogg", artist=u"Foo\nquux", title=u"baz",
+               album=u"x", **{"~#rating": 0.2, "~#playcount": 1}),
+            AF("/dir/c.mp3", artist=u"other", title=u"foo bar"),
+            AF("/dir/sub/d.mp3", album=u"foo", **{"~#playcount": 5}),
+        ]
+        self.library.add(self.songs)
+        self.index = QueryIndex(self.library)
+
+    def tearDown(self):
+        self.index.destroy()
+        self.library.destroy()
+        config.quit()
+
+    def _check(self):
+        for text in self.QUERIES:
+            query = Query(text, star=["artist", "title"])
+            expected = query.filter(self.library.values())
+            result = self.index.filter(query)
+            self.assertEqual(
+                sorted(result), sorted(expected), msg=repr(text))
+
+    def test_filter(self):
+        self._check()
+
+    def test_filter_songs(self):
+        query = Query(u"artist=foo")
+        songs = self.songs[1:]
+        self.assertEqual(
+            sorted(self.index.filter(query, songs)),
+            sorted(query.filter(songs)))
+
+    def test_added(self):
+        self._check()
+        self.library.add([AF("/dir/e.mp3", artist=u"foo",
+                             **{"~#playcount": 3})])
+        self._check()
+
+    def test_changed(self):
+        self._check()
+        song = self.songs[0]
+        song["artist"] = u"new"
+        song["~#playcount"] = 0
+        self.library.changed([song])
+        self._check()
+
+    def test_removed(self):
+        self._check()
+        self.library.remove(self.songs[:2])
+        self._check()
+
+    def test_max_tags(self):
+        self.index.MAX_TAGS = 2
+        self._check()
+        self.assertEqual(len(self.index), 2)
+
+    def test_not_numeric(self):
+        self.songs[0]["~#playcount"] = u"foo"
+        self.assertEqual(
+            self.index.numeric("~#playcount", None, 0), (None, False))
+
+    def test_playlists(self):
+        temp = mkdtemp()
+        try:
+            playlist = Playlist(temp, "foo", self.library)
+            query = Query(u"~playlists=foo")
+            self.assertEqual(self.index.filter(query), [])
+            playlist.append(self.songs[0])
+            self.assertEqual(self.index.filter(query), [self.songs[0]])
+            playlist.delete()
+        finally:
+            shutil.rmtree(temp)
+
+    def test_default_rating(self):
+        query = Query(u"#(rating > 0.6)")
+        self.assertEqual(self.index.filter(query), [])
+        config.RATINGS.default = 0.8
+        self.assertEqual(
+            sorted(self.index.filter(query)),
+            sorted(query.filter(self.library.values())))
+        self.assertEqual(len(self.index.filter(query)), 3)
+
+    def test_not_indexable(self):
+        self.assertRaises(ValueError, self.index.values, "~playlists")
+        self.assertRaises(ValueError, self.index.values, "~title~~lyrics")
+        self.index.values("~artist~title")
+
+
+class TSongLibraryQueryIndex(TestCase):
+
+    def setUp(self):
+        self.library = SongLibrary()
+        self.library.add([AF("/a", artist=u"foo"), AF("/b", artist=u"bar")])
+
+    def tearDown(self):
+        self.library.destroy()
+
+    def test_query(self):
+        self.assertEqual(len(self.library.query(u"foo")), 1)
+        self.library.enable_query_index()
+        self.assertTrue(self.library.query_index is not None)
+        self.assertEqual(len(self.library.query(u"foo")), 1)
+        self.assertEqual(len(self.library.query(Query(u"!foo"))), 1)
+        self.assertEqual(len(self.library.query(u"")), 2)
@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
-from tests import TestCase
+import os
+import json
+import shutil
+import socket
+import threading
+
+from tests import TestCase, mkdtemp
 from helper import temp_filename
 
-from quodlibet.remote import QuodLibetUnixRemote
+from quodlibet import remote
+from quodlibet.remote import QuodLibetUnixRemote, RemoteError
 
 
 class Mock(object):
@@ -14,6 +21,14 @@ class Mock(object):
         self.lines.append(line)
         return self.resp
 
+    def handle_line_iter(self, app, line):
+        resp = self.handle_line(app, line)
+        if resp is not None:
+            yield resp
+
+    def run_iter(self, app, name, *args):
+        return self.handle_line_iter(app, " ".join((name,) + args))
+
 
 class TUnixRemote(TestCase):
 
@@ -32,3 +47,95 @@ class TUnixRemote(TestCase):
             self.assertEqual(mock.lines, [b"foo"])
             with open(fn, "rb") as h:
                 self.assertEqual(h.read(), b"resp")
+
+    def test_socket_text(self):
+        mock = Mock(resp=b"resp")
+        remote = QuodLibetUnixRemote(None, mock)
+        self.assertEqual(
+            list(remote._socket_callback(b"foo bar")), [b"resp", b"\x00"])
+        self.assertEqual(mock.lines, [b"foo bar"])
+
+    def test_socket_json(self):
+        mock = Mock(resp=b"resp")
+        remote = QuodLibetUnixRemote(None, mock)
+        request = {"id": 3, "command": u"foo", "args": [u"b\xe4r"]}
+        lines = list(remote._socket_callback(json.dumps(request)))
+        self.assertEqual(mock.lines, [u"foo b\xe4r".encode("utf-8")])
+        self.assertEqual([json.loads(l) for l in lines], [
+            {"id": 3, "output": u"resp"},
+            {"id": 3, "done": True, "error": None},
+        ])
+
+    def test_socket_json_error(self):
+        remote = QuodLibetUnixRemote(None, Mock())
+        lines = list(remote._socket_callback(b"{nope"))
+        self.assertEqual(len(lines), 1)
+        response = json.loads(lines[0])
+        self.assertTrue(response["done"])
+        self.assertTrue(response["error"])
+
+
+class TUnixRemoteSend(TestCase):
+
+    def setUp(self):
+        self.dir = mkdtemp()
+        self.fifo_messages = []
+
+        class Remote(QuodLibetUnixRemote):
+            _SOCKET_PATH = os.path.join(self.dir, "control.socket")
+            _READ_TIMEOUT = 5
+
+        self.remote = Remote
+        self._write_fifo = remote.fifo.write_fifo
+
+        def write_fifo(path, message):
+            self.fifo_messages.append(message)
+            return b"fifo"
+        remote.fifo.write_fifo = write_fifo
+
+    def tearDown(self):
+        remote.fifo.write_fifo = self._write_fifo
+        shutil.rmtree(self.dir)
+
+    def _serve(self, response):
+        """Accepts one connection, reads one line and sends the response
+        or closes the connection if it is None"""
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.remote._SOCKET_PATH)
+        sock.listen(1)
+        lines = []
+
+        def serve():
+            conn, addr = sock.accept()
+            data = b""
+            while b"\n" not in data:
+                data += conn.recv(1024)
+            lines.append(data)
+            if response is not None:
+                conn.sendall(response)
+            conn.close()
+            sock.close()
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        return thread, lines
+
+    def test_no_socket(self):
+        self.assertEqual(self.remote.send_message(b"foo"), b"fifo")
+        self.assertEqual(self.fifo_messages, [b"foo"])
+
+    def test_socket(self):
+        thread, lines = self._serve(b"resp\x00")
+        self.assertEqual(self.remote.send_message(b"foo"), b"resp")
+        thread.join()
+        self.assertEqual(lines, [b"foo\n"])
+        self.assertFalse(self.fifo_messages)
+
+    def test_no_response(self):
+        thread, lines = self._serve(None)
+        self.assertRaises(RemoteError, self.remote.send_message, b"next")
+        thread.join()
+        self.assertEqual(lines, [b"next\n"])
+        # sent already, so not again through the fifo
+        self.assertFalse(self.fifo_messages)
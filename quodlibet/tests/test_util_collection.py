@@ -234,6 +234,52 @@ class TAlbum(TestCase):
         for p in INTERN_NUM_DEFAULT:
             failUnlessEq(album(p, "x"), song(p, "x"))
 
+    def test_stats_update(s):
+        songs = [Fakesong({"~#length": 4, "~#rating": 0.5}),
+                 Fakesong({"~#length": 7, "~#rating": 0.25})]
+        album = Album(songs[0])
+        album.add_songs(songs[:1])
+        s.failUnlessEqual(album("~#length"), 4)
+        s.failUnlessEqual(album("~#rating:avg"), 0.5)
+
+        album.add_songs(songs[1:])
+        s.failUnlessEqual(album("~#length"), 11)
+        s.failUnlessEqual(album("~#length:max"), 7)
+        s.failUnlessEqual(album("~#rating:avg"), 0.375)
+
+        songs[1]["~#length"] = 2
+        album.songs_changed(songs[1:])
+        s.failUnlessEqual(album("~#length"), 6)
+        s.failUnlessEqual(album("~#length:max"), 4)
+        s.failUnlessEqual(album("~#length:min"), 2)
+
+        album.remove_songs(songs[:1])
+        s.failUnlessEqual(album("~#length"), 2)
+        s.failUnlessEqual(album("~#length:max"), 2)
+        s.failUnlessEqual(album("~#rating:avg"), 0.25)
+        album.remove_songs(songs[1:])
+        s.failUnlessEqual(album("~#length", "x"), "x")
+
+    def test_stats_match_recompute(s):
+        songs = [Fakesong({"~#rating": r / 10.0, "~#playcount": r})
+                 for r in xrange(10)]
+        album = Album(songs[0])
+        album.add_songs(songs)
+        keys = ["~#rating", "~#rating:avg", "~#rating:min", "~#playcount",
+                "~#playcount:max", "~#playcount:avg"]
+        for key in keys:
+            album(key)
+        for i, song in enumerate(songs):
+            song["~#rating"] = ((i * 7) % 10) / 10.0
+            song["~#playcount"] += i
+            album.songs_changed([song])
+        album.remove_songs(songs[:3])
+
+        fresh = Album(songs[0])
+        fresh.songs = set(songs[3:])
+        for key in keys:
+            s.failUnlessAlmostEqual(album(key), fresh(key))
+
     def test_methods(s):
         songs = [
             Fakesong({"b": "bb4\nbb1\nbb1", "c": "cc1\ncc3\ncc3"}),
@@ -419,6 +465,31 @@ class TPlaylist(TestCase):
         pl = Playlist(self.temp, "playlist", lib)
         self.assertEqual(len(pl), len(NUMERIC_SONGS))
 
+    def test_read_lazy(self):
+        pl = Playlist(self.temp, "playlist")
+        pl.extend(NUMERIC_SONGS)
+        pl.write()
+
+        lib = FileLibrary("foobar")
+        lib.add(NUMERIC_SONGS)
+        pl = Playlist(self.temp, "playlist", lib)
+        self.assertFalse(pl.loaded)
+        playlists = Playlist.playlists_featuring(NUMERIC_SONGS[0])
+        self.assertTrue(any(p is pl for p in playlists))
+        self.assertTrue(pl.loaded)
+
+    def test_rename_lazy(self):
+        pl = Playlist(self.temp, "playlist")
+        pl.extend(NUMERIC_SONGS)
+        pl.write()
+
+        lib = FileLibrary("foobar")
+        lib.add(NUMERIC_SONGS)
+        pl = Playlist(self.temp, "playlist", lib)
+        pl.rename("other")
+        self.assertEqual(len(pl), len(NUMERIC_SONGS))
+        pl.delete()
+
     def test_updating_aggregates_extend(s):
         pl = Playlist(s.temp, "playlist")
         pl.extend(NUMERIC_SONGS)
@@ -462,6 +533,43 @@ class TPlaylist(TestCase):
         pl.remove_songs(NUMERIC_SONGS)
         s.failIf(pl.get("~#length"))
 
+    def test_remove_songs(s):
+        a, b, c = Fakesong(), Fakesong(), Fakesong()
+        pl = Playlist(s.temp, "playlist")
+        pl.extend([a, b, a, c, a])
+        s.failIf(pl.remove_songs([Fakesong()]))
+        s.failUnless(pl.remove_songs([a, c], leave_dupes=True))
+        s.failUnlessEqual(list(pl), [b, a, a])
+        s.failUnless(pl.remove_songs([a]))
+        s.failUnlessEqual(list(pl), [b])
+        pl.delete()
+
+    def test_batch(s):
+        pl = Playlist(s.temp, "playlist")
+        s.failIf(pl.get("~#length"))
+        with pl.batch():
+            pl.extend(NUMERIC_SONGS)
+            pl.write()
+            with open(pl.filename, "rb") as h:
+                s.failIf(h.read())
+        s.failUnlessEqual(pl.get("~#length"), 12)
+        # waits for the background save
+        pl.write()
+        with open(pl.filename, "rb") as h:
+            s.failUnlessEqual(len(h.read().splitlines()), len(NUMERIC_SONGS))
+        pl.delete()
+
+    def test_write_async(s):
+        pl = Playlist(s.temp, "playlist")
+        for song in NUMERIC_SONGS:
+            pl.append(song)
+            pl.write_async()
+        pl.rename("other")
+        s.failIf(os.path.exists(os.path.join(s.temp, "playlist")))
+        with open(pl.filename, "rb") as h:
+            s.failUnlessEqual(len(h.read().splitlines()), len(NUMERIC_SONGS))
+        pl.delete()
+
     def test_listlike(s):
         pl = Playlist(s.temp, "playlist")
         pl.extend(NUMERIC_SONGS)
@@ -483,6 +591,19 @@ class TPlaylist(TestCase):
         pl.delete()
         pl2.delete()
 
+    def test_playlists_featuring_changes(s):
+        song, other = Fakesong(), Fakesong()
+        pl = Playlist(s.temp, "playlist")
+        pl.extend([song, song])
+        pl.remove_songs([song], leave_dupes=True)
+        s.failUnless(Playlist.playlists_featuring(song)[0] is pl)
+        pl[0] = other
+        s.failUnlessEqual(Playlist.playlists_featuring(song), [])
+        s.failUnless(Playlist.playlists_featuring(other)[0] is pl)
+        pl.clear()
+        s.failUnlessEqual(Playlist.playlists_featuring(other), [])
+        pl.delete()
+
     def test_playlists_tag(self):
         # Arguably belongs in _audio
         songs = NUMERIC_SONGS
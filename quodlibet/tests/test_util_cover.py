@@ -9,6 +9,7 @@ import os
 from quodlibet import config
 from quodlibet.formats._audio import AudioFile
 from quodlibet.util.cover.manager import CoverManager
+from quodlibet.util.cover.built_in import FilesystemCover
 from quodlibet.util.path import fsnative, normalize_path
 
 from . import TestCase, DATA_DIR
@@ -132,6 +133,13 @@ class TCoverManager(TestCase):
             else:
                 self.failUnless(f, self.full_path('back.jpg'))
 
+    def test_prefetch(self):
+        f = self.full_path("cover.jpg")
+        file(f, "w").close()
+        self.files.append(f)
+        FilesystemCover.prefetch([quux, bar_2_1, quux])
+        self.assertEqual(os.path.abspath(self._find_cover(quux).name), f)
+
     def test_get_thumbnail(self):
         self.assertTrue(self.manager.get_pixbuf(quux, 10, 10) is None)
         self.assertTrue(self.manager.get_pixbuf_many([quux], 10, 10) is None)
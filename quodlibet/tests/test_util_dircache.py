@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+
+from tests import TestCase, mkdtemp
+
+from quodlibet.util.dircache import DirectoryCache
+
+
+class TDirectoryCache(TestCase):
+
+    def setUp(self):
+        self.dir = mkdtemp()
+        self.cache = DirectoryCache()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def touch(self, name):
+        with open(os.path.join(self.dir, name), "wb"):
+            pass
+
+    def age(self, path, seconds=60):
+        # make the change old enough to get cached
+        mtime = os.path.getmtime(path) - seconds
+        os.utime(path, (mtime, mtime))
+
+    def test_cached(self):
+        self.touch("a")
+        self.age(self.dir)
+        names = self.cache.listdir(self.dir)
+        self.assertEqual(names, ("a",))
+        self.assertTrue(self.cache.listdir(self.dir) is names)
+        self.assertEqual(len(self.cache), 1)
+
+    def test_invalidate(self):
+        self.touch("a")
+        self.age(self.dir, 120)
+        self.cache.listdir(self.dir)
+        self.touch("b")
+        self.age(self.dir)
+        self.assertEqual(sorted(self.cache.listdir(self.dir)), ["a", "b"])
+
+    def test_racy(self):
+        self.touch("a")
+        self.assertEqual(self.cache.listdir(self.dir), ("a",))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_error(self):
+        self.age(self.dir)
+        self.cache.listdir(self.dir)
+        os.rmdir(self.dir)
+        self.assertRaises(EnvironmentError, self.cache.listdir, self.dir)
+        self.assertEqual(len(self.cache), 0)
+        os.mkdir(self.dir)
+
+    def test_max_entries(self):
+        cache = DirectoryCache(max_entries=2)
+        dirs = [mkdtemp(dir=self.dir) for i in range(3)]
+        for path in dirs:
+            self.age(path)
+            cache.listdir(path)
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(cache.listdir(dirs[2]) is cache.listdir(dirs[2]))
+
+    def test_clear(self):
+        self.age(self.dir)
+        self.cache.listdir(self.dir)
+        self.assertEqual(len(self.cache), 1)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
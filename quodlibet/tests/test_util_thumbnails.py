@@ -83,6 +83,28 @@ class TThumb(TestCase):
         thumb = thumbnails.get_thumbnail(self.filename, (50, 60))
         self.assertTrue(thumb)
 
+    def test_get_thumbnail_mtime(self):
+        thumbnails.get_thumbnail(self.filename, (50, 60))
+        path, size = thumbnails.get_cache_info(self.filename, (50, 60))
+        self.assertEqual(thumbnails.get_thumbnail_mtime(path),
+                         int(mtime(self.filename)))
+        self.assertTrue(thumbnails.get_thumbnail_mtime(self.filename) is None)
+        self.assertTrue(thumbnails.get_thumbnail_mtime("/nope") is None)
+
+    def test_create_thumbnails(self):
+        self.assertTrue(thumbnails.create_thumbnails(self.filename))
+        # up to date, and too small for a large one
+        self.assertFalse(thumbnails.create_thumbnails(self.filename))
+
+        path, size = thumbnails.get_cache_info(self.filename, (50, 60))
+        os.utime(path, None)
+        mt = mtime(self.filename) + 10
+        os.utime(self.filename, (mt, mt))
+        self.assertEqual(
+            list(thumbnails.create_thumbnails_many([self.filename])),
+            [(self.filename, True)])
+        self.assertEqual(thumbnails.get_thumbnail_mtime(path), int(mt))
+
     def test_thumb(s):
         thumb = thumbnails.get_thumbnail(s.filename, (50, 60))
 
@@ -110,3 +132,46 @@ class TThumb(TestCase):
         #check rights
         if os.name != "nt":
             s.failUnlessEqual(os.stat(path).st_mode, 33152)
+
+
+class TPixbufCache(TestCase):
+
+    def _pixbuf(self, size):
+        return GdkPixbuf.Pixbuf.new(
+            GdkPixbuf.Colorspace.RGB, True, 8, size, size)
+
+    def test_get_set(self):
+        cache = thumbnails.PixbufCache(10 ** 6)
+        pb = self._pixbuf(10)
+        cache.set("a", pb, 1)
+        self.assertTrue(cache.get("a", 1) is pb)
+        self.assertTrue(cache.get("b", 1) is None)
+        self.assertEqual(cache.size, pb.get_rowstride() * 10)
+
+    def test_stamp(self):
+        cache = thumbnails.PixbufCache(10 ** 6)
+        cache.set("a", self._pixbuf(10), 1)
+        self.assertTrue(cache.get("a", 2) is None)
+        self.assertTrue(cache.get("a", 1) is None)
+        self.assertEqual(cache.size, 0)
+
+    def test_max_bytes(self):
+        pb = self._pixbuf(10)
+        size = pb.get_rowstride() * 10
+        cache = thumbnails.PixbufCache(size * 2)
+        cache.set("a", pb)
+        cache.set("b", self._pixbuf(10))
+        cache.get("a")
+        cache.set("c", self._pixbuf(10))
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(cache.get("a") is pb)
+        self.assertTrue(cache.get("b") is None)
+        self.assertEqual(cache.size, size * 2)
+
+        # too large
+        cache.set("d", self._pixbuf(20))
+        self.assertTrue(cache.get("d") is None)
+        self.assertEqual(len(cache), 2)
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.size), (0, 0))
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import socket
+import threading
+
+from tests import TestCase, mkdtemp
+
+from gi.repository import GLib
+
+from quodlibet.util.unixsocket import UnixSocketServer, UnixSocketClient, \
+    UnixSocketError, socket_exists
+
+
+class TUnixSocketServer(TestCase):
+
+    def setUp(self):
+        self.dir = mkdtemp()
+        self.path = os.path.join(self.dir, "control.socket")
+        self.lines = []
+        self.server = UnixSocketServer(self.path, self._callback)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.dir)
+
+    def _callback(self, line):
+        self.lines.append(line)
+        if line == b"none":
+            return
+        elif line == b"count":
+            return (b"%d\n" % i for i in xrange(50000))
+        return [line.upper(), b"\x00"]
+
+    def _run(self, func, *args):
+        """Runs func in a thread while iterating the main loop"""
+
+        result = []
+        thread = threading.Thread(target=lambda: result.append(func(*args)))
+        thread.start()
+        context = GLib.MainContext.default()
+        while thread.is_alive():
+            context.iteration(False)
+            thread.join(0.001)
+        return result[0]
+
+    def _request(self, *lines):
+        with UnixSocketClient(self.path) as client:
+            for line in lines:
+                client.send(line)
+            return [client.read_until(b"\x00") for l in lines
+                    if l != b"none"]
+
+    def test_pipelined(self):
+        result = self._run(self._request, b"foo", b"none", b"bar", b"baz")
+        self.assertEqual(result, [b"FOO", b"BAR", b"BAZ"])
+        self.assertEqual(self.lines, [b"foo", b"none", b"bar", b"baz"])
+
+    def test_stream(self):
+        def request():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            sock.sendall(b"count\n")
+            sock.shutdown(socket.SHUT_WR)
+            data = []
+            while True:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                data.append(chunk)
+            sock.close()
+            return b"".join(data)
+
+        data = self._run(request)
+        self.assertEqual(data.splitlines(), [b"%d" % i for i in xrange(50000)])
+
+    def test_exists(self):
+        self.assertTrue(socket_exists(self.path))
+        self.assertRaises(UnixSocketError, self.server.start)
+        self.server.stop()
+        self.assertFalse(os.path.exists(self.path))
+        self.assertFalse(socket_exists(self.path))
+
+    def test_stale(self):
+        self.server.stop()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        sock.close()
+        self.assertFalse(socket_exists(self.path))
+        self.server.start()
+        self.assertEqual(self._run(self._request, b"foo"), [b"FOO"])